@@ -0,0 +1,14 @@
+"""
+Benchmarks of the data and render preparation paths.
+
+They are run with airspeed velocity (``pip install asv``) from the root of
+the repository, e.g.::
+
+    asv run                      # benchmark the latest commit of master
+    asv continuous master HEAD   # compare a branch with master
+    asv dev                      # quick single run in this environment
+    asv publish && asv preview   # browse the history
+
+The synthetic fixtures are in ``benchmarks/common.py``.
+
+"""
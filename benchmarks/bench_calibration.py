@@ -0,0 +1,73 @@
+# coding=utf-8
+# Filename: bench_calibration.py
+"""
+Benchmarks of loading detectors, calibrating hits, the ToT cut and the
+per-DOM hit reductions.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import shutil
+import tempfile
+
+from rainbowalga.calibration import load_pmt_lookup, sort_by_time
+from rainbowalga.hits import first_dom_hits, largest_tot_hits
+
+from .common import (DETX, MIN_TOT, N_HITS, calibrated_hits, pmt_lookup,
+                     raw_hits)
+
+
+class DetectorLoading(object):
+    """Parsing the DETX file and loading it from the cache."""
+    timeout = 180
+
+    def setup(self):
+        self.cache_dir = tempfile.mkdtemp()
+        load_pmt_lookup(DETX, cache_dir=self.cache_dir)
+
+    def teardown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def time_parse_detx(self):
+        load_pmt_lookup(DETX, cache_dir=None)
+
+    def time_load_cached(self):
+        load_pmt_lookup(DETX, cache_dir=self.cache_dir)
+
+
+class Calibration(object):
+    params = N_HITS
+    param_names = ['n_hits']
+
+    def setup(self, n_hits):
+        self.lookup = pmt_lookup()
+        self.raw_hits = raw_hits(n_hits)
+
+    def time_apply(self, n_hits):
+        self.lookup.apply(*self.raw_hits)
+
+    def time_apply_and_sort(self, n_hits):
+        sort_by_time(self.lookup.apply(*self.raw_hits))
+
+    def peakmem_apply(self, n_hits):
+        self.lookup.apply(*self.raw_hits)
+
+
+class HitSelection(object):
+    """The ToT cut of ``RainbowAlga.extract_hits()`` and the per-DOM hit
+    reductions."""
+    params = N_HITS
+    param_names = ['n_hits']
+
+    def setup(self, n_hits):
+        self.hits = calibrated_hits(n_hits)
+
+    def time_tot_cut(self, n_hits):
+        hits = self.hits
+        hits[hits.tot > MIN_TOT]
+
+    def time_first_dom_hits(self, n_hits):
+        first_dom_hits(self.hits.dom_id, self.hits.time)
+
+    def time_largest_tot_hits(self, n_hits):
+        largest_tot_hits(self.hits.dom_id, self.hits.time, self.hits.tot)
@@ -0,0 +1,35 @@
+# coding=utf-8
+# Filename: bench_generator.py
+"""
+Benchmarks of full-size synthetic events, from generation to the ToT cut.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+from rainbowalga.calibration import sort_by_time
+from rainbowalga.generator import EventGenerator
+
+from .common import MIN_TOT
+
+
+class SyntheticEvents(object):
+    """ORCA and ARCA-size detectors, with a few thousand (5 us) and 45k to
+    90k (100 us) hits per event, mostly K40 noise."""
+    params = (['orca', 'arca'], [5000, 100000])
+    param_names = ['detector', 'window']
+
+    def setup(self, detector, window):
+        self.generator = EventGenerator.from_spec(
+            '{0},muons=2,cascades=1,window={1}'.format(detector, window))
+        self.lookup = self.generator.pmt_lookup
+        self.event = self.generator[0]
+
+    def time_generate(self, detector, window):
+        self.generator[1]
+
+    def time_calibrate_and_cut(self, detector, window):
+        event = self.event
+        hits = sort_by_time(self.lookup.apply(event.dom_id, event.channel_id,
+                                              event.time, event.tot,
+                                              event.triggered))
+        hits[hits.tot > MIN_TOT]
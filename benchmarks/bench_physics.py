@@ -0,0 +1,67 @@
+# coding=utf-8
+# Filename: bench_physics.py
+"""
+Benchmarks of the time residuals, track bases and track geometry.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+from rainbowalga.physics import (TrackSet, time_residuals, track_bases,
+                                 transform)
+
+from .common import N_HITS, calibrated_hits, random_directions
+
+
+class Residuals(object):
+    params = (N_HITS, ['point_source', 'cherenkov_cone'])
+    param_names = ['n_hits', 'hypothesis']
+
+    def setup(self, n_hits, hypothesis):
+        hits = calibrated_hits(n_hits)
+        self.times = hits.time
+        self.pmt_pos = np.column_stack((hits.pos_x, hits.pos_y, hits.pos_z))
+        self.hypothesis = dict(pos=np.array([10.0, 20.0, 200.0]), time=0)
+        if hypothesis == 'cherenkov_cone':
+            self.hypothesis['dir'] = np.array([0.6, 0, -0.8])
+
+    def time_residuals(self, n_hits, hypothesis):
+        time_residuals(self.times, self.pmt_pos, **self.hypothesis)
+
+
+class Transform(object):
+    """Rotation matrices of single tracks and bases of track sets."""
+
+    def setup(self):
+        self.directions = random_directions(1000)
+
+    def time_transform(self):
+        transform(self.directions[0])
+
+    def time_transform_1000(self):
+        for direction in self.directions:
+            transform(direction)
+
+    def time_track_bases_1000(self):
+        track_bases(self.directions)
+
+
+class TrackGeometry(object):
+    """The line vertices of the visible tracks in each frame."""
+    params = [100, 1000, 10000]
+    param_names = ['n_tracks']
+
+    def setup(self, n_tracks):
+        rnd = np.random.RandomState(23)
+        self.tracks = TrackSet()
+        self.tracks.add_particles(rnd.uniform(-100, 100, (n_tracks, 3)),
+                                  random_directions(n_tracks),
+                                  rnd.uniform(0, 1000, n_tracks),
+                                  length=rnd.uniform(0, 300, n_tracks))
+
+    def time_vertices(self, n_tracks):
+        self.tracks.vertices(2000)
+
+    def time_cones(self, n_tracks):
+        self.tracks.cones(2000)
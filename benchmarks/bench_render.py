@@ -0,0 +1,135 @@
+# coding=utf-8
+# Filename: bench_render.py
+"""
+Benchmarks of preparing the per-frame geometry, without OpenGL.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+from rainbowalga.colourmaps import get_colour_map
+from rainbowalga.glyphs import DomHits
+from rainbowalga.gui import legend_ticks, legend_vertices
+from rainbowalga.hardware import DetectorScene
+from rainbowalga.hits import hit_radius, hit_vertices
+from rainbowalga.picking import UniformGrid
+from rainbowalga.tools import Camera
+
+from .common import N_HITS, calibrated_hits, pmt_lookup
+
+
+class HitGeometry(object):
+    """The vertex array uploaded for the hits of an event."""
+    params = N_HITS
+    param_names = ['n_hits']
+
+    def setup(self, n_hits):
+        self.hits = calibrated_hits(n_hits)
+
+    def time_hit_vertices(self, n_hits):
+        hits = self.hits
+        hit_vertices(hits.pos_x, hits.pos_y, hits.pos_z, hits.time, hits.tot)
+
+
+class DomGlyphs(object):
+    """Binning the hits to one glyph per DOM as the clock advances."""
+    params = N_HITS
+    param_names = ['n_hits']
+
+    def setup(self, n_hits):
+        self.hits = calibrated_hits(n_hits)
+        self.dom_ids = pmt_lookup().doms['dom_id']
+        self.dom_hits = DomHits(self.dom_ids, self.hits)
+        first, last = self.dom_hits.time_range
+        self.frame_times = first + (last - first) * \
+            (1 + np.arange(100)) / 100
+
+    def time_bin_hits(self, n_hits):
+        DomHits(self.dom_ids, self.hits)
+
+    def time_advance_100_frames(self, n_hits):
+        dom_hits = self.dom_hits
+        dom_hits.reset()
+        for time in self.frame_times:
+            dom_hits.advance(time)
+            dom_hits.values()
+
+
+class Picking(object):
+    """Picking a hit under the mouse and selecting a region of interest."""
+    params = N_HITS
+    param_names = ['n_hits']
+
+    def setup(self, n_hits):
+        hits = calibrated_hits(n_hits)
+        self.points = np.column_stack((hits.pos_x, hits.pos_y, hits.pos_z))
+        self.radius = hit_radius(hits.tot)
+        self.grid = UniformGrid(self.points)
+        self.center = self.points.mean(axis=0)
+        self.origin = self.center + (1000, 1000, 1000)
+        self.direction = -np.ones(3) / np.sqrt(3)
+
+    def time_build_grid(self, n_hits):
+        UniformGrid(self.points)
+
+    def time_pick(self, n_hits):
+        self.grid.pick(self.origin, self.direction, self.radius)
+
+    def time_query_ball(self, n_hits):
+        self.grid.query_ball(self.center, 50)
+
+
+class DetectorCulling(object):
+    """Baking the detector scene and selecting the DUs of a frame."""
+
+    def setup(self):
+        lookup = pmt_lookup()
+        self.doms, self.pmts = lookup.doms, lookup.pmts
+        self.scene = DetectorScene(self.doms, self.pmts)
+        self.eye = self.scene.lower.min(axis=0) - 100
+
+    def time_bake(self):
+        DetectorScene(self.doms, self.pmts)
+
+    def time_levels(self):
+        self.scene.levels(self.eye)
+
+
+class SpectrumColours(object):
+    """Evaluating the colour map on the CPU (legend, print mode)."""
+    params = N_HITS
+    param_names = ['n_hits']
+
+    def setup(self, n_hits):
+        self.times = calibrated_hits(n_hits).time
+        self.cmap = get_colour_map('gist_rainbow')
+
+    def time_map(self, n_hits):
+        self.cmap.map(self.times, 0, 5000)
+
+
+class ColourLegend(object):
+
+    def setup(self):
+        self.cmap = get_colour_map('gist_rainbow')
+
+    def time_legend_vertices(self):
+        ticks, step = legend_ticks(0, 5000)
+        legend_vertices(ticks, step, self.cmap, (0, 5000), 900, 920, 50, 650)
+
+
+class CameraUpdates(object):
+    """The camera updates of one frame with rotation animation."""
+
+    def setup(self):
+        self.camera = Camera()
+
+    def time_rotate_z(self):
+        self.camera.rotate_z(0.2)
+
+    def time_move_z(self):
+        self.camera.move_z(1)
+
+    def time_position(self):
+        self.camera.pos
@@ -0,0 +1,54 @@
+# coding=utf-8
+# Filename: common.py
+"""
+Synthetic fixtures of the benchmarks.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import os
+
+import numpy as np
+
+from rainbowalga.calibration import load_pmt_lookup, sort_by_time
+
+DETX = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))), 'rainbowalga', 'data', 'km3net_jul13_90m_r1494.detx')
+
+N_HITS = [1000, 10000, 100000]
+MIN_TOT = 20
+
+_lookup = None
+
+
+def pmt_lookup():
+    """The PMT lookup of the bundled detector, parsed once per process."""
+    global _lookup
+    if _lookup is None:
+        _lookup = load_pmt_lookup(DETX, cache_dir=None)
+    return _lookup
+
+
+def raw_hits(n_hits, seed=23):
+    """Random uncalibrated hits on the PMTs of the bundled detector.
+
+    Returns ``(dom_id, channel_id, time, tot)``.
+    """
+    rnd = np.random.RandomState(seed)
+    pmts = pmt_lookup().pmts
+    idx = rnd.randint(0, len(pmts), n_hits)
+    time = rnd.randint(0, 5000, n_hits).astype(np.float64)
+    tot = rnd.randint(1, 60, n_hits).astype(np.uint8)
+    return (np.asarray(pmts['dom_id'][idx]),
+            np.asarray(pmts['channel_id'][idx]), time, tot)
+
+
+def calibrated_hits(n_hits, seed=23):
+    """Calibrated and time sorted random hits."""
+    return sort_by_time(pmt_lookup().apply(*raw_hits(n_hits, seed)))
+
+
+def random_directions(n, seed=23):
+    rnd = np.random.RandomState(seed)
+    directions = rnd.normal(size=(n, 3))
+    return directions / np.linalg.norm(directions, axis=1)[:, np.newaxis]
@@ -6,74 +6,131 @@ RainbowAlga
 Usage:
     rainbowalga
     rainbowalga [options] [ROOT_FILE]
+    rainbowalga render [options] [ROOT_FILE] [--events=RANGE] [--out=DIR]
+                       [--jobs=N] [--size=WxH] [--platform=NAME]
+    rainbowalga scan [options] --where=CUT ROOT_FILES... [--jobs=N]
+    rainbowalga stream [options] [--host=HOST] [--port=PORT]
+                       [--policy=POLICY] [--queue-size=N] [--interval=SEC]
+    rainbowalga timeslices [options] ROOT_FILE [--stream=NAME]
+                           [--window=NS] [--buffer-size=N]
     rainbowalga (-h | --help)
     rainbowalga --version
 
 Options:
-    ROOT_FILE          The ROOT file containing the events.
+    ROOT_FILE          The ROOT file containing the events. If not given,
+                       the first file of the candidate list (-c) is opened.
+    ROOT_FILES         Online ROOT files to scan.
     -h --help          Show this screen.
     -v --version       Show version.
     -d DETECTOR        Detector file (DETX) or detector ID (eg. D_ARCA003).
                        If not provided, rainbowalga will try to figure it out.
     -t MIN_TOT         ToT threshold in ns [default=30].
     -s INDEX           Skip to event at index [default=0].
+    --prefetch=N       Number of events to prepare in the background in
+                       each direction [default: 3].
+    --cache-size=MB    Memory limit of the event cache in MB [default: 512].
+    --select=CUT       Step only through events passing a cut on the event
+                       index, e.g. 'n_triggered_hits>=20,trigger_mask&0x4'.
+    --trigger-counter=N  Start at the event with the trigger counter N.
+    --time=UTC         Start at the first event at or after the UTC time
+                       (seconds since the epoch).
+    --no-index         Do not build or use the event index of ROOT_FILE.
+    --simulate=SPEC    Show synthetic events instead of ROOT_FILE, on the
+                       detector given with -d or on a generated one, e.g.
+                       'arca,events=100,muons=2,noise=7000,window=100000'
+                       (see rainbowalga.generator.parse_spec).
+    --profile-startup  Print the time spent in each startup stage up to
+                       the first frame.
+    -c FILE --candidates=FILE  Candidate list, written by 'scan' (default:
+                       candidates.csv); the viewer steps only through its
+                       events.
+    --where=CUT        Cut on the scanned event features n_hits (after the
+                       ToT cut), n_doms, n_dus (needs -d), n_triggered_hits,
+                       triggered_fraction and trigger_counter,
+                       e.g. 'n_doms>=30,triggered_fraction>0.05'.
+    --chunk-size=N     Number of events per scan task [default: 1000].
+    --record-to=TARGET  Target of the recorded frames (key 'v'): an image
+                        file name pattern, a .y4m file or '|COMMAND' to
+                        pipe a Y4M stream to an encoder
+                        [default: Frame_{0:05d}.jpg].
+    --events=RANGE     Events to render as START:STOP [default: 0:].
+    --out=DIR          Output directory of the rendered images [default: .].
+    --jobs=N           Number of render processes (default: number of CPUs).
+    --size=WxH         Size of the rendered images [default: 800x600].
+    --platform=NAME    Offscreen GL platform, egl or osmesa [default: egl].
+    --host=HOST        Host of the event dispatcher (JLigier)
+                       [default: localhost].
+    --port=PORT        Port of the event dispatcher [default: 5553].
+    --policy=POLICY    Which streamed events to show: latest, nth:N or
+                       trigger:MASK [default: latest].
+    --queue-size=N     Number of streamed events waiting to be shown
+                       [default: 16].
+    --interval=SEC     Minimum time to show each streamed event in seconds
+                       [default: 1].
+    --stream=NAME      Timeslice stream: L0, L1, L2 or SN [default: L1].
+    --window=NS        Length of the shown time window in ns, it advances
+                       by its own length per second [default: 10000000].
+    --buffer-size=N    Number of calibrated hits in the timeslice buffer
+                       [default: 1000000].
 
 """
 from __future__ import division, absolute_import, print_function
 
+from concurrent.futures import ThreadPoolExecutor
 import os
-import math
-import itertools
+import threading
+import time
+
+STARTED = time.perf_counter()
 
 from OpenGL.GLUT import (
     glutCreateWindow, glutDisplayFunc, glutIdleFunc, glutInit,
     glutInitDisplayMode, glutInitWindowPosition, glutInitWindowSize,
     glutKeyboardFunc, glutMainLoop, glutMotionFunc, glutMouseFunc,
     glutReshapeFunc, glutReshapeWindow, glutSpecialFunc, glutSwapBuffers,
-    glutGet, GLUT_DOUBLE, GLUT_RGB, GLUT_DEPTH, GLUT_MULTISAMPLE,
-    GLUT_WINDOW_WIDTH, GLUT_WINDOW_HEIGHT, GLUT_LEFT_BUTTON, GLUT_DOWN,
-    GLUT_UP, GLUT_KEY_LEFT, GLUT_KEY_RIGHT)
+    GLUT_DOUBLE, GLUT_RGB, GLUT_DEPTH, GLUT_MULTISAMPLE, GLUT_LEFT_BUTTON,
+    GLUT_DOWN, GLUT_UP, GLUT_KEY_LEFT, GLUT_KEY_RIGHT)
 from OpenGL.GLU import gluPerspective
 from OpenGL.GL import (
-    glBegin, glClear, glClearColor, glClearDepth, glColor3f, glDisable,
-    glDisableClientState, glDrawArrays, glDrawPixels, glEnable,
-    glEnableClientState, glEnd, glFrustum, glLightfv, glLoadIdentity,
-    glMaterialfv, glMatrixMode, glOrtho, glPointSize, glPopMatrix,
-    glPushMatrix, glRasterPos, glReadPixels, glShadeModel, glUseProgram,
-    glVertex2f, glVertexPointerf, glViewport, glGetString, GLubyte,
-    glBlendFunc, GL_PROJECTION, GL_DEPTH_BUFFER_BIT, GL_COLOR_BUFFER_BIT,
-    GL_LIGHT0, GL_NORMALIZE, GL_COLOR_MATERIAL, GL_LIGHTING, GL_AMBIENT,
-    GL_DIFFUSE, GL_SPECULAR, GL_POSITION, GL_FRONT, GL_SHININESS, GL_VERSION,
-    GL_VERTEX_SHADER, GL_FRAGMENT_SHADER, GL_VERTEX_ARRAY, GL_POINTS,
-    GL_DEPTH_TEST, GL_LINE_SMOOTH, GL_FLAT, GL_MODELVIEW, GL_QUADS, GL_RGB,
-    GL_UNSIGNED_BYTE, GL_SMOOTH, GL_BLEND, GL_SRC_ALPHA,
-    GL_ONE_MINUS_SRC_ALPHA)
+    glClear, glClearColor, glClearDepth, glEnable, glFrustum, glLightfv,
+    glLoadIdentity, glMaterialfv, glMatrixMode, glOrtho, glPopMatrix,
+    glPushMatrix, glShadeModel, glViewport, glGetString, glBlendFunc,
+    glFinish, GL_PROJECTION, GL_DEPTH_BUFFER_BIT, GL_COLOR_BUFFER_BIT,
+    GL_LIGHT0, GL_NORMALIZE, GL_COLOR_MATERIAL, GL_AMBIENT, GL_DIFFUSE,
+    GL_SPECULAR, GL_POSITION, GL_FRONT, GL_SHININESS, GL_VERSION,
+    GL_MODELVIEW, GL_SMOOTH, GL_FLAT, GL_BLEND, GL_SRC_ALPHA,
+    GL_ONE_MINUS_SRC_ALPHA, GL_DEPTH_TEST, GL_LINE_SMOOTH)
 from OpenGL.arrays import vbo
-from OpenGL.GL.shaders import compileShader, compileProgram
 
 import numpy as np
 
-from PIL import Image
-
-from rainbowalga.tools import Clock, Camera, draw_text_2d, base_round
-from rainbowalga.physics import Particle, Neutrino, Hit
-from rainbowalga.gui import Colourist
+from rainbowalga.tools import Clock, Camera, base_round
+from rainbowalga.physics import TrackSet, time_residuals
+from rainbowalga.hits import (HitRenderer, first_dom_hits, hit_radius,
+                              largest_tot_hits, passing_tot_cut, NEVER)
+from rainbowalga.glyphs import DomHits, GlyphRenderer
+from rainbowalga.hardware import DetectorScene
+from rainbowalga.picking import (mouse_ray, UniformGrid, DOM_PICK_RADIUS,
+                                 ROI_RADIUS)
+from rainbowalga.prefetch import EventPrefetcher
+from rainbowalga.profiling import FrameProfiler, StartupProfiler
+from rainbowalga.text import create_text_renderer, PRINT_SCALE
+from rainbowalga.timeslice import TIMESLICE_DURATION
+from rainbowalga.recording import (FrameQueue, ImageSequenceWriter,
+                                   PixelBufferReader, make_writer,
+                                   read_pixels, FRAME_PATTERN)
+from rainbowalga.calibration import load_pmt_lookup, pmt_keys, sort_by_time
+from rainbowalga.index import load_event_index
+from rainbowalga.gui import Colourist, ColourLegend, Logo
+from rainbowalga.core import Vec3
 from rainbowalga import constants
 from rainbowalga import version
 
-from km3pipe.dataclasses import Vec3
-from km3pipe.hardware import Detector
-from km3pipe.mc import pdg2name
-from km3pipe.math import angle_between
-from km3pipe.calib import Calibration
-
-import km3io
-import km3pipe as kp
-import km3modules as km
-
-from km3pipe.logger import logging
+import logging
 log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
 
+IMPORTED = time.perf_counter()
+
 # log.setLevel("DEBUG")
 
 
@@ -83,103 +140,307 @@ class RainbowAlga(object):
                  event_file=None,
                  min_tot=None,
                  skip_to_blob=0,
+                 prefetch=3,
+                 cache_size=512,
+                 record_to=FRAME_PATTERN,
+                 stream=None,
+                 stream_interval=1,
+                 use_index=True,
+                 select=None,
+                 trigger_counter=None,
+                 utc_time=None,
+                 candidates=None,
+                 simulate=None,
+                 timeslices=None,
+                 profile_startup=False,
                  width=1000,
                  height=700,
                  x=50,
-                 y=50):
+                 y=50,
+                 headless=False):
+        self.startup = StartupProfiler(STARTED)
+        self.startup.record('imports', STARTED, IMPORTED)
+        self.profile_startup = profile_startup
+        self.headless = headless
+        self.width = width
+        self.height = height
+
         self.camera = Camera()
-        self.camera.is_rotating = True
+        self.camera.is_rotating = not headless
 
         self.colourist = Colourist()
 
-        current_path = os.path.dirname(os.path.abspath(__file__))
-
-
-        self.load_logo()
-
-        self.init_opengl(width=width, height=height, x=x, y=y)
-
-        print("OpenGL Version: {0}".format(glGetString(GL_VERSION)))
         self.clock = Clock(speed=100)
         self.timer = Clock(snooze_interval=1 / 30)
-        self.frame_index = 0
+        self.profiler = FrameProfiler(finish=glFinish)
+        self.show_profile = False
         self.event_index = skip_to_blob
         self.is_recording = False
+        self.record_to = record_to
+        self.recorder = None
+        self.pixel_reader = None
+        self.screenshots = None
         self.min_tot = min_tot
         self.time_offset = 0
-
-        VERTEX_SHADER = compileShader(
-            """
-        void main() {
-            gl_Position = gl_ModelViewProjectionMatrix * gl_Vertex;
-        }""", GL_VERTEX_SHADER)
-        FRAGMENT_SHADER = compileShader(
-            """
-        void main() {
-            gl_FragColor = vec4(0.5, 0.5, 0.5, 1);
-        }""", GL_FRAGMENT_SHADER)
-
-        self.shader = compileProgram(VERTEX_SHADER, FRAGMENT_SHADER)
-
-        self.blob = None
+        self.legend_offset = 0
+
+        self.calibrated_hits = None
+        self.hits = None
+        self.hidden_at = None
+        self.n_visible_hits = 0
+        self.prefetcher = None
+        self.requested_index = None
+        self.file_index = None
+        self.selection = None
+        self.selection_cut = None
+        self.jump_digits = ''
+        self.stream = None
+        self.synthetic_events = None
+        self.timeslices = None
+        self.timeslice_window = None
+        self._timeslice_state = None
+        self.stream_interval = stream_interval
+        self.streamed_hits = None
+        self._stream_shown_at = 0
+        self._reader_lock = threading.Lock()
         self.objects = {}
-        self.shaded_objects = []
 
         self.mouse_x = None
         self.mouse_y = None
+        self._clicked_at = None
+
+        self._dom_grid = None
+        self._pmt_grid = None
+        self._hit_grid = None
+        self.picked = None
+        self.picked_position = None
+        self.roi = None
+        self.roi_keys = None
 
         self.show_secondaries = True
+        self.show_replaced_hits = True
+        self.show_glyphs = False
+        self.dom_hits = None
         self.show_help = False
         self._help_string = None
         self.show_info = True
 
-        self.spectrum = None
         self.current_spectrum = 'default'
         self.cmap = self.colourist.default_cmap
         self.min_hit_time = None
         self.max_hit_time = None
 
-
-        if detector is None:
-            if event_file is None:
-                filepath = 'data/km3net_jul13_90m_r1494_corrected.detx'
-                detector_file = os.path.join(current_path, filepath)
-                self.geometry = Calibration(filename=detector_file)
+        # The detector is loaded and the first event is requested while the
+        # window and the OpenGL context are created, so nothing in
+        # load_data() may touch OpenGL.
+        loader = ThreadPoolExecutor(max_workers=1,
+                                    thread_name_prefix='startup')
+        loading = loader.submit(self.load_data, detector, event_file,
+                                skip_to_blob, prefetch, cache_size,
+                                use_index, select, trigger_counter,
+                                utc_time, candidates, simulate,
+                                timeslices)
+        loader.shutdown(wait=False)
+
+        with self.startup.stage('gl context'):
+            if headless:
+                self.init_gl_state()
+                self.resize(width, height)
             else:
-                raise NotImplemented("Figuring out of the DETX is not implemented yet")
+                self.init_opengl(width=width, height=height, x=x, y=y)
+            print("OpenGL Version: {0}".format(glGetString(GL_VERSION)))
 
-        else:
-            if detector.endswith('.detx'):
-                self.geometry = Calibration(filename=detector)
-            else:
-                self.geometry = Calibration(det_id=detector)
+        with self.startup.stage('logo'):
+            self.logos = {}
+            self.load_logo()
+            self.colour_legend = ColourLegend()
+
+        with self.startup.stage('text'):
+            self.text = create_text_renderer()
 
-        self.detector = self.geometry.detector
+        with self.startup.stage('shaders'):
+            self.hit_renderer = HitRenderer()
 
-        dom_pos = self.detector.dom_positions.values()
-        min_z = min([z for x, y, z in dom_pos])
-        max_z = max([z for x, y, z in dom_pos])
+        with self.startup.stage('waiting for data'):
+            index = loading.result()
+
+        self.dom_positions = self.pmt_lookup.dom_positions
+        min_z = self.dom_positions[:, 2].min()
+        max_z = self.dom_positions[:, 2].max()
         z_shift = (max_z - min_z) / 2
-        self.dom_positions = np.array([tuple(pos) for pos in dom_pos], 'f')
         self.camera.target = Vec3(0, 0, z_shift)
         self.dom_positions_vbo = vbo.VBO(self.dom_positions)
+        self.glyph_renderer = GlyphRenderer(self.dom_positions_vbo)
 
-        if event_file:
-            # self.offline_reader = km3io.OfflineReader(event_file)
-            self.online_reader = km3io.OnlineReader(event_file)
-
-            try:
-                self.load_blob(skip_to_blob)
-            except IndexError:
-                print("Could not load blob at index {0}".format(skip_to_blob))
-                print("Starting from the first one...")
-                self.load_blob(0)
+        if index is not None:
+            if headless:
+                with self.startup.stage('first event'):
+                    self.load_blob(index)
+            else:
+                # the detector is shown until the first event is prepared
+                self.request_blob(index)
+        elif self.timeslices is not None:
+            self.clock.speed = self.timeslice_window
+            self.clock._global_offset = \
+                skip_to_blob * TIMESLICE_DURATION / self.clock.speed
+            self.timeslices.start()
+            print("Showing {0} timeslices of {1} in windows of {2:.0f} "
+                  "ns".format(self.timeslices.n_timeslices, event_file,
+                              self.timeslice_window))
+        elif stream is not None:
+            from rainbowalga.stream import EventStream
+            self.stream = EventStream(prepare=self.calibrate_streamed_event,
+                                      **stream).start()
+            print("Waiting for events from {0}:{1}...".format(
+                self.stream.host, self.stream.port))
         else:
             print("No event file specified. Only the detector will be shown.")
 
         self.clock.reset()
         self.timer.reset()
-        glutMainLoop()
+        if not headless:
+            glutMainLoop()
+
+    def load_data(self, detector, event_file, index, prefetch, cache_size,
+                  use_index, select, trigger_counter, utc_time, candidates,
+                  simulate, timeslices):
+        """Load the detector, open the events and request the first one.
+
+        This runs on a background thread during the OpenGL setup, returns
+        the index of the first event or None if there are no events.
+        """
+        with self.startup.stage('detector'):
+            if simulate is not None:
+                from rainbowalga.generator import EventGenerator
+                if detector is None:
+                    self.synthetic_events = EventGenerator.from_spec(simulate)
+                    self.pmt_lookup = self.synthetic_events.pmt_lookup
+                else:
+                    self.pmt_lookup = load_pmt_lookup(detector)
+                    self.synthetic_events = EventGenerator.from_spec(
+                        simulate, self.pmt_lookup.pmts)
+                print("Simulating {0}".format(self.synthetic_events))
+            else:
+                if detector is None:
+                    if event_file is None:
+                        current_path = os.path.dirname(
+                            os.path.abspath(__file__))
+                        filepath = 'data/km3net_jul13_90m_r1494.detx'
+                        detector = os.path.join(current_path, filepath)
+                    else:
+                        raise NotImplemented("Figuring out of the DETX is "
+                                             "not implemented yet")
+
+                self.pmt_lookup = load_pmt_lookup(detector)
+
+            self.detector_scene = DetectorScene(self.pmt_lookup.doms,
+                                                self.pmt_lookup.pmts)
+
+        with self.startup.stage('events'):
+            if self.synthetic_events is not None:
+                self.prefetcher = EventPrefetcher(
+                    self.calibrate_event, len(self.synthetic_events),
+                    depth=prefetch, max_bytes=cache_size * 1024**2)
+            elif timeslices is not None:
+                from rainbowalga.timeslice import (TimesliceFile,
+                                                   TimesliceLoader)
+                source = TimesliceFile(event_file, timeslices['stream'])
+                self.timeslices = TimesliceLoader(
+                    source, self.calibrate_hits, timeslices['capacity'])
+                self.timeslice_window = timeslices['window']
+            elif event_file:
+                import km3io
+                # self.offline_reader = km3io.OfflineReader(event_file)
+                self.online_reader = km3io.OnlineReader(event_file)
+                self.prefetcher = EventPrefetcher(
+                    self.calibrate_event, len(self.online_reader.events),
+                    depth=prefetch, max_bytes=cache_size * 1024**2)
+
+        if self.prefetcher is None:
+            return None
+
+        # The index is only waited for if the first event depends on it
+        needs_index = select or trigger_counter is not None or \
+            utc_time is not None
+        with self.startup.stage('event index'):
+            if use_index and needs_index and self.synthetic_events is None:
+                self.file_index = load_event_index(event_file,
+                                                   self.online_reader.events)
+                if select:
+                    self.select_events(select)
+            if candidates is not None:
+                self.set_selection(candidates, "the candidate list")
+            if self.file_index is not None or self.selection is not None:
+                index = self.start_index(index, trigger_counter, utc_time)
+
+        if index not in self.prefetcher:
+            print("Could not load blob at index {0}".format(index))
+            print("Starting from the first one...")
+            index = 0
+        self.prefetcher.request(index)
+        if use_index and self.file_index is None and \
+                self.synthetic_events is None:
+            self.load_file_index_in_background(event_file)
+        return index
+
+    def load_file_index_in_background(self, event_file):
+        """Load the event index, or build it on the first open of the file,
+        without delaying the first event.
+
+        The index is built with its own reader, the prefetcher keeps the
+        one of the viewer.
+        """
+        def load():
+            try:
+                self.file_index = load_event_index(event_file)
+            except Exception as e:
+                log.warning("Could not index '{0}': {1}".format(
+                    event_file, e))
+
+        thread = threading.Thread(target=load, name='rainbowalga-index')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def select_events(self, cut):
+        """Step and prefetch only through the events passing the cut."""
+        self.set_selection(self.file_index.select(cut), "'{0}'".format(cut))
+
+    def set_selection(self, indices, description):
+        """Restrict the navigation to the given events, combined with an
+        existing selection."""
+        indices = np.unique(indices)
+        if self.selection is not None:
+            indices = np.intersect1d(self.selection, indices)
+            description = "{0} and {1}".format(self.selection_cut,
+                                               description)
+        self.selection = indices
+        self.selection_cut = description
+        self.prefetcher.selection = self.selection
+        print("{0} of {1} events selected by {2}".format(
+            len(self.selection), self.prefetcher.n_events, description))
+
+    def start_index(self, index, trigger_counter=None, utc_time=None):
+        """The index of the first event to show."""
+        if trigger_counter is not None and self.file_index is not None:
+            try:
+                return self.file_index.find_trigger_counter(trigger_counter)
+            except KeyError as e:
+                print(e)
+        if utc_time is not None and self.file_index is not None:
+            return self.file_index.find_time(utc_time)
+        if self.selection is not None and len(self.selection) and \
+                index not in self.selection:
+            following = self.selection[self.selection >= index]
+            index = following[0] if len(following) else self.selection[-1]
+        return int(index)
+
+    def toggle_print_mode(self):
+        """Switch between the screen and the print colours, the texts are
+        rasterised larger for print."""
+        self.colourist.print_mode = not self.colourist.print_mode
+        self.text.scale = PRINT_SCALE if self.colourist.print_mode else 1
+        self.load_logo()
 
     def load_logo(self):
         if self.colourist.print_mode:
@@ -187,21 +448,62 @@ class RainbowAlga(object):
         else:
             image = 'images/km3net_logo.bmp'
 
-        current_path = os.path.dirname(os.path.abspath(__file__))
+        if image not in self.logos:
+            current_path = os.path.dirname(os.path.abspath(__file__))
+            self.logos[image] = Logo(os.path.join(current_path, image))
+        self.logo = self.logos[image]
+
+    def calibrate_event(self, index):
+        """Read and calibrate the hits of an event, sorted by time.
+
+        This is called on the prefetcher's worker threads.
+        """
+        if self.synthetic_events is not None:
+            event = self.synthetic_events[index]
+            return self.calibrate_hits(event.dom_id, event.channel_id,
+                                       event.time, event.tot, event.triggered)
+        with self._reader_lock:
+            h = self.online_reader.events[index].snapshot_hits
+            dom_id = np.array(h.dom_id)
+            channel_id = np.array(h.channel_id)
+            time = np.array(h.time)
+            tot = np.array(h.tot)
+        return self.calibrate_hits(dom_id, channel_id, time, tot)
+
+    def calibrate_streamed_event(self, event):
+        """Calibrate the snapshot hits of a streamed ``DAQEvent``.
+
+        This is called by ``EventStream.get()``, only for the shown events.
+        """
+        h = event.snapshot_hits
+        return self.calibrate_hits(h['dom_id'], h['channel_id'], h['time'],
+                                   h['tot'])
 
-        image_path = os.path.join(current_path, image)
-        self.logo = Image.open(image_path)
-        # Create a raw string from the image data - data will be unsigned bytes
-        # RGBpad, no stride (0), and first line is top of image (-1)
-        self.logo_bytes = self.logo.tobytes("raw", "RGB", 0, -1)
+    def calibrate_hits(self, dom_id, channel_id, time, tot, triggered=None):
+        hits = self.pmt_lookup.apply(dom_id, channel_id, time, tot,
+                                     triggered)
+        return sort_by_time(hits)
 
     def load_blob(self, index=0):
+        """Load an event, blocking until its hits are prepared."""
         print("Loading blob {0}...".format(index))
-        event = self.online_event = self.online_reader.events[index]
+        self.show_blob(index, self.prefetcher.result(index))
+
+    def show_blob(self, index, calibrated_hits):
+        self.event_index = index
+        if self.prefetcher is not None:
+            self.prefetcher.prefetch(index)
 
         self.objects = {}
-        self.shaded_objects = []
+        self.calibrated_hits = calibrated_hits
+        self.dom_hits = None
+        self.hits = None
+        self.hidden_at = None
+        self.n_visible_hits = 0
+        self.picked = self.picked_position = None
+        self.hit_renderer.clear()
         self.time_offset = 0
+        self.legend_offset = 0
 
         # if len(event.mc_tracks[:]) > 0:
         #     nu = event.mc_tracks[0]
@@ -209,119 +511,189 @@ class RainbowAlga(object):
         #         self.add_neutrino(nu)
         #self.add_mc_tracks(event)
         #self.add_reco_tracks(event)
+        if self.synthetic_events is not None:
+            self.add_synthetic_tracks(index)
 
-        self.initialise_spectrum(event, style=self.current_spectrum)
+        self.initialise_spectrum(calibrated_hits, style=self.current_spectrum)
 
     def reload_blob(self):
+        if self.stream is not None and self.streamed_hits is not None:
+            self.show_blob(self.event_index, self.streamed_hits)
+            return
+        if self.prefetcher is None:
+            return
         self.load_blob(self.event_index)
 
-    def initialise_spectrum(self, event, style="default"):
+    def request_blob(self, index):
+        """Swap in the event as soon as it is prepared in the background."""
+        if self.prefetcher is None or index is None or \
+                index not in self.prefetcher:
+            return
+        self.requested_index = index
+        self.prefetcher.request(index)
+        self.swap_in_requested_blob()
 
-        if style == 'default':
-            hits = self.extract_hits(event)
-            if hits is None:
-                return
-            hits = self.remove_hidden_hits(hits)
+    def swap_in_requested_blob(self):
+        index = self.requested_index
+        if index is None:
+            return
+        try:
+            calibrated_hits = self.prefetcher.peek(index)
+        except Exception as e:
+            log.error("Could not load blob {0}: {1}".format(index, e))
+            self.requested_index = None
+            return
+        if calibrated_hits is None:
+            return
+        self.requested_index = None
+        self.show_blob(index, calibrated_hits)
+        self.clock.reset()
 
-            hit_times = hits.time
+    def swap_in_streamed_event(self):
+        """Show the next streamed event once the current one was shown
+        for at least ``stream_interval`` seconds."""
+        if self.stream is None or \
+                time.time() - self._stream_shown_at < self.stream_interval:
+            return
+        item = self.stream.get()
+        if item is None:
+            return
+        event, calibrated_hits = item
+        self.streamed_hits = calibrated_hits
+        self.show_blob(event.trigger_counter, calibrated_hits)
+        self.clock.reset()
+        self._stream_shown_at = time.time()
 
-            if len(hit_times) == 0:
-                log.warn("No hits left after applying cuts.")
-                return
+    def show_timeslice_window(self):
+        """Show the timeslice hits of the window ending at the clock time."""
+        if self.timeslices is None:
+            return
+        time = self.clock.time
+        window = self.timeslice_window
+        self.timeslices.set_time(time, window)
+        state = (time, self.timeslices.n_decoded)
+        if state == self._timeslice_state:
+            return
+        self._timeslice_state = state
+        hits = self.apply_roi(self.timeslices.window(time - window, time))
+        self.calibrated_hits = hits
+        self.dom_hits = None
+        self.hits = hits
+        self.time_offset = self.legend_offset = time - window
+        self.min_hit_time, self.max_hit_time = time - window, time
+        self.hit_renderer.upload(hits, self.time_offset)
+        self.n_visible_hits = np.count_nonzero(
+            passing_tot_cut(hits.tot, self.min_tot))
 
-            self.min_hit_time = min(hit_times)
-            self.max_hit_time = max(hit_times)
+    @property
+    def time_step(self):
+        """The time in ns to rewind or fast forward with the arrow keys."""
+        if self.timeslices is not None:
+            return self.timeslice_window
+        return 300
 
-            self.time_offset = self.min_hit_time
+    def initialise_spectrum(self, calibrated_hits, style="default"):
+        calibrated_hits = self.apply_roi(calibrated_hits)
 
-            self.clock._global_offset = self.min_hit_time / self.clock.speed
+        if style == 'default':
+            # All hits are uploaded, the ToT cut is applied by the shader
+            print("Number of hits: {0}".format(len(calibrated_hits)))
+            hits, hidden_at = self.remove_hidden_hits(calibrated_hits)
+            if len(hits) == 0:
+                log.warning("No hits in this event.")
+                return
 
-            def spectrum(time, hit=None):
-                min_time = self.min_hit_time
-                max_time = self.max_hit_time
-                diff = max_time - min_time
-                one_percent = diff / 100
-                try:
-                    progress = (time - min_time) / one_percent / 100
-                except ZeroDivisionError:
-                    progress = 0
-                return tuple(self.cmap(progress))[:3]
+            self.hits = hits
+            self.hidden_at = hidden_at
+            self.time_offset = hits.time.min()
+            self.hit_renderer.upload(hits, self.time_offset,
+                                     hidden_at=hidden_at)
+            self.update_tot_cut()
+            print("Number of hits after ToT={0} cut: {1}".format(
+                self.min_tot, self.n_visible_hits))
+            if not self.min_tot and len(hits) > 50000:
+                print("Warning: consider applying a ToT filter to reduce the "
+                      "amount of hits, according to your graphic cards "
+                      "performance!")
 
-            self.spectrum = spectrum
+            self.legend_offset = self.min_hit_time
+            self.clock._global_offset = self.min_hit_time / self.clock.speed
 
         if style in [
                 'time_residuals_point_source', 'time_residuals_cherenkov_cone'
         ]:
-            try:
-                track_ins = blob['McTracks']
-            except KeyError:
+            hypothesis = self.cherenkov_hypothesis(style)
+            if hypothesis is None:
                 log.error("No tracks found to determine Cherenkov parameters!")
                 self.current_spectrum = "default"
+                self.initialise_spectrum(calibrated_hits)
                 return
-            # most_energetic_muon = max(track_ins, key=lambda t: t.E)
-            muon_pos = np.mean(track_ins.pos)
-            muon_dir = track_ins.dir[0]
-            # if not pdg2name(most_energetic_muon.particle_type)  \
-            #         in ['mu-', 'mu+']:
-            #     log.error("No muon found to determine Cherenkov parameters!")
-            #     self.current_spectrum = "default"
-            #     return
-
-            hits = self.extract_hits(blob)
+
+            hits = self.extract_hits(calibrated_hits)
             if hits is None:
                 return
             hits = self.first_om_hits(hits)
+            if len(hits) == 0:
+                log.warning("No hits left after selecting the first OM hits.")
+                return
 
-            def cherenkov_time(pmt_pos):
-                """Calculates Cherenkov arrival time in [ns]"""
-                v = pmt_pos - muon_pos
-                l = v.dot(muon_dir)
-                k = np.sqrt(v.dot(v) - l**2)
-                v_g = constants.c_water_km3net
-                theta = constants.theta_cherenkov_water_km3net
-                a_1 = k / np.tan(theta)
-                a_2 = k / np.sin(theta)
-                t_c = 1 / constants.c * (l - a_1) + 1 / v_g * a_2
-                return t_c * 1e9
-
-            def point_source_time(pmt_pos):
-                """Calculates cherenkov arrival time with cascade hypothesis"""
-                vertex_pos = blob['Neutrino'].pos
-
-                v = pmt_pos - vertex_pos
-                v = np.sqrt(v.dot(v))
-                v_g = constants.c_water_antares
-                t_c = v / v_g
-                return t_c * 1e9 + blob['Neutrino'].time
+            pmt_pos = np.column_stack((hits.pos_x, hits.pos_y, hits.pos_z))
+            _, residuals = time_residuals(hits.time, pmt_pos, **hypothesis)
+
+            self.time_offset = min(hits.time)
+            self.legend_offset = 0
+            self.clock._global_offset = self.time_offset / self.clock.speed
 
             self.min_hit_time = -100
             self.max_hit_time = 100
-
-            def spectrum(time, hit=None):
-                if hit:
-                    pmt_pos = self._get_pmt_pos_from_hit(hit)
-                    if not hit.t_cherenkov:
-                        if style == 'time_residuals_point_source':
-                            t_c = point_source_time(pmt_pos)
-                        elif style == 'time_residuals_cherenkov_cone':
-                            t_c = cherenkov_time(pmt_pos)
-                        hit.t_cherenkov = t_c
-                        log.debug("Hit time: {0}, Expected: {1}, "
-                                  "Time Residual: {2}".format(
-                                      time, t_c, time - t_c))
-                    time = time - hit.t_cherenkov
-
-                diff = self.max_hit_time - self.min_hit_time
-                one_percent = diff / 100
-                try:
-                    progress = (time - self.min_hit_time) / one_percent / 100
-                    if progress > 1:
-                        progress = 1
-                except ZeroDivisionError:
-                    progress = 0
-                return tuple(self.cmap(progress))[:3]
-
-            self.spectrum = spectrum
+            self.hits = hits
+            self.hidden_at = None
+            self.n_visible_hits = len(hits)
+            self.hit_renderer.upload(hits, self.time_offset, residuals)
+
+    def update_tot_cut(self):
+        """Update the number and the time range of the uploaded hits
+        passing the ToT cut, without touching the vertex buffer."""
+        times = self.hits.time[passing_tot_cut(self.hits.tot, self.min_tot)]
+        self.n_visible_hits = len(times)
+        if len(times) == 0:
+            self.min_hit_time = self.max_hit_time = self.time_offset
+        else:
+            self.min_hit_time = times.min()
+            self.max_hit_time = times.max()
+
+    def change_min_tot(self, delta):
+        """Change the ToT cut of the current event.
+
+        The time-sorted calibrated hits are kept in memory. In the default
+        spectrum the cut is a shader uniform, the residual spectra have
+        to select the first hits on each OM again.
+        """
+        self.min_tot = (self.min_tot or 0) + delta
+        self.dom_hits = None
+        if self.current_spectrum == 'default':
+            if self.hits is not None:
+                self.update_tot_cut()
+        elif self.calibrated_hits is not None:
+            self.initialise_spectrum(self.calibrated_hits,
+                                     style=self.current_spectrum)
+
+    def cherenkov_hypothesis(self, style):
+        """Track or vertex hypothesis (pos, dir, time in ns) from MC truth."""
+        tracks = self.objects.get("mc_tracks", ())
+        neutrinos = self.objects.get("neutrinos", ())
+        if style == 'time_residuals_point_source':
+            if len(neutrinos):
+                vertices, i = neutrinos, 0
+            elif len(tracks):
+                vertices, i = tracks, np.argmax(tracks.energy)
+            else:
+                return
+            return dict(pos=vertices.pos[i], time=vertices.time[i])
+        if not len(tracks):
+            return
+        i = np.argmax(tracks.energy)
+        return dict(pos=tracks.pos[i], dir=tracks.dir[i], time=tracks.time[i])
 
     def toggle_spectrum(self):
         if self.current_spectrum == 'default':
@@ -335,143 +707,198 @@ class RainbowAlga(object):
             self.current_spectrum = 'default'
         self.reload_blob()
 
-    def remove_hidden_hits(self, hits):
-        log.debug("Skipping removing hidden hits")
-        for hit in hits:
-            rb_hit = Hit(hit.pos_x, hit.pos_y, hit.pos_z, hit.time, 0, 0,
-                         hit.tot)
-            self.shaded_objects.append(rb_hit)
-        return hits
+    def toggle_replaced_hits(self):
+        self.show_replaced_hits = not self.show_replaced_hits
+        if self.calibrated_hits is not None:
+            self.initialise_spectrum(self.calibrated_hits,
+                                     style=self.current_spectrum)
 
+    def remove_hidden_hits(self, hits):
+        """Keep only the hits with a larger ToT than all earlier hits on
+        their DOM, unless the replaced hits are shown.
+
+        Returns the time sorted hits and the times they get replaced (None
+        if all hits are kept), the hit shader hides them from then on.
+        """
+        if self.show_replaced_hits:
+            return hits, None
         log.debug("Removing hidden hits")
-        om_hit_map = {}
-        om_combs = set(zip(hits.du, hits.floor))
-        for om_comb in om_combs:
-            du, floor = om_comb
-            om_hit_map[om_comb] = hits[(hits.du == du) & (hits.floor == floor)]
-        print(om_hit_map)
-        for hit in hits:
-            x, y, z = hit.pos_x, hit.pos_y, hit.pos_z
-            rb_hit = Hit(x, y, z, hit.time, hit.pmt_id, hit.id, hit.tot)
-            om_hit_map.setdefault(line_floor, []).append(rb_hit)
-        hits = []
-        for om, om_hits in om_hit_map.items():
-            largest_hit = None
-            for hit in om_hits:
-                if largest_hit:
-                    if hit.tot > largest_hit.tot:
-                        hidden_hits = om_hits[:om_hits.index(hit)]
-                        hit.replaces_hits = hidden_hits
-                        hits.append(hit)
-                        self.shaded_objects.append(hit)
-                        largest_hit = hit
-                else:
-                    hits.append(hit)
-                    self.shaded_objects.append(hit)
-                    largest_hit = hit
+        kept, replaced_by = largest_tot_hits(hits.dom_id, hits.time,
+                                             hits.tot)
+        hidden_at = np.where(replaced_by >= 0, hits.time[replaced_by], NEVER)
+        order = np.argsort(hits.time[kept], kind='stable')
         print("Number of hits after removing hidden ones: {0}".format(
-            len(hits)))
-        return hits
+            len(kept)))
+        return hits[kept[order]], hidden_at[order]
 
     def first_om_hits(self, hits):
+        """Keep only the first hit on each OM, in time order"""
         log.debug("Entering first_om_hits()")
-        print(hits.time)
-        om_hit_map = {}
-        for hit in hits:
-            if hit.time < 0:
-                continue
-            x, y, z = self._get_pmt_pos_from_hit(hit)
-            rb_hit = Hit(x, y, z, hit.time, hit.pmt_id, hit.id, hit.tot)
-            try:  # EVT file
-                line_floor = self.detector.pmtid2omkey(hit.pmt_id)[:2]
-            except KeyError:  # Other files
-                line, floor, _ = self.detector.doms[hit.dom_id]
-                line_floor = line, floor
-            om_hit_map.setdefault(line_floor, []).append(rb_hit)
-        hits = []
-        for om, om_hits in om_hit_map.items():
-            first_hit = om_hits[0]
-            self.shaded_objects.append(first_hit)
-            hits.append(first_hit)
+        hits = hits[hits.time >= 0]
+        hits = hits[first_dom_hits(hits.dom_id, hits.time)]
         print("Number of first OM hits: {0}".format(len(hits)))
         return hits
 
-    def extract_hits(self, event):
+    def extract_hits(self, hits):
+        """Apply the ToT cut to the calibrated and time sorted hits"""
         log.debug("Entering extract_hits()")
 
-        h = event.snapshot_hits
-        hits = self.geometry.apply(kp.Table({
-            "dom_id": h.dom_id,
-            "tot": h.tot,
-            "time": h.time,
-            "channel_id": h.channel_id,
-        }))
-
         print("Number of hits: {0}".format(len(hits)))
         if self.min_tot:
             hits = hits[hits.tot > self.min_tot]
             print("Number of hits after ToT={0} cut: {1}".format(
                 self.min_tot, len(hits)))
-        if not self.min_tot and len(hits) > 500:
+        if not self.min_tot and len(hits) > 50000:
             print("Warning: consider applying a ToT filter to reduce the "
                   "amount of hits, according to your graphic cards "
                   "performance!")
         if len(hits) == 0:
             log.warning("No hits remaining after applying the ToT cut")
             return
-        return hits.sorted(by='time')
+        return hits
+
+    @property
+    def dom_grid(self):
+        """Uniform grid of the DOM positions, built on first use."""
+        if self._dom_grid is None:
+            self._dom_grid = UniformGrid(self.dom_positions)
+        return self._dom_grid
+
+    @property
+    def pmt_grid(self):
+        """Uniform grid of the PMT positions, built on first use."""
+        if self._pmt_grid is None:
+            pmts = self.pmt_lookup.pmts
+            self._pmt_grid = UniformGrid(
+                np.column_stack((pmts['pos_x'], pmts['pos_y'],
+                                 pmts['pos_z'])))
+        return self._pmt_grid
+
+    @property
+    def hit_grid(self):
+        """Uniform grid of the uploaded hits, rebuilt for each event."""
+        if self._hit_grid is None or self._hit_grid[0] is not self.hits:
+            hits = self.hits
+            self._hit_grid = (hits,
+                              UniformGrid(
+                                  np.column_stack(
+                                      (hits.pos_x, hits.pos_y, hits.pos_z))))
+        return self._hit_grid[1]
+
+    def visible_hits(self):
+        """Mask of the uploaded hits which are drawn at the clock time."""
+        hits = self.hits
+        time = self.clock.time
+        visible = (hits.time <= time) & passing_tot_cut(hits.tot, self.min_tot)
+        if self.hidden_at is not None:
+            visible &= time < self.hidden_at
+        return visible
+
+    def pick(self, x, y):
+        """Pick the nearest visible hit under the window position, or the
+        DOM if no hit is there, and show it in the info panel."""
+        origin, direction = mouse_ray(self.camera, x, y, self.width,
+                                      self.height)
+        if self.hits is not None and len(self.hits) and not self.show_glyphs:
+            radius = hit_radius(self.hits.tot)
+            i = self.hit_grid.pick(origin, direction, radius,
+                                   mask=self.visible_hits())
+            if i is not None:
+                hit = self.hits[i]
+                self.picked_position = self.hit_grid.points[i]
+                self.picked = "Hit on DOM {0} (DU {1}, floor {2}), PMT {3}\n" \
+                              "Time: {4:.1f} ns, ToT: {5} ns".format(
+                                  hit.dom_id, hit.du, hit.floor,
+                                  hit.channel_id, hit.time, hit.tot)
+                return
+        i = self.dom_grid.pick(origin, direction, DOM_PICK_RADIUS)
+        if i is None:
+            self.picked = self.picked_position = None
+            return
+        dom = self.pmt_lookup.doms[i]
+        self.picked_position = self.dom_grid.points[i]
+        self.picked = "DOM {0} (DU {1}, floor {2})".format(
+            dom['dom_id'], dom['du'], dom['floor'])
+        if self.hits is not None:
+            on_dom = self.hits.dom_id == dom['dom_id']
+            self.picked += "\n{0} hits so far".format(
+                np.count_nonzero(on_dom & self.visible_hits()))
+
+    def set_roi(self, radius=ROI_RADIUS):
+        """Only show the hits on PMTs around the picked position."""
+        if self.picked_position is None:
+            log.warning("Pick a hit or a DOM to set the region of interest.")
+            return
+        center = self.picked_position
+        pmts = self.pmt_grid.query_ball(center, radius)
+        self.roi = "ROI: {0} PMTs within {1} m of ({2:.0f}, {3:.0f}, " \
+                   "{4:.0f})".format(len(pmts), radius, *center)
+        self.roi_keys = self.pmt_lookup.keys[pmts]
+        self.refresh_roi()
+
+    def clear_roi(self):
+        if self.roi is None:
+            return
+        self.roi = self.roi_keys = None
+        self.refresh_roi()
+
+    def refresh_roi(self):
+        self.dom_hits = None
+        self._timeslice_state = None
+        self.reload_blob()
+
+    def apply_roi(self, hits):
+        """The hits on the PMTs in the region of interest."""
+        if self.roi_keys is None or hits is None:
+            return hits
+        return hits[np.isin(pmt_keys(hits.dom_id, hits.channel_id),
+                            self.roi_keys)]
+
+    def tracks(self, category, **kwargs):
+        """The track set of a category, created on first use."""
+        if category not in self.objects:
+            self.objects[category] = TrackSet(colourist=self.colourist,
+                                              **kwargs)
+        return self.objects[category]
 
     def add_neutrino(self, neutrino):
         """Add the neutrino to the scene."""
         nu = neutrino
-        particle = Neutrino(nu.pos_x, nu.pos_y, nu.pos_z,
-                            nu.dir_x, nu.dir_y, nu.dir_z, 0)
-        particle.color = (1.0, 0.0, 0.0)
-        particle.line_width = 3
-        self.objects.setdefault("neutrinos", []).append(particle)
+        self.tracks("neutrinos").add_neutrinos(
+            (nu.pos_x, nu.pos_y, nu.pos_z), (nu.dir_x, nu.dir_y, nu.dir_z))
 
     def add_mc_tracks(self, event):
         """Find MC particles and add them to the objects to render."""
         timestamp_in_ns = event.t_sec * 1e9 + event.t_ns
 
         from km3modules.mc import convert_mc_times_to_jte_times
-        time_converter = np.frompyfunc(convert_mc_times_to_jte_times, 3, 1)
-
-        for i in range(event.n_tracks):
-            track = event.mc_tracks[i]
-
-            particle_type = track.pdgid
-            energy = track.E
-            track_length = np.abs(track.len)
-            print("Track length: {0}".format(track_length))
-            if particle_type in (0, 22):  # skip unknowns, photons
-                continue
-#             if angle_between(highest_energetic_track.dir, track.dir) > 0.035:
-#                 # TODO: make this realistic!
-#                 # skip if angle too large
-#                 continue
-# #            if particle_type not in (-11, 11, -13, 13, -15, 15):
-# #                # TODO: make this realistic!
-# #                track_length = 200 * energy / highest_energy
-            particle = Particle(
-                track.pos_x,
-                track.pos_y,
-                track.pos_z,
-                track.dir_x,
-                track.dir_y,
-                track.dir_z,
-                time_converter(track.t, timestamp_in_ns, event.mc_t),
-                constants.c,
-                self.colourist,
-                energy,
-                length=track_length)
-            particle.hidden = not self.show_secondaries
-            # if track.id == highest_energetic_track.id:
-            #     particle.color = (0.0, 1.0, 0.2)
-            #     particle.line_width = 3
-            #     particle.cherenkov_cone_enabled = True
-            #     particle.hidden = False
-            self.objects.setdefault("mc_tracks", []).append(particle)
+
+        tracks = event.mc_tracks
+        particle_types = np.asarray(tracks.pdgid)
+        selected = ~np.isin(particle_types, (0, 22))  # unknowns, photons
+
+        def column(name):
+            return np.asarray(getattr(tracks, name), dtype=float)[selected]
+
+        pos = np.column_stack([column(c) for c in ('pos_x', 'pos_y', 'pos_z')])
+        dir = np.column_stack([column(c) for c in ('dir_x', 'dir_y', 'dir_z')])
+        times = convert_mc_times_to_jte_times(column('t'), timestamp_in_ns,
+                                              event.mc_t)
+        muons = np.abs(particle_types[selected]) == constants.MUON_PDG_ID
+        self.tracks("mc_tracks").add_particles(
+            pos, dir, times, constants.c, length=column('len'),
+            energy=column('E'), hidden=not self.show_secondaries,
+            cherenkov_cone=muons)
+
+    def add_synthetic_tracks(self, index):
+        """Add the true muons and cascades of a synthetic event."""
+        tracks = self.synthetic_events.tracks(index)
+        pos = np.column_stack([tracks['pos_' + c] for c in 'xyz'])
+        dir = np.column_stack([tracks['dir_' + c] for c in 'xyz'])
+        self.tracks("mc_tracks").add_particles(
+            pos, dir, tracks['time'], constants.c, length=tracks['length'],
+            energy=tracks['energy'], hidden=not self.show_secondaries,
+            cherenkov_cone=tracks['type'] == constants.MUON_PDG_ID)
 
     def add_reco_tracks(self, blob):
         """Find reco particles and add them to the objects to render."""
@@ -508,32 +935,51 @@ class RainbowAlga(object):
     def toggle_secondaries(self):
         self.show_secondaries = not self.show_secondaries
 
-        secondaries = self.objects["mc_tracks"]
-        for secondary in secondaries:
-            secondary.hidden = not self.show_secondaries
-
-        highest_energetic = max(secondaries, key=lambda s: s.energy)
-        if highest_energetic:
-            highest_energetic.hidden = False
+        secondaries = self.objects.get("mc_tracks")
+        if secondaries is None or len(secondaries) == 0:
+            return
+        secondaries.hidden[:] = not self.show_secondaries
+        secondaries.hidden[np.argmax(secondaries.energy)] = False
 
     def load_next_blob(self):
-        print("Loading next blob")
-        try:
-            self.load_blob(self.event_index + 1)
-        except IndexError:
+        if self.timeslices is not None:
+            self.clock.fast_forward(TIMESLICE_DURATION)
             return
-        else:
-            self.clock.reset()
-            self.event_index += 1
+        print("Loading next blob")
+        self.request_blob(self.step_index(1))
 
     def load_previous_blob(self):
-        try:
-            self.load_blob(self.event_index - 1)
-        except IndexError:
+        if self.timeslices is not None:
+            self.clock.rewind(TIMESLICE_DURATION)
             return
+        self.request_blob(self.step_index(-1))
+
+    def step_index(self, step):
+        """The index of the next (1) or previous (-1) selected event,
+        None if there is none."""
+        if self.selection is None:
+            return self.event_index + step
+        if step > 0:
+            i = np.searchsorted(self.selection, self.event_index, 'right')
         else:
-            self.clock.reset()
-            self.event_index -= 1
+            i = np.searchsorted(self.selection, self.event_index, 'left') - 1
+        if 0 <= i < len(self.selection):
+            return int(self.selection[i])
+
+    def jump_to_trigger_counter(self):
+        """Show the event with the trigger counter typed in digits."""
+        digits, self.jump_digits = self.jump_digits, ''
+        if not digits:
+            return
+        if self.file_index is None:
+            print("The event index is not available (yet).")
+            return
+        try:
+            index = self.file_index.find_trigger_counter(int(digits))
+        except KeyError as e:
+            print(e)
+            return
+        self.request_blob(index)
 
     def init_opengl(self, width, height, x, y):
         glutInit()
@@ -551,6 +997,9 @@ class RainbowAlga(object):
         glutKeyboardFunc(self.keyboard)
         glutSpecialFunc(self.special_keyboard)
 
+        self.init_gl_state()
+
+    def init_gl_state(self):
         glClearDepth(1.0)
         glClearColor(0.0, 0.0, 0.0, 0.0)
         glMatrixMode(GL_PROJECTION)
@@ -572,7 +1021,6 @@ class RainbowAlga(object):
         glEnable(GL_LIGHT0)
         glEnable(GL_NORMALIZE)
         glEnable(GL_COLOR_MATERIAL)
-        glEnable(GL_LIGHTING)
 
         glLightfv(GL_LIGHT0, GL_AMBIENT, light_ambient)
         glLightfv(GL_LIGHT0, GL_DIFFUSE, light_diffuse)
@@ -589,62 +1037,80 @@ class RainbowAlga(object):
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
     def render(self):
+        profiler = self.profiler
+        profiler.start_frame()
         self.clock.record_frame_time()
+        with profiler.stage('events'):
+            self.swap_in_requested_blob()
+            self.swap_in_streamed_event()
+            self.show_timeslice_window()
+
+        with profiler.stage('clear'):
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+
+            self.colourist.now_background()
+
+            if self.camera.is_rotating:
+                self.camera.rotate_z(0.2)
+            self.camera.look()
+            # the text of the previous frame disables the depth test
+            glEnable(GL_DEPTH_TEST)
+            glEnable(GL_LINE_SMOOTH)
+            glShadeModel(GL_FLAT)
+
+        with profiler.stage('detector'):
+            self.draw_detector()
+
+        with profiler.stage('hits'):
+            if self.show_glyphs:
+                self.draw_glyphs()
+            else:
+                self.hit_renderer.draw(self.clock.time - self.time_offset,
+                                       self.height, self.cmap,
+                                       (self.min_hit_time, self.max_hit_time),
+                                       self.min_tot)
 
-        if self.is_recording and not self.timer.is_snoozed:
-            self.frame_index += 1
-            frame_name = "Frame_{0:05d}.jpg".format(self.frame_index)
-            self.save_screenshot(frame_name)
-            self.timer.snooze()
-
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-
-        self.colourist.now_background()
-
-        if self.camera.is_rotating:
-            self.camera.rotate_z(0.2)
-        self.camera.look()
-
-        self.draw_detector()
-
-        glEnable(GL_DEPTH_TEST)
-        glEnable(GL_LINE_SMOOTH)
-        glShadeModel(GL_FLAT)
-        glEnable(GL_LIGHTING)
-
-        for obj in self.shaded_objects:
-            obj.draw(self.clock.time, self.spectrum)
-
-        glDisable(GL_LIGHTING)
+        with profiler.stage('tracks'):
+            for tracks in self.objects.values():
+                tracks.draw(self.clock.time)
 
-        for obj in itertools.chain.from_iterable(self.objects.values()):
-            obj.draw(self.clock.time)
+        with profiler.stage('gui'):
+            self.draw_gui()
 
-        self.draw_gui()
+        if self.is_recording and not self.timer.is_snoozed:
+            with profiler.stage('recording'):
+                self.record_frame()
+            self.timer.snooze()
 
-        glutSwapBuffers()
+        if not self.headless:
+            with profiler.stage('swap'):
+                glutSwapBuffers()
+        profiler.end_frame()
+        if self.startup.end() and self.profile_startup:
+            print(self.startup.report())
 
     def draw_detector(self):
-        glUseProgram(self.shader)
-        try:
-            self.dom_positions_vbo.bind()
-            try:
-                glEnableClientState(GL_VERTEX_ARRAY)
-                glVertexPointerf(self.dom_positions_vbo)
-                glPointSize(2)
-                glDrawArrays(GL_POINTS, 0, len(self.dom_positions) * 3)
-            finally:
-                self.dom_positions_vbo.unbind()
-                glDisableClientState(GL_VERTEX_ARRAY)
-        finally:
-            glUseProgram(0)
+        self.detector_scene.draw(self.camera.pos)
 
-    def draw_gui(self):
-        logo = self.logo
-        logo_bytes = self.logo_bytes
+    def draw_glyphs(self):
+        """Draw one glyph per DOM with the hits up to the clock time."""
+        if self.calibrated_hits is None:
+            return
+        if self.dom_hits is None:
+            self.dom_hits = DomHits(self.pmt_lookup.doms['dom_id'],
+                                    self.apply_roi(self.calibrated_hits),
+                                    self.min_tot)
+            self.glyph_renderer.update(self.dom_hits, self.time_offset)
+        if self.dom_hits.advance(self.clock.time):
+            self.glyph_renderer.update(self.dom_hits, self.time_offset)
+        first, last = self.dom_hits.time_range
+        self.glyph_renderer.draw(
+            self.height, self.cmap,
+            (first - self.time_offset, last - self.time_offset))
 
-        width = glutGet(GLUT_WINDOW_WIDTH)
-        height = glutGet(GLUT_WINDOW_HEIGHT)
+    def draw_gui(self):
+        width = self.width
+        height = self.height
         glMatrixMode(GL_PROJECTION)
         glPushMatrix()
         glLoadIdentity()
@@ -655,22 +1121,18 @@ class RainbowAlga(object):
 
         glClear(GL_DEPTH_BUFFER_BIT)
 
-        try:
+        if self.min_hit_time is not None:
             self.draw_colour_legend()
-        except TypeError:
-            pass
 
-        glPushMatrix()
-        glLoadIdentity()
-        glRasterPos(4, logo.size[1] + 4)
-        glDrawPixels(logo.size[0], logo.size[1], GL_RGB, GL_UNSIGNED_BYTE,
-                     logo_bytes)
-        glPopMatrix()
+        self.logo.draw(4, 4)
 
         glMatrixMode(GL_PROJECTION)
         glPopMatrix()
         glMatrixMode(GL_MODELVIEW)
 
+        if self.headless:  # no interactive overlays in rendered images
+            return
+
         self.colourist.now_text()
 
         if self.show_help:
@@ -679,52 +1141,36 @@ class RainbowAlga(object):
         if self.show_info:
             self.display_info()
 
+        if self.show_profile:
+            self.display_profile()
+
     def draw_colour_legend(self):
-        menubar_height = self.logo.size[1] + 4
-        width = glutGet(GLUT_WINDOW_WIDTH)
-        height = glutGet(GLUT_WINDOW_HEIGHT)
-        # Colour legend
-        left_x = width - 20
-        right_x = width - 10
-        min_y = menubar_height + 5
-        max_y = height - 20
-        time_step_size = math.ceil(
-            (self.max_hit_time - self.min_hit_time) / 20 / 50) * 50
-        hit_times = list(
-            range(
-                int(self.min_hit_time), int(self.max_hit_time),
-                int(time_step_size)))
-        if len(hit_times) > 1:
-            segment_height = int((max_y - min_y) / len(hit_times))
-            glMatrixMode(GL_MODELVIEW)
-            glLoadIdentity()
-            glDisable(GL_LIGHTING)
-            glBegin(GL_QUADS)
-            for hit_time in hit_times:
-                segment_nr = hit_times.index(hit_time)
-                glColor3f(*self.spectrum(hit_time))
-                glVertex2f(left_x, max_y - segment_height * segment_nr)
-                glVertex2f(right_x, max_y - segment_height * segment_nr)
-                glColor3f(*self.spectrum(hit_time + time_step_size))
-                glVertex2f(left_x, max_y - segment_height * (segment_nr + 1))
-                glVertex2f(right_x, max_y - segment_height * (segment_nr + 1))
-            glEnd()
-
-            # Colour legend labels
-            self.colourist.now_text()
-            for hit_time in hit_times:
-                segment_nr = hit_times.index(hit_time)
-                draw_text_2d(
-                    "{0:>5}ns".format(int(hit_time - self.time_offset)),
-                    width - 80, (height - max_y) + segment_height * segment_nr)
+        legend = self.colour_legend
+        legend.update(self.width, self.height, self.logo.size[1] + 4,
+                      (self.min_hit_time, self.max_hit_time), self.cmap,
+                      self.colourist.print_mode, self.legend_offset,
+                      self.text.scale)
+        glMatrixMode(GL_MODELVIEW)
+        glLoadIdentity()
+        legend.draw()
+
+        if self.headless and self.text.needs_window:
+            return
+
+        self.colourist.now_text()
+        for label, x, y in legend.labels:
+            self.text.draw(label, x, y)
 
     def resize(self, width, height):
-        if width < 400:
-            glutReshapeWindow(400, height)
-        if height < 300:
-            glutReshapeWindow(width, 300)
+        if not self.headless:
+            if width < 400:
+                glutReshapeWindow(400, height)
+            if height < 300:
+                glutReshapeWindow(width, 300)
         if height == 0:
             height = 1
+        self.width = width
+        self.height = height
 
         glViewport(0, 0, width, height)
         glMatrixMode(GL_PROJECTION)
@@ -733,7 +1179,7 @@ class RainbowAlga(object):
         glMatrixMode(GL_MODELVIEW)
 
     def mouse(self, button, state, x, y):
-        width = glutGet(GLUT_WINDOW_WIDTH)
+        width = self.width
 
         if button == GLUT_LEFT_BUTTON:
             if state == GLUT_DOWN:
@@ -742,9 +1188,13 @@ class RainbowAlga(object):
                 else:
                     self.drag_mode = 'rotate'
                     self.camera.is_rotating = False
+                    self._clicked_at = (x, y)
                 self.mouse_x = x
                 self.mouse_y = y
             if state == GLUT_UP:
+                if self._clicked_at is not None:  # not dragged
+                    self.pick(x, y)
+                self._clicked_at = None
                 self.drag_mode = None
         if button == 3:
             self.camera.distance = self.camera.distance + 2
@@ -764,45 +1214,57 @@ class RainbowAlga(object):
         if (key == b"-"):
             self.camera.distance = self.camera.distance + 50
         if (key == b"."):
-            self.min_tot += 0.5
-            self.reload_blob()
+            self.change_min_tot(0.5)
         if (key == b","):
-            self.min_tot -= 0.5
-            self.reload_blob()
+            self.change_min_tot(-0.5)
         if (key == b'n'):
             self.load_next_blob()
         if (key == b'p'):
             self.load_previous_blob()
+        if key.isdigit():
+            self.jump_digits += key.decode()
+        if (key in (b'\x08', b'\x7f')):
+            self.jump_digits = self.jump_digits[:-1]
+        if (key == b'j'):
+            self.jump_to_trigger_counter()
         if (key == b'u'):
             self.toggle_secondaries()
+        if (key == b'o'):
+            self.toggle_replaced_hits()
+        if (key == b'g'):
+            self.show_glyphs = not self.show_glyphs
+            self.dom_hits = None
+        if (key == b'k'):
+            self.set_roi()
+        if (key == b'K'):
+            self.clear_roi()
         if (key == b't'):
             self.toggle_spectrum()
         if (key == b'x'):
             self.cmap = self.colourist.next_cmap
         if (key == b'm'):
-            self.colourist.print_mode = not self.colourist.print_mode
-            self.load_logo()
+            self.toggle_print_mode()
         if (key == b'a'):
             self.camera.is_rotating = not self.camera.is_rotating
         if (key == b'c'):
             self.colourist.cherenkov_cone_enabled = \
                 not self.colourist.cherenkov_cone_enabled
         if (key == b"s"):
-            event_number = self.blob['start_event'][0]
-            try:
-                neutrino = self.blob['Neutrino']
-            except KeyError:
-                neutrino_str = ''
-            else:
-                neutrino_str = str(neutrino).replace(' ', '_').replace(',', '')
-                neutrino_str = neutrino_str.replace('Neutrino:', '')
-            screenshot_name = "RA_Event{0}_ToTCut{1}{2}_t{3}ns.png".format(
-                event_number, self.min_tot, neutrino_str, int(self.clock.time))
-
-            self.save_screenshot(screenshot_name)
+            self.save_screenshot(self.screenshot_name)
         if (key == b'v'):
-            self.frame_index = 0
-            self.is_recording = not self.is_recording
+            if self.is_recording:
+                self.stop_recording()
+            else:
+                self.start_recording()
+        if (key == b'f'):
+            self.show_profile = not self.show_profile
+        if (key == b'F'):
+            json_file, csv_file = self.profiler.dump()
+            print("Profile saved as '{0}' and '{1}'.".format(
+                json_file, csv_file))
+        if (key == b'G'):
+            self.profiler.sync = not self.profiler.sync
+            self.profiler.reset()
         if (key == b" "):
             if self.clock.is_paused:
                 self.clock.resume()
@@ -813,11 +1275,15 @@ class RainbowAlga(object):
 
     def special_keyboard(self, key, x, z):
         if key == GLUT_KEY_LEFT:
-            self.clock.rewind(300)
+            self.clock.rewind(self.time_step)
         if key == GLUT_KEY_RIGHT:
-            self.clock.fast_forward(300)
+            self.clock.fast_forward(self.time_step)
 
     def drag(self, x, y):
+        if self._clicked_at is not None:
+            click_x, click_y = self._clicked_at
+            if abs(x - click_x) + abs(y - click_y) > 2:
+                self._clicked_at = None
         if self.drag_mode == 'rotate':
             self.camera.rotate_z(self.mouse_x - x)
             self.camera.move_z(-(self.mouse_y - y) * 8)
@@ -831,16 +1297,59 @@ class RainbowAlga(object):
         self.mouse_x = x
         self.mouse_y = y
 
-    def save_screenshot(self, name='screenshot.png'):
-        width = glutGet(GLUT_WINDOW_WIDTH)
-        height = glutGet(GLUT_WINDOW_HEIGHT)
-        pixelset = (GLubyte * (3 * width * height))(0)
-        glReadPixels(0, 0, width, height, GL_RGB, GL_UNSIGNED_BYTE, pixelset)
-        image = Image.frombytes(
-            mode="RGB", size=(width, height), data=pixelset)
-        image = image.transpose(Image.FLIP_TOP_BOTTOM)
-        image.save(name)
-        print("Screenshot saved as '{0}'.".format(name))
+    def save_screenshot(self, name='screenshot.png', wait=None):
+        """Save the frame buffer, encoded in the background unless waiting.
+
+        Headless instances wait for the file by default.
+        """
+        if wait is None:
+            wait = self.headless
+        frame = read_pixels(self.width, self.height)
+        if wait:
+            ImageSequenceWriter().write(np.flipud(frame), name)
+            print("Screenshot saved as '{0}'.".format(name))
+            return
+        if self.screenshots is None:
+            self.screenshots = FrameQueue(ImageSequenceWriter())
+        if self.screenshots.submit(frame, name):
+            print("Saving screenshot as '{0}'.".format(name))
+        else:
+            log.warning("Screenshot '{0}' dropped, the writer is busy."
+                        .format(name))
+
+    def start_recording(self):
+        try:
+            fps = int(round(1 / self.timer.snooze_interval))
+            writer = make_writer(self.record_to, fps=fps)
+        except (IOError, OSError) as e:
+            log.error("Could not start recording: {0}".format(e))
+            return
+        if self.pixel_reader is None:
+            self.pixel_reader = PixelBufferReader()
+        self.recorder = FrameQueue(writer)
+        self.is_recording = True
+        self.timer.reset()
+        print("Recording to '{0}'...".format(self.record_to))
+
+    def record_frame(self):
+        frame = self.pixel_reader.read(self.width, self.height)
+        if frame is not None:
+            self.recorder.submit(frame)
+
+    def stop_recording(self):
+        self.is_recording = False
+        frame = self.pixel_reader.flush()
+        if frame is not None:
+            self.recorder.submit(frame)
+        self.recorder.close(wait=False)  # the writer finishes in background
+        print("Recording stopped: {0}".format(self.recorder))
+
+    def show_all_hits(self):
+        """Stop the clock at the time when all hits are visible."""
+        self.clock.reset()
+        self.clock.pause()
+        if self.max_hit_time is not None:
+            self.clock.fast_forward(self.max_hit_time - self.clock.time + 1)
 
     @property
     def help_string(self):
@@ -848,19 +1357,28 @@ class RainbowAlga(object):
             options = {
                 'h': 'help',
                 'i': 'show event info',
-                'n': 'next event',
-                'p': 'previous event',
-                'LEFT': '+100ns',
-                'RIGHT': '-100ns',
+                'n': 'next event (timeslice)',
+                'p': 'previous event (timeslice)',
+                '<digits> j': 'jump to the event with this trigger counter',
+                'LEFT': '-300ns (one window in timeslices)',
+                'RIGHT': '+300ns (one window in timeslices)',
                 'a': 'enable/disable rotation animation',
                 'c': 'enable/disable Cherenkov cone',
                 't': 'toggle between spectra',
                 'u': 'toggle secondaries',
+                'o': 'show/hide hits replaced by a larger ToT on their DOM',
+                'g': 'toggle one glyph per DOM instead of the hits',
+                '<click>': 'show the hit or the DOM under the mouse',
+                'k': 'only show the hits around the clicked hit or DOM',
+                'K': 'show the hits of the whole detector again',
                 'x': 'cycle through colour schemes',
                 'm': 'toggle screen/print mode',
                 's': 'save screenshot (screenshot.png)',
-                'v': 'start/stop recording (Frame_XXXXX.jpg)',
+                'v': 'start/stop recording (see --record-to)',
                 'r': 'reset time',
+                'f': 'show/hide the render profile',
+                'F': 'save the render profile (JSON and CSV)',
+                'G': 'wait for the GPU after each profiled stage',
                 '<space>': 'pause time',
                 '+ or -': 'zoom in/out',
                 ', or .': 'decrease/increase min_tot by 0.5ns',
@@ -874,30 +1392,87 @@ class RainbowAlga(object):
         return self._help_string
 
     @property
-    def blob_info(self):
-        if not self.blob:
-            return ''
-        info_text = ''
-        if 'start_event' in self.blob:
-            event_number = self.blob['start_event'][0]
-            info_text += "Event #{0}, ToT>{1}ns\n" \
-                         .format(event_number, self.min_tot)
-        if 'Neutrion' in self.blob:
-            neutrino = self.blob['Neutrino']
-            info_text += str(neutrino)
+    def event_summary(self):
+        entry = self.file_index[self.event_index]
+        summary = "Event {0} of {1}: run {2}, trigger counter {3}, " \
+                  "{4} hits ({5} triggered)".format(
+                      self.event_index, len(self.file_index), entry['run'],
+                      entry['trigger_counter'], entry['n_hits'],
+                      entry['n_triggered_hits'])
+        if self.selection is not None:
+            summary += "\n{0} events selected by {1}".format(
+                len(self.selection), self.selection_cut)
+        if self.jump_digits:
+            summary += "\nJump to trigger counter: {0} (press j)".format(
+                self.jump_digits)
+        return summary
 
-        return info_text
+    @property
+    def event_number(self):
+        """The trigger counter of the shown event, its index if unknown."""
+        if self.file_index is not None and \
+                0 <= self.event_index < len(self.file_index):
+            return int(self.file_index[self.event_index]['trigger_counter'])
+        return self.event_index
+
+    @property
+    def screenshot_name(self):
+        return "RA_Event{0}_ToTCut{1}_t{2}ns.png".format(
+            self.event_number, self.min_tot, int(self.clock.time))
+
+    @property
+    def event_info(self):
+        if self.calibrated_hits is None or self.timeslices is not None:
+            return ''
+        return "Event #{0}, ToT>{1}ns".format(self.event_number,
+                                               self.min_tot)
 
     def display_help(self):
-        pos_y = glutGet(GLUT_WINDOW_HEIGHT) - 80
-        draw_text_2d(self.help_string, 10, pos_y)
+        pos_y = self.height - 80
+        self.text.draw(self.help_string, 10, pos_y)
+
+    def display_profile(self):
+        self.text.draw(
+            "{0}\n{1}".format(self.profiler.overlay_text(),
+                              self.detector_scene), self.width - 450,
+            self.height - 80)
 
     def display_info(self):
-        draw_text_2d(
-            "FPS:  {0:.1f}\nTime: {1:.0f} (+{2:.0f}) ns".format(
+        self.text.draw(
+            "FPS:  {0:.1f}\nTime: {1:.0f} (+{2:.0f}) ns\n"
+            "Hits: {3} (ToT > {4} ns)".format(
                 self.clock.fps, self.clock.time - self.time_offset,
-                self.time_offset), 10, 30)
-        draw_text_2d(self.blob_info, 150, 30)
+                self.time_offset, self.n_visible_hits, self.min_tot or 0),
+            10, 30)
+        if self.show_glyphs and self.dom_hits is not None:
+            self.text.draw("DOMs: {0}".format(self.dom_hits.n_hit_doms),
+                           10, 140)
+        if self.prefetcher is not None:
+            cache_info = "Cache: {0}".format(self.prefetcher.cache)
+            if self.requested_index is not None:
+                cache_info += "\nLoading event {0}...".format(
+                    self.requested_index)
+            self.text.draw(cache_info, 10, 60)
+        if self.file_index is not None:
+            self.text.draw(self.event_summary, 10, 160)
+        if self.synthetic_events is not None:
+            self.text.draw("Synthetic event {0} of {1}".format(
+                self.event_index, len(self.synthetic_events)), 10, 160)
+        if self.timeslices is not None:
+            self.text.draw("{0} timeslices: {1}".format(
+                self.timeslices.source.stream, self.timeslices), 10, 60)
+        if self.stream is not None:
+            stream_info = "Stream: {0}".format(self.stream)
+            if not self.stream.is_connected:
+                stream_info += "\nConnecting to {0}:{1}...".format(
+                    self.stream.host, self.stream.port)
+            self.text.draw(stream_info, 10, 60)
+        if self.is_recording:
+            self.text.draw("REC {0}".format(self.recorder), 10, 100)
+        picked = '\n'.join(info for info in (self.picked, self.roi) if info)
+        if picked:
+            self.text.draw(picked, 10, 230)
+        self.text.draw(self.event_info, 150, 30)
 
 
 def main():
@@ -914,8 +1489,68 @@ def main():
         skip_to_blob = int(arguments['-s'])
     except TypeError:
         skip_to_blob = 0
-
-    app = RainbowAlga(detector, event_file, min_tot, skip_to_blob)  # noqa
+    prefetch = int(arguments['--prefetch'])
+    cache_size = float(arguments['--cache-size'])
+
+    if arguments['render']:
+        from rainbowalga.headless import render_events, parse_size
+        width, height = parse_size(arguments['--size'])
+        jobs = int(arguments['--jobs']) if arguments['--jobs'] else None
+        render_events(event_file, detector, min_tot, arguments['--events'],
+                      arguments['--out'], jobs=jobs, width=width,
+                      height=height, platform=arguments['--platform'],
+                      simulate=arguments['--simulate'])
+        return
+
+    if arguments['scan']:
+        from rainbowalga.scan import scan_files
+        jobs = int(arguments['--jobs']) if arguments['--jobs'] else None
+        scan_files(arguments['ROOT_FILES'], arguments['--where'],
+                   arguments['--candidates'] or 'candidates.csv',
+                   min_tot=min_tot, detector=detector, jobs=jobs,
+                   chunk_size=int(arguments['--chunk-size']))
+        return
+
+    candidates = None
+    if arguments['--candidates']:
+        from rainbowalga.scan import read_candidates
+        candidate_files = read_candidates(arguments['--candidates'])
+        if event_file is None and candidate_files:
+            event_file = next(iter(candidate_files))
+        candidates = []
+        for filename, indices in candidate_files.items():
+            if os.path.abspath(filename) == os.path.abspath(event_file):
+                candidates = indices
+
+    stream = None
+    if arguments['stream']:
+        stream = dict(host=arguments['--host'],
+                      port=int(arguments['--port']),
+                      policy=arguments['--policy'],
+                      max_size=int(arguments['--queue-size']))
+
+    timeslices = None
+    if arguments['timeslices']:
+        timeslices = dict(stream=arguments['--stream'],
+                          window=float(arguments['--window']),
+                          capacity=int(float(arguments['--buffer-size'])))
+
+    trigger_counter = arguments['--trigger-counter']
+    utc_time = arguments['--time']
+
+    app = RainbowAlga(detector, event_file, min_tot, skip_to_blob,  # noqa
+                      prefetch=prefetch, cache_size=cache_size,
+                      record_to=arguments['--record-to'], stream=stream,
+                      stream_interval=float(arguments['--interval']),
+                      use_index=not arguments['--no-index'],
+                      select=arguments['--select'],
+                      trigger_counter=None if trigger_counter is None
+                      else int(trigger_counter),
+                      utc_time=None if utc_time is None else float(utc_time),
+                      candidates=candidates,
+                      simulate=arguments['--simulate'],
+                      timeslices=timeslices,
+                      profile_startup=arguments['--profile-startup'])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,251 @@
+# coding=utf-8
+# Filename: calibration.py
+"""
+Vectorised calibration of hits.
+
+The PMT parameters of a detector are stored in flat arrays, sorted by a
+combined ``(dom_id, channel_id)`` key. Calibrating an event is then a single
+``np.searchsorted`` and a few fancy-indexing operations.
+
+Parsed detectors are cached as memory-mappable ``.npy`` files, so a DETX
+file has to be parsed only once.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import hashlib
+import os
+
+import numpy as np
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+CACHE_DIR = os.environ.get(
+    'RAINBOWALGA_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'rainbowalga'))
+CACHE_VERSION = 1
+
+HITS_DTYPE = np.dtype([
+    ('dom_id', '<i4'),
+    ('channel_id', 'u1'),
+    ('time', '<f8'),
+    ('tot', 'u1'),
+    ('triggered', '?'),
+    ('pos_x', '<f8'),
+    ('pos_y', '<f8'),
+    ('pos_z', '<f8'),
+    ('dir_x', '<f8'),
+    ('dir_y', '<f8'),
+    ('dir_z', '<f8'),
+    ('t0', '<f8'),
+    ('du', 'u2'),
+    ('floor', 'u1'),
+    ('pmt_id', '<i4'),
+])
+
+PMTS_DTYPE = np.dtype([
+    ('dom_id', '<i4'),
+    ('channel_id', 'u1'),
+    ('pmt_id', '<i4'),
+    ('du', 'u2'),
+    ('floor', 'u1'),
+    ('pos_x', '<f8'),
+    ('pos_y', '<f8'),
+    ('pos_z', '<f8'),
+    ('dir_x', '<f8'),
+    ('dir_y', '<f8'),
+    ('dir_z', '<f8'),
+    ('t0', '<f8'),
+])
+
+DOMS_DTYPE = np.dtype([
+    ('dom_id', '<i4'),
+    ('du', 'u2'),
+    ('floor', 'u1'),
+    ('pos_x', '<f8'),
+    ('pos_y', '<f8'),
+    ('pos_z', '<f8'),
+])
+
+
+def pmt_keys(dom_id, channel_id):
+    """Combine DOM and channel IDs into a single sortable int64 key."""
+    return (np.asarray(dom_id, dtype=np.int64) << 8) | np.asarray(
+        channel_id, dtype=np.int64)
+
+
+class PMTLookup(object):
+    """Array backed index from ``(dom_id, channel_id)`` to the PMT parameters.
+
+    :param pmts: A structured array with the fields of ``PMTS_DTYPE``
+    :param doms: A structured array with the fields of ``DOMS_DTYPE``. If
+                 not given, the DOM positions are the mean PMT positions.
+
+    """
+
+    def __init__(self, pmts, doms=None):
+        keys = pmt_keys(pmts['dom_id'], pmts['channel_id'])
+        if np.all(keys[1:] > keys[:-1]):  # e.g. memory-mapped from the cache
+            self.keys = keys
+            self.pmts = pmts
+        else:
+            order = np.argsort(keys, kind='stable')
+            self.keys = keys[order]
+            self.pmts = np.asarray(pmts)[order]
+        if doms is None:
+            doms = self._doms_from_pmts(self.pmts)
+        self.doms = doms
+
+    @classmethod
+    def from_detector(cls, detector):
+        """Create the lookup from a ``km3pipe.hardware.Detector``"""
+        table = detector.pmts
+        pmts = np.empty(len(table), dtype=PMTS_DTYPE)
+        for name in PMTS_DTYPE.names:
+            pmts[name] = table[name]
+        dom_positions = detector.dom_positions
+        doms = np.empty(len(dom_positions), dtype=DOMS_DTYPE)
+        doms['dom_id'] = list(dom_positions.keys())
+        doms['du'] = [detector.doms[i][0] for i in doms['dom_id']]
+        doms['floor'] = [detector.doms[i][1] for i in doms['dom_id']]
+        positions = np.array(list(dom_positions.values()))
+        doms['pos_x'] = positions[:, 0]
+        doms['pos_y'] = positions[:, 1]
+        doms['pos_z'] = positions[:, 2]
+        return cls(pmts, doms)
+
+    @staticmethod
+    def _doms_from_pmts(pmts):
+        dom_ids, first, inverse = np.unique(pmts['dom_id'],
+                                            return_index=True,
+                                            return_inverse=True)
+        n_pmts = np.bincount(inverse)
+        doms = np.empty(len(dom_ids), dtype=DOMS_DTYPE)
+        doms['dom_id'] = dom_ids
+        doms['du'] = pmts['du'][first]
+        doms['floor'] = pmts['floor'][first]
+        for name in ('pos_x', 'pos_y', 'pos_z'):
+            doms[name] = np.bincount(inverse, pmts[name]) / n_pmts
+        return doms
+
+    def __len__(self):
+        return len(self.pmts)
+
+    @property
+    def dom_positions(self):
+        """The DOM positions as a float32 array with shape (n_doms, 3)"""
+        return np.column_stack((self.doms['pos_x'], self.doms['pos_y'],
+                                self.doms['pos_z'])).astype(np.float32)
+
+    def indices(self, dom_id, channel_id):
+        """Indices of the PMTs in ``self.pmts`` for the given IDs."""
+        keys = pmt_keys(dom_id, channel_id)
+        idx = np.searchsorted(self.keys, keys)
+        idx[idx == len(self.keys)] = 0
+        unknown = self.keys[idx] != keys
+        if np.any(unknown):
+            first = np.flatnonzero(unknown)[0]
+            raise KeyError("No calibration for DOM {0}, channel {1}. Wrong "
+                           "calibration (DETX) data provided?".format(
+                               np.asarray(dom_id)[first],
+                               np.asarray(channel_id)[first]))
+        return idx
+
+    def apply(self, dom_id, channel_id, time, tot, triggered=None,
+              correct_slewing=True):
+        """Return the calibrated hits as a record array.
+
+        The time of each hit is corrected by its PMT's t0 and, by default,
+        by the time slewing of the PMT response.
+        """
+        pmts = self.pmts[self.indices(dom_id, channel_id)]
+        tot = np.asarray(tot)
+        hits = np.empty(len(pmts), dtype=HITS_DTYPE).view(np.recarray)
+        hits.dom_id = dom_id
+        hits.channel_id = channel_id
+        hits.tot = tot
+        hits.triggered = False if triggered is None else triggered
+        for name in ('pos_x', 'pos_y', 'pos_z', 'dir_x', 'dir_y', 'dir_z',
+                     't0', 'du', 'floor', 'pmt_id'):
+            hits[name] = pmts[name]
+        hits.time = np.asarray(time, dtype=np.float64) + pmts['t0']
+        if correct_slewing and len(hits):
+            hits.time -= slew(tot.astype(np.int64))
+        return hits
+
+
+def slew(tot):
+    """The time slewing [ns] of hits with the given ToTs.
+
+    ``km3pipe`` takes more than a second to import, so it is only imported
+    when the first hits are calibrated.
+    """
+    from km3pipe.calib import slew as km3pipe_slew
+    return km3pipe_slew(tot)
+
+
+def sort_by_time(hits):
+    """Return the hits sorted by time (stable for equal times)."""
+    return hits[np.argsort(hits.time, kind='stable')]
+
+
+def detector_cache_key(detector):
+    """Cache key for a DETX file (path, size, mtime) or a detector ID."""
+    if _is_detx(detector):
+        stat = os.stat(detector)
+        signature = "{0}:{1}:{2}".format(
+            os.path.abspath(detector), stat.st_size, stat.st_mtime_ns)
+    else:
+        signature = "det_id:{0}".format(detector)
+    signature += ":v{0}".format(CACHE_VERSION)
+    return hashlib.sha1(signature.encode('utf-8')).hexdigest()
+
+
+def load_pmt_lookup(detector, cache_dir=CACHE_DIR):
+    """Load the PMT lookup for a DETX file or detector ID.
+
+    The first call parses the detector with km3pipe and writes the PMT and
+    DOM tables to ``cache_dir``, subsequent calls memory-map them.
+    Pass ``cache_dir=None`` to disable the cache.
+    """
+    if cache_dir is not None:
+        key = detector_cache_key(detector)
+        pmts_file = os.path.join(cache_dir, key + '.pmts.npy')
+        doms_file = os.path.join(cache_dir, key + '.doms.npy')
+        try:
+            pmts = np.load(pmts_file, mmap_mode='r')
+            doms = np.load(doms_file, mmap_mode='r')
+        except (IOError, OSError, ValueError):
+            pass
+        else:
+            log.info("Loaded detector from cache '{0}'".format(pmts_file))
+            return PMTLookup(pmts, doms)
+
+    from km3pipe.hardware import Detector
+    if _is_detx(detector):
+        lookup = PMTLookup.from_detector(Detector(filename=detector))
+    else:
+        lookup = PMTLookup.from_detector(Detector(det_id=detector))
+
+    if cache_dir is not None:
+        try:
+            _save_atomically(pmts_file, lookup.pmts)
+            _save_atomically(doms_file, lookup.doms)
+        except (IOError, OSError) as e:
+            log.warning("Could not write the detector cache: {0}".format(e))
+    return lookup
+
+
+def _is_detx(detector):
+    return str(detector).endswith('.detx')
+
+
+def _save_atomically(filename, array):
+    directory = os.path.dirname(filename)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp_filename = "{0}.{1}.tmp".format(filename, os.getpid())
+    with open(tmp_filename, 'wb') as fobj:
+        np.save(fobj, np.asarray(array))
+    os.replace(tmp_filename, filename)
@@ -0,0 +1,187 @@
+# coding=utf-8
+# Filename: colourmaps.py
+"""
+Precomputed colour lookup tables for the hit spectra.
+
+The tables reproduce the matplotlib colour maps RainbowAlga uses, without
+depending on matplotlib. Whole arrays of values are mapped in one call and
+each table can be bound as a 1D texture, so shaders can do the lookup.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+LUT_SIZE = 256
+
+# Anchor points per channel: (x, value), linearly interpolated in between
+SEGMENTS = {
+    'seismic': {
+        'red': ((0.0, 0.0), (0.25, 0.0), (0.5, 1.0), (0.75, 1.0), (1.0, 0.5)),
+        'green': ((0.0, 0.0), (0.25, 0.0), (0.5, 1.0), (0.75, 0.0),
+                  (1.0, 0.0)),
+        'blue': ((0.0, 0.3), (0.25, 1.0), (0.5, 1.0), (0.75, 0.0), (1.0, 0.0)),
+    },
+    'brg': {
+        'red': ((0.0, 0.0), (0.5, 1.0), (1.0, 0.0)),
+        'green': ((0.0, 0.0), (0.5, 0.0), (1.0, 1.0)),
+        'blue': ((0.0, 1.0), (0.5, 0.0), (1.0, 0.0)),
+    },
+    'gist_rainbow': {
+        'red': ((0.0, 1.0), (0.03, 1.0), (0.215, 1.0), (0.4, 0.0),
+                (0.586, 0.0), (0.77, 0.0), (0.954, 1.0), (1.0, 1.0)),
+        'green': ((0.0, 0.0), (0.03, 0.0), (0.215, 1.0), (0.4, 1.0),
+                  (0.586, 1.0), (0.77, 0.0), (0.954, 0.0), (1.0, 0.0)),
+        'blue': ((0.0, 0.16), (0.03, 0.0), (0.215, 0.0), (0.4, 0.0),
+                 (0.586, 1.0), (0.77, 1.0), (0.954, 1.0), (1.0, 0.75)),
+    },
+    'jet': {
+        'red': ((0.0, 0.0), (0.35, 0.0), (0.66, 1.0), (0.89, 1.0),
+                (1.0, 0.5)),
+        'green': ((0.0, 0.0), (0.125, 0.0), (0.375, 1.0), (0.64, 1.0),
+                  (0.91, 0.0), (1.0, 0.0)),
+        'blue': ((0.0, 0.5), (0.11, 1.0), (0.34, 1.0), (0.65, 0.0),
+                 (1.0, 0.0)),
+    },
+    'hot': {
+        'red': ((0.0, 0.0416), (0.365079, 1.0), (1.0, 1.0)),
+        'green': ((0.0, 0.0), (0.365079, 0.0), (0.746032, 1.0), (1.0, 1.0)),
+        'blue': ((0.0, 0.0), (0.746032, 0.0), (1.0, 1.0)),
+    },
+    'bwr': {
+        'red': ((0.0, 0.0), (0.5, 1.0), (1.0, 1.0)),
+        'green': ((0.0, 0.0), (0.5, 1.0), (1.0, 0.0)),
+        'blue': ((0.0, 1.0), (0.5, 1.0), (1.0, 0.0)),
+    },
+    'cool': {
+        'red': ((0.0, 0.0), (1.0, 1.0)),
+        'green': ((0.0, 1.0), (1.0, 0.0)),
+        'blue': ((0.0, 1.0), (1.0, 1.0)),
+    },
+}
+
+# Evenly spaced colours, linearly interpolated in between
+GRADIENTS = {
+    'RdBu': ('#67001f', '#b2182b', '#d6604d', '#f4a582', '#fddbc7',
+             '#f7f7f7', '#d1e5f0', '#92c5de', '#4393c3', '#2166ac',
+             '#053061'),
+}
+
+# Qualitative colour maps, one flat band per colour
+LISTED = {
+    'Set1': ('#e41a1c', '#377eb8', '#4daf4a', '#984ea3', '#ff7f00',
+             '#ffff33', '#a65628', '#f781bf', '#999999'),
+}
+
+
+def hex2rgb(colour):
+    """Convert a '#rrggbb' string to a tuple of floats in [0, 1]."""
+    colour = colour.lstrip('#')
+    return tuple(int(colour[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+def _lut_x(size):
+    return np.linspace(0, 1, size)
+
+
+def segmented_lut(segments, size=LUT_SIZE):
+    x = _lut_x(size)
+    lut = np.empty((size, 3), dtype=np.float32)
+    for i, channel in enumerate(('red', 'green', 'blue')):
+        anchors = np.array(segments[channel])
+        lut[:, i] = np.interp(x, anchors[:, 0], anchors[:, 1])
+    return lut
+
+
+def gradient_lut(colours, size=LUT_SIZE):
+    rgb = np.array([hex2rgb(c) for c in colours])
+    anchors = np.linspace(0, 1, len(rgb))
+    x = _lut_x(size)
+    lut = np.empty((size, 3), dtype=np.float32)
+    for i in range(3):
+        lut[:, i] = np.interp(x, anchors, rgb[:, i])
+    return lut
+
+
+def listed_lut(colours):
+    return np.array([hex2rgb(c) for c in colours], dtype=np.float32)
+
+
+class ColourMap(object):
+    """A colour lookup table mapping values in [0, 1] to RGB.
+
+    :param str name: Name of the colour map
+    :param lut: Array with shape (N, 3) of RGB values in [0, 1]
+
+    """
+
+    def __init__(self, name, lut):
+        self.name = name
+        self.lut = np.ascontiguousarray(lut, dtype=np.float32)
+        self._texture = None
+
+    def __len__(self):
+        return len(self.lut)
+
+    def __call__(self, values):
+        """Map values in [0, 1] to RGB, values outside are clipped.
+
+        Returns an array with shape ``np.shape(values) + (3,)``.
+        """
+        values = np.nan_to_num(np.asarray(values, dtype=float))
+        idx = (values * len(self.lut)).astype(int)
+        return self.lut[np.clip(idx, 0, len(self.lut) - 1)]
+
+    def map(self, values, vmin, vmax):
+        """Map values in [vmin, vmax] to RGB."""
+        values = np.asarray(values, dtype=float)
+        if vmax == vmin:
+            return self(np.zeros_like(values))
+        return self((values - vmin) / (vmax - vmin))
+
+    @property
+    def texture(self):
+        """The lookup table as a 1D texture (needs an OpenGL context)."""
+        if self._texture is None:
+            from OpenGL.GL import (
+                glBindTexture, glGenTextures, glTexImage1D, glTexParameteri,
+                GL_CLAMP_TO_EDGE, GL_FLOAT, GL_NEAREST, GL_RGB,
+                GL_TEXTURE_1D, GL_TEXTURE_MAG_FILTER, GL_TEXTURE_MIN_FILTER,
+                GL_TEXTURE_WRAP_S)
+            self._texture = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_1D, self._texture)
+            glTexParameteri(GL_TEXTURE_1D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_1D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_1D, GL_TEXTURE_WRAP_S,
+                            GL_CLAMP_TO_EDGE)
+            glTexImage1D(GL_TEXTURE_1D, 0, GL_RGB, len(self.lut), 0, GL_RGB,
+                         GL_FLOAT, self.lut)
+            glBindTexture(GL_TEXTURE_1D, 0)
+        return self._texture
+
+    def __repr__(self):
+        return "<ColourMap '{0}' ({1} entries)>".format(self.name,
+                                                      len(self.lut))
+
+
+def _build_colour_maps():
+    colour_maps = {}
+    for name, segments in SEGMENTS.items():
+        colour_maps[name] = ColourMap(name, segmented_lut(segments))
+    for name, colours in GRADIENTS.items():
+        colour_maps[name] = ColourMap(name, gradient_lut(colours))
+    for name, colours in LISTED.items():
+        colour_maps[name] = ColourMap(name, listed_lut(colours))
+    return colour_maps
+
+
+COLOUR_MAPS = _build_colour_maps()
+
+
+def get_colour_map(name):
+    """Return the colour map with the given name."""
+    try:
+        return COLOUR_MAPS[name]
+    except KeyError:
+        raise KeyError("Unknown colour map '{0}', available: {1}".format(
+            name, ', '.join(sorted(COLOUR_MAPS))))
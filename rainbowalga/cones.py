@@ -0,0 +1,219 @@
+# coding=utf-8
+# Filename: cones.py
+"""
+Instanced rendering of Cherenkov cones.
+
+A single unit cone mesh lives in a vertex buffer. Each cone is an instance
+with its base position, the basis of its track (computed once when the
+track is added) and the current height, so all cones are drawn with one
+``glDrawArraysInstanced`` call.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+from OpenGL.GL import (
+    glDisableVertexAttribArray, glDrawArrays, glEnableVertexAttribArray,
+    glGetAttribLocation, glGetUniformLocation, glMultMatrixf, glPopMatrix,
+    glPushMatrix, glScalef, glTranslated, glUniform4f, glUseProgram,
+    glVertexAttribPointer, GL_FALSE, GL_FLOAT, GL_TRIANGLES,
+    GL_VERTEX_SHADER, GL_FRAGMENT_SHADER)
+from OpenGL.arrays import vbo
+from OpenGL.GL.shaders import compileShader, compileProgram
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+# Ratio of the base radius to the height of the cones
+RADIUS_RATIO = 0.6691
+
+# x, y, z, nx, ny, nz
+MESH_VERTEX_SIZE = 6
+# base position (3), basis columns (3 x 3), radius, height
+INSTANCE_SIZE = 14
+
+CONE_VERTEX_SHADER = """
+#version 120
+attribute vec3 mesh_position;
+attribute vec3 mesh_normal;
+attribute vec3 cone_base;
+attribute vec3 cone_x;
+attribute vec3 cone_y;
+attribute vec3 cone_z;
+attribute vec2 cone_size;
+varying vec3 normal;
+
+void main() {
+    vec3 scale = vec3(cone_size.x, cone_size.x, cone_size.y);
+    mat3 basis = mat3(cone_x, cone_y, cone_z);
+    vec3 position = cone_base + basis * (mesh_position * scale);
+    normal = normalize(gl_NormalMatrix *
+                       (basis * (mesh_normal / max(scale, vec3(1.0e-6)))));
+    gl_Position = gl_ModelViewProjectionMatrix * vec4(position, 1.0);
+}"""
+
+CONE_FRAGMENT_SHADER = """
+#version 120
+uniform vec4 colour;
+varying vec3 normal;
+
+void main() {
+    vec3 light = normalize(gl_LightSource[0].position.xyz);
+    float diffuse = abs(dot(normalize(normal), light));
+    gl_FragColor = vec4(colour.rgb * (0.3 + 0.7 * diffuse), colour.a);
+}"""
+
+
+def unit_cone(slices=128):
+    """Triangles of a cone with its base (radius 1) at z=0 and apex at z=1.
+
+    Returns a float32 array with shape (slices * 6, 6) of positions and
+    normals.
+    """
+    angles = np.linspace(0, 2 * np.pi, slices + 1)
+    start, end = angles[:-1], angles[1:]
+    middle = (start + end) / 2
+    n_slices = len(start)
+    zeros, ones = np.zeros(n_slices), np.ones(n_slices)
+
+    def rim(angle):
+        return np.column_stack((np.cos(angle), np.sin(angle), zeros))
+
+    def side_normal(angle):
+        return np.column_stack((np.cos(angle), np.sin(angle),
+                                ones)) / np.sqrt(2)
+
+    apex = np.column_stack((zeros, zeros, ones))
+    centre = np.column_stack((zeros, zeros, zeros))
+    down = np.column_stack((zeros, zeros, -ones))
+
+    side = np.stack((rim(start), rim(end), apex), axis=1)
+    side_normals = np.stack(
+        (side_normal(start), side_normal(end), side_normal(middle)), axis=1)
+    base = np.stack((rim(end), rim(start), centre), axis=1)
+    base_normals = np.stack((down, down, down), axis=1)
+
+    positions = np.concatenate((side, base)).reshape(-1, 3)
+    normals = np.concatenate((side_normals, base_normals)).reshape(-1, 3)
+    return np.hstack((positions, normals)).astype(np.float32)
+
+
+def instances(starts, axes, heights):
+    """Per-instance attributes of cones with their bases at ``starts``.
+
+    :param axes: Array with shape (n, 3, 3) with the x, y and z axes of
+                 each cone as columns (see ``physics.track_bases()``)
+
+    """
+    heights = np.asarray(heights, dtype=float)
+    data = np.empty((len(heights), INSTANCE_SIZE), dtype=np.float32)
+    data[:, 0:3] = starts
+    data[:, 3:12] = np.transpose(axes, (0, 2, 1)).reshape(-1, 9)
+    data[:, 12] = RADIUS_RATIO * heights
+    data[:, 13] = heights
+    return data
+
+
+class ConeRenderer(object):
+    """Draws any number of cones from one unit cone mesh."""
+
+    def __init__(self, slices=128, colour=(0.0, 0.0, 0.8, 0.3)):
+        self.colour = colour
+        self.mesh = unit_cone(slices)
+        self.mesh_vbo = vbo.VBO(self.mesh)
+        self.instance_vbo = vbo.VBO(np.zeros((0, INSTANCE_SIZE),
+                                             dtype=np.float32))
+        self.program = compileProgram(
+            compileShader(CONE_VERTEX_SHADER, GL_VERTEX_SHADER),
+            compileShader(CONE_FRAGMENT_SHADER, GL_FRAGMENT_SHADER))
+        self._attributes = {
+            name: glGetAttribLocation(self.program, name)
+            for name in ('mesh_position', 'mesh_normal', 'cone_base',
+                         'cone_x', 'cone_y', 'cone_z', 'cone_size')
+        }
+        self._colour = glGetUniformLocation(self.program, 'colour')
+        try:
+            from OpenGL.GL import glDrawArraysInstanced, glVertexAttribDivisor
+            self.is_instanced = bool(glDrawArraysInstanced) and \
+                bool(glVertexAttribDivisor)
+        except ImportError:
+            self.is_instanced = False
+        if not self.is_instanced:
+            log.info("No instanced drawing, drawing the cones one by one.")
+
+    def draw(self, starts, axes, heights):
+        """Draw cones with their bases at ``starts`` and the given heights.
+
+        :param axes: Array with shape (n, 3, 3) with the cone axes as columns
+
+        """
+        if len(heights) == 0:
+            return
+        data = instances(starts, axes, heights)
+        glUseProgram(self.program)
+        glUniform4f(self._colour, *self.colour)
+        self.mesh_vbo.bind()
+        try:
+            self._pointer('mesh_position', 3, MESH_VERTEX_SIZE, 0)
+            self._pointer('mesh_normal', 3, MESH_VERTEX_SIZE, 3)
+            if self.is_instanced:
+                self._draw_instanced(data)
+            else:
+                self._draw_one_by_one(data)
+        finally:
+            self.mesh_vbo.unbind()
+            for location in self._attributes.values():
+                if location >= 0:
+                    glDisableVertexAttribArray(location)
+            glUseProgram(0)
+
+    def _draw_instanced(self, data):
+        from OpenGL.GL import glDrawArraysInstanced, glVertexAttribDivisor
+        self.instance_vbo.set_array(data)
+        self.instance_vbo.bind()
+        instance_attributes = (('cone_base', 3, 0), ('cone_x', 3, 3),
+                               ('cone_y', 3, 6), ('cone_z', 3, 9),
+                               ('cone_size', 2, 12))
+        try:
+            for name, size, offset in instance_attributes:
+                self._pointer(name, size, INSTANCE_SIZE, offset,
+                              self.instance_vbo)
+                if self._attributes[name] >= 0:
+                    glVertexAttribDivisor(self._attributes[name], 1)
+            glDrawArraysInstanced(GL_TRIANGLES, 0, len(self.mesh), len(data))
+        finally:
+            for name, _, _ in instance_attributes:
+                if self._attributes[name] >= 0:
+                    glVertexAttribDivisor(self._attributes[name], 0)
+            self.instance_vbo.unbind()
+
+    def _draw_one_by_one(self, data):
+        from OpenGL.GL import glVertexAttrib2f, glVertexAttrib3f
+        # Identity instance attributes, the transformation goes into the
+        # model view matrix
+        identity = (('cone_base', (0, 0, 0)), ('cone_x', (1, 0, 0)),
+                    ('cone_y', (0, 1, 0)), ('cone_z', (0, 0, 1)))
+        for name, value in identity:
+            if self._attributes[name] >= 0:
+                glVertexAttrib3f(self._attributes[name], *value)
+        for instance in data:
+            matrix = np.identity(4, dtype=np.float32)
+            matrix[:3, :3] = instance[3:12].reshape(3, 3)  # column-major
+            if self._attributes['cone_size'] >= 0:
+                glVertexAttrib2f(self._attributes['cone_size'], 1, 1)
+            glPushMatrix()
+            glTranslated(*instance[0:3])
+            glMultMatrixf(matrix)
+            glScalef(instance[12], instance[12], instance[13])
+            glDrawArrays(GL_TRIANGLES, 0, len(self.mesh))
+            glPopMatrix()
+
+    def _pointer(self, name, size, stride, offset, buffer=None):
+        location = self._attributes[name]
+        if location < 0:  # optimised away by the shader compiler
+            return
+        buffer = self.mesh_vbo if buffer is None else buffer
+        glEnableVertexAttribArray(location)
+        glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE,
+                              stride * 4, buffer + offset * 4)
@@ -1 +1,15 @@
+import math
+
 c = 299792458 # m/s
+
+n_water_antares_phase = 1.3499
+n_water_antares_group = 1.3797
+n_water_km3net_group = 1.3787
+
+theta_cherenkov_water_antares = math.acos(1 / n_water_antares_phase)
+theta_cherenkov_water_km3net = math.acos(1 / n_water_km3net_group)
+
+c_water_antares = c / n_water_antares_group
+c_water_km3net = c / n_water_km3net_group
+
+MUON_PDG_ID = 13
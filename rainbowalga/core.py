@@ -3,6 +3,51 @@ from __future__ import division, absolute_import, print_function
 import numpy as np
 
 
+class Vec3(object):
+    """A 3D vector which behaves like an array in NumPy operations.
+
+    Drop-in for ``km3pipe.dataclasses.Vec3``, importing km3pipe would slow
+    down the startup by more than a second.
+    """
+
+    def __init__(self, x, y, z):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array([self.x, self.y, self.z], dtype=dtype)
+
+    def __getitem__(self, index):
+        return self.__array__()[index]
+
+    def __add__(self, other):
+        return Vec3(*np.add(self, other))
+
+    def __radd__(self, other):
+        return Vec3(*np.add(other, self))
+
+    def __sub__(self, other):
+        return Vec3(*np.subtract(self, other))
+
+    def __rsub__(self, other):
+        return Vec3(*np.subtract(other, self))
+
+    def __mul__(self, other):
+        return Vec3(*np.multiply(self, other))
+
+    def __rmul__(self, other):
+        return Vec3(*np.multiply(other, self))
+
+    def __truediv__(self, other):
+        return Vec3(*np.divide(self, other))
+
+    __div__ = __truediv__
+
+    def __repr__(self):
+        return "Vec3({0}, {1}, {2})".format(self.x, self.y, self.z)
+
+
 class Alga(object):
     def setup(self, event):
         pass
@@ -0,0 +1,422 @@
+# coding=utf-8
+# Filename: generator.py
+"""
+Synthetic detectors and events for load tests.
+
+Detectors are compact hexagonal grids of detection units (DUs) with 31 PMT
+DOMs, from a few lines up to ARCA/ORCA-scale building blocks. They can be
+written as DETX files, so they go through the same parsing, caching and
+calibration as real detectors.
+
+Events contain muon tracks and cascades whose hits follow the Cherenkov
+(respectively point source) arrival times of ``rainbowalga.physics``, plus
+uncorrelated and coincident K40 noise. The light yield is a rough model
+(absorption, distance and PMT orientation), good enough to look like an
+event and to produce any number of hits. The hit times are raw times like
+the ones of a DAQ: the t0 of the PMT is subtracted and the time slewing of
+the ToT added, so the calibration restores the arrival times. Each event is
+generated from its own random state, so the events can be read in any
+order, e.g. by the prefetcher.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+from collections import namedtuple
+
+import numpy as np
+
+from rainbowalga import constants
+from rainbowalga.calibration import PMTLookup, PMTS_DTYPE, slew
+from rainbowalga.physics import cherenkov_times, point_source_times
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+FIRST_DOM_ID = 800000000
+DOM_RADIUS = 0.2  # m, distance of the PMTs from the DOM centre
+
+# PMT rings of a KM3NeT DOM: (zenith of the PMT direction, n_pmts,
+# azimuth of the first PMT), from the bottom to the top
+PMT_RINGS = ((180, 1, 0), (147.8, 6, 30), (123.9, 6, 0), (107.3, 6, 30),
+             (72.8, 6, 0), (56.2, 6, 30))
+
+DETECTOR_PRESETS = {
+    'demo': dict(n_dus=7, n_floors=18, du_spacing=90, floor_spacing=36),
+    'orca': dict(n_dus=115, n_floors=18, du_spacing=20, floor_spacing=9),
+    'arca': dict(n_dus=230, n_floors=18, du_spacing=95, floor_spacing=36),
+}
+
+TRACKS_DTYPE = np.dtype([
+    ('type', '<i4'),  # PDG ID, 13 for muons and 11 for cascades
+    ('pos_x', '<f8'),
+    ('pos_y', '<f8'),
+    ('pos_z', '<f8'),
+    ('dir_x', '<f8'),
+    ('dir_y', '<f8'),
+    ('dir_z', '<f8'),
+    ('time', '<f8'),
+    ('energy', '<f8'),
+    ('length', '<f8'),
+])
+
+SyntheticEvent = namedtuple('SyntheticEvent',
+                            'dom_id channel_id time tot triggered tracks')
+
+
+def dom_pmt_directions():
+    """The directions of the 31 PMTs of a DOM, with shape (31, 3)."""
+    directions = []
+    for zenith, n_pmts, first_azimuth in PMT_RINGS:
+        theta = np.radians(zenith)
+        phi = np.radians(first_azimuth + np.arange(n_pmts) * 360 / n_pmts)
+        directions.append(
+            np.column_stack((np.sin(theta) * np.cos(phi),
+                             np.sin(theta) * np.sin(phi),
+                             np.full(n_pmts, np.cos(theta)))))
+    return np.concatenate(directions)
+
+
+def du_positions(n_dus, spacing):
+    """The (x, y) positions of the DUs on a hexagonal grid, the closest
+    ones to the centre first."""
+    n_rings = 1
+    while 3 * n_rings * (n_rings + 1) + 1 < n_dus:
+        n_rings += 1
+    i, j = np.meshgrid(np.arange(-n_rings, n_rings + 1),
+                       np.arange(-n_rings, n_rings + 1))
+    i, j = i.ravel(), j.ravel()
+    x = (i + j / 2) * spacing
+    y = j * np.sqrt(3) / 2 * spacing
+    order = np.lexsort((np.arctan2(y, x), np.round(np.hypot(x, y), 6)))
+    return np.column_stack((x, y))[order[:n_dus]]
+
+
+def detector_pmts(n_dus=115, n_floors=18, du_spacing=20, floor_spacing=9,
+                  first_floor_z=None):
+    """The PMTs of a synthetic detector as a ``PMTS_DTYPE`` array.
+
+    The DUs are numbered from 1 starting at the centre, the DOM IDs are
+    ``800000000 + 100 * du + floor``.
+    """
+    if first_floor_z is None:
+        first_floor_z = 3 * floor_spacing
+    directions = dom_pmt_directions()
+    n_pmts = len(directions)
+    dus = np.repeat(np.arange(1, n_dus + 1), n_floors)
+    floors = np.tile(np.arange(1, n_floors + 1), n_dus)
+    dom_pos = np.column_stack(
+        (np.repeat(du_positions(n_dus, du_spacing), n_floors, axis=0),
+         first_floor_z + (floors - 1) * floor_spacing))
+
+    pmts = np.zeros(len(dus) * n_pmts, dtype=PMTS_DTYPE)
+    pmts['dom_id'] = np.repeat(FIRST_DOM_ID + 100 * dus + floors, n_pmts)
+    pmts['channel_id'] = np.tile(np.arange(n_pmts), len(dus))
+    pmts['pmt_id'] = np.arange(1, len(pmts) + 1)
+    pmts['du'] = np.repeat(dus, n_pmts)
+    pmts['floor'] = np.repeat(floors, n_pmts)
+    pos = np.repeat(dom_pos, n_pmts, axis=0) + \
+        np.tile(directions, (len(dus), 1)) * DOM_RADIUS
+    for i, axis in enumerate('xyz'):
+        pmts['pos_' + axis] = pos[:, i]
+        pmts['dir_' + axis] = np.tile(directions[:, i], len(dus))
+    return pmts
+
+
+def write_detx(filename, pmts, det_id=0):
+    """Write the PMTs to a (version 1) DETX file, readable by
+    ``km3pipe.hardware.Detector`` and ``load_pmt_lookup()``."""
+    order = np.lexsort((pmts['channel_id'], pmts['floor'], pmts['du']))
+    pmts = pmts[order]
+    dom_ids, first, n_pmts = np.unique(pmts['dom_id'], return_index=True,
+                                       return_counts=True)
+    dom_order = np.argsort(first)
+    with open(filename, 'w') as fobj:
+        fobj.write("{0} {1}\n".format(det_id, len(dom_ids)))
+        for i in dom_order:
+            pmt = pmts[first[i]]
+            fobj.write("{0} {1} {2} {3}\n".format(dom_ids[i], pmt['du'],
+                                                  pmt['floor'], n_pmts[i]))
+            for pmt in pmts[first[i]:first[i] + n_pmts[i]]:
+                fobj.write(" {0} {1:.3f} {2:.3f} {3:.3f} {4:.6f} {5:.6f} "
+                           "{6:.6f} {7:.3f}\n".format(
+                               pmt['pmt_id'], pmt['pos_x'], pmt['pos_y'],
+                               pmt['pos_z'], pmt['dir_x'], pmt['dir_y'],
+                               pmt['dir_z'], pmt['t0']))
+
+
+def _energy_range(value):
+    low, high = value.split(':')
+    return float(low), float(high)
+
+
+SPEC_KEYS = {
+    'dus': ('n_dus', int),
+    'floors': ('n_floors', int),
+    'spacing': ('du_spacing', float),
+    'floor_spacing': ('floor_spacing', float),
+    'events': ('n_events', int),
+    'muons': ('n_muons', float),
+    'cascades': ('n_cascades', float),
+    'energy': ('energy_range', _energy_range),
+    'noise': ('noise_rate', float),
+    'coincidences': ('coincidence_rate', float),
+    'window': ('time_window', float),
+    'seed': ('seed', int),
+}
+
+
+def parse_spec(spec):
+    """Parse a generator spec like ``arca,events=100,noise=10000``.
+
+    A bare word selects a detector preset (``DETECTOR_PRESETS``), the
+    other items are ``key=value`` pairs of ``SPEC_KEYS``. Returns the
+    keyword arguments of ``EventGenerator.from_layout()``.
+    """
+    kwargs = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if '=' not in item:
+            if item not in DETECTOR_PRESETS:
+                raise ValueError(
+                    "Unknown detector preset '{0}', choose from {1}".format(
+                        item, ', '.join(sorted(DETECTOR_PRESETS))))
+            kwargs.update(DETECTOR_PRESETS[item])
+            continue
+        key, value = [s.strip() for s in item.split('=', 1)]
+        if key not in SPEC_KEYS:
+            raise ValueError("Unknown key '{0}', choose from {1}".format(
+                key, ', '.join(sorted(SPEC_KEYS))))
+        name, cast = SPEC_KEYS[key]
+        try:
+            kwargs[name] = cast(value)
+        except ValueError:
+            raise ValueError("Invalid value of '{0}': {1}".format(key, value))
+    return kwargs
+
+
+class EventGenerator(object):
+    """Random-access source of synthetic events on a set of PMTs.
+
+    :param pmts: A ``PMTS_DTYPE`` array, e.g. from ``detector_pmts()`` or
+                 ``load_pmt_lookup().pmts``
+    :param int n_events: The number of events (``len()``)
+    :param float n_muons: Mean number of muons per event (Poisson)
+    :param float n_cascades: Mean number of cascades per event (Poisson)
+    :param energy_range: Log-uniform range of the energies in GeV
+    :param float noise_rate: K40 single rate per PMT in Hz
+    :param float coincidence_rate: Rate of two-fold K40 coincidences per
+                                   DOM in Hz
+    :param float time_window: Length of the events in ns
+    :param float absorption_length: Absorption length of the light in m
+
+    """
+    TRACK_YIELD = 20  # expected photons * m of a minimum ionising muon
+    CASCADE_YIELD = 2  # expected photons * m**2 per GeV
+    TTS = 2  # ns, transit time spread of the PMTs
+    SCATTERING_DELAY = 0.05  # ns per m of the mean scattering delay
+
+    def __init__(self, pmts, n_events=100, n_muons=1, n_cascades=0,
+                 energy_range=(1e2, 1e5), noise_rate=7000,
+                 coincidence_rate=500, time_window=5000,
+                 absorption_length=60, seed=0):
+        self.pmts = pmts
+        self.n_events = n_events
+        self.n_muons = n_muons
+        self.n_cascades = n_cascades
+        self.energy_range = energy_range
+        self.noise_rate = noise_rate
+        self.coincidence_rate = coincidence_rate
+        self.time_window = time_window
+        self.absorption_length = absorption_length
+        self.seed = seed
+
+        self.pmt_pos = np.column_stack((pmts['pos_x'], pmts['pos_y'],
+                                        pmts['pos_z']))
+        self.pmt_dir = np.column_stack((pmts['dir_x'], pmts['dir_y'],
+                                        pmts['dir_z']))
+        self.dom_ids, self.dom_first_pmt, self.n_pmts_per_dom = np.unique(
+            pmts['dom_id'], return_index=True, return_counts=True)
+        self.centre = self.pmt_pos.mean(axis=0)
+        self.radius = np.max(np.hypot(self.pmt_pos[:, 0] - self.centre[0],
+                                      self.pmt_pos[:, 1] - self.centre[1]))
+        self.height = np.ptp(self.pmt_pos[:, 2])
+
+    @classmethod
+    def from_layout(cls, n_dus=115, n_floors=18, du_spacing=20,
+                    floor_spacing=9, **kwargs):
+        """Generate the events on a synthetic detector."""
+        return cls(detector_pmts(n_dus, n_floors, du_spacing, floor_spacing),
+                   **kwargs)
+
+    @classmethod
+    def from_spec(cls, spec, pmts=None):
+        """Create a generator from a ``parse_spec()`` string, on the given
+        PMTs or on the detector described by the spec."""
+        kwargs = parse_spec(spec)
+        if pmts is None:
+            return cls.from_layout(**kwargs)
+        for key in DETECTOR_PRESETS['demo']:
+            kwargs.pop(key, None)
+        return cls(pmts, **kwargs)
+
+    def __len__(self):
+        return self.n_events
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.n_events:
+            raise IndexError("Event {0} out of range".format(index))
+        tracks = self.tracks(index)
+        hits = [self.noise_hits(self._random_state(index, 1))]
+        rnd = self._random_state(index, 2)
+        for track in tracks:
+            if track['type'] == 13:
+                hits.append(self.track_hits(track, rnd))
+            else:
+                hits.append(self.cascade_hits(track, rnd))
+        columns = [np.concatenate(c) for c in zip(*hits)]
+        return SyntheticEvent(*columns, tracks=tracks)
+
+    def __repr__(self):
+        return "{0}({1} events on {2} PMTs)".format(
+            self.__class__.__name__, self.n_events, len(self.pmts))
+
+    @property
+    def pmt_lookup(self):
+        """The lookup to calibrate the generated hits."""
+        return PMTLookup(self.pmts)
+
+    def _random_state(self, index, stream):
+        return np.random.RandomState([self.seed, index, stream])
+
+    def _energies(self, rnd, n):
+        low, high = np.log10(self.energy_range)
+        return 10**rnd.uniform(low, high, n)
+
+    def _directions(self, rnd, n, downgoing=False):
+        cos_zenith = rnd.uniform(-1, 0 if downgoing else 1, n)
+        sin_zenith = np.sqrt(1 - cos_zenith**2)
+        phi = rnd.uniform(0, 2 * np.pi, n)
+        return np.column_stack((sin_zenith * np.cos(phi),
+                                sin_zenith * np.sin(phi), cos_zenith))
+
+    def _points(self, rnd, n, margin=0):
+        """Uniform points in the cylinder around the instrumented volume."""
+        r = (self.radius + margin) * np.sqrt(rnd.uniform(0, 1, n))
+        phi = rnd.uniform(0, 2 * np.pi, n)
+        z = rnd.uniform(-margin, self.height + margin, n)
+        return self.centre + np.column_stack(
+            (r * np.cos(phi), r * np.sin(phi), z - self.height / 2))
+
+    def tracks(self, index):
+        """The true muons and cascades of an event (``TRACKS_DTYPE``)."""
+        rnd = self._random_state(index, 0)
+        n_muons = rnd.poisson(self.n_muons)
+        n_cascades = rnd.poisson(self.n_cascades)
+        tracks = np.zeros(n_muons + n_cascades, dtype=TRACKS_DTYPE)
+        muons, cascades = tracks[:n_muons], tracks[n_muons:]
+
+        # Muons pass a point in the detector at a third of the window,
+        # they start and end outside of it
+        extent = np.hypot(2 * self.radius, self.height) + 100
+        directions = self._directions(rnd, n_muons, downgoing=True)
+        pos = self._points(rnd, n_muons) - directions * extent / 2
+        muons['type'] = 13
+        muons['time'] = self.time_window / 3 - \
+            extent / 2 / constants.c * 1e9
+        muons['length'] = extent
+
+        cascades['type'] = 11
+        cascades['time'] = rnd.uniform(0.2, 0.5, n_cascades) * \
+            self.time_window
+        cascades['length'] = 10
+        pos = np.concatenate((pos, self._points(rnd, n_cascades, 50)))
+        directions = np.concatenate(
+            (directions, self._directions(rnd, n_cascades)))
+
+        tracks['energy'] = self._energies(rnd, len(tracks))
+        for i, axis in enumerate('xyz'):
+            tracks['pos_' + axis] = pos[:, i]
+            tracks['dir_' + axis] = directions[:, i]
+        return tracks
+
+    def noise_hits(self, rnd):
+        """Uncorrelated and two-fold coincident K40 hits."""
+        window = self.time_window * 1e-9
+        n_singles = rnd.poisson(len(self.pmts) * self.noise_rate * window)
+        pmt = rnd.randint(0, len(self.pmts), n_singles)
+        times = rnd.uniform(0, self.time_window, n_singles)
+
+        n_pairs = rnd.poisson(len(self.dom_ids) * self.coincidence_rate *
+                              window)
+        dom = rnd.randint(0, len(self.dom_ids), n_pairs)
+        first = rnd.randint(0, self.n_pmts_per_dom[dom])
+        second = (first + rnd.randint(1, self.n_pmts_per_dom[dom])) % \
+            self.n_pmts_per_dom[dom]
+        pair_times = rnd.uniform(0, self.time_window, n_pairs)
+        pmt = np.concatenate((pmt, self.dom_first_pmt[dom] + first,
+                              self.dom_first_pmt[dom] + second))
+        times = np.concatenate(
+            (times, pair_times, pair_times + rnd.normal(0, 3, n_pairs)))
+        return self._hits(pmt, times, np.ones(len(pmt)), False, rnd)
+
+    def track_hits(self, track, rnd):
+        """The hits of a muon, arriving at the Cherenkov angle."""
+        pos = np.array([track['pos_x'], track['pos_y'], track['pos_z']])
+        direction = np.array([track['dir_x'], track['dir_y'],
+                              track['dir_z']])
+        v = self.pmt_pos - pos
+        l = v.dot(direction)
+        k = np.sqrt(np.maximum(np.sum(v * v, axis=1) - l**2, 0))
+        theta = constants.theta_cherenkov_water_km3net
+        emission = l - k / np.tan(theta)
+        path = np.maximum(k / np.sin(theta), 1)
+        photon_dir = (v - np.outer(emission, direction)) / path[:, None]
+        on_track = (emission >= 0) & (emission <= track['length'])
+        # Minimum ionising light plus the radiative losses above ~1 TeV
+        track_yield = self.TRACK_YIELD * (1 + track['energy'] / 1e3)
+        expected = track_yield * np.exp(-path / self.absorption_length) / \
+            path * self._acceptance(photon_dir) * on_track
+        times = cherenkov_times(self.pmt_pos, pos, direction, track['time'])
+        return self._photon_hits(expected, times, path, rnd)
+
+    def cascade_hits(self, track, rnd):
+        """The hits of a point-like cascade, with isotropic emission."""
+        pos = np.array([track['pos_x'], track['pos_y'], track['pos_z']])
+        v = self.pmt_pos - pos
+        distance = np.maximum(np.sqrt(np.sum(v * v, axis=1)), 1)
+        expected = self.CASCADE_YIELD * track['energy'] * \
+            np.exp(-distance / self.absorption_length) / distance**2 * \
+            self._acceptance(v / distance[:, None])
+        times = point_source_times(self.pmt_pos, pos, track['time'])
+        return self._photon_hits(expected, times, distance, rnd)
+
+    def _acceptance(self, photon_dir):
+        """Fraction of the photons seen by the PMTs, the photons have to
+        hit the PMT from the front."""
+        cos_angle = -np.sum(self.pmt_dir * photon_dir, axis=1)
+        return np.clip(cos_angle, 0, 1)
+
+    def _photon_hits(self, expected, times, path, rnd):
+        """One hit per PMT with at least one photon, at the time of the
+        first photon and with a ToT growing with the number of photons."""
+        n_photons = rnd.poisson(expected)
+        pmt = np.flatnonzero(n_photons)
+        n_photons = n_photons[pmt]
+        # The first of n exponential scattering delays
+        delay = rnd.exponential(self.SCATTERING_DELAY * path[pmt] /
+                                n_photons)
+        hit_times = times[pmt] + delay + rnd.normal(0, self.TTS, len(pmt))
+        return self._hits(pmt, hit_times, n_photons, True, rnd)
+
+    def _hits(self, pmt, times, n_photons, triggered, rnd):
+        """The raw hits of photons arriving at the given times, the inverse
+        of ``PMTLookup.apply()``."""
+        tot = 26 + 8 * np.log(n_photons) + rnd.normal(0, 5, len(pmt))
+        tot = np.clip(np.round(tot), 1, 255).astype(np.uint8)
+        raw_times = times - self.pmts['t0'][pmt]
+        if len(pmt):
+            raw_times += slew(tot.astype(np.int64))
+        return (self.pmts['dom_id'][pmt], self.pmts['channel_id'][pmt],
+                raw_times, tot, np.full(len(pmt), triggered))
@@ -0,0 +1,247 @@
+# coding=utf-8
+# Filename: glyphs.py
+"""
+One glyph per DOM instead of one sphere per hit.
+
+The hits of an event are binned to the DOMs with a few NumPy operations.
+As the clock advances, only the hits reached since the previous frame are
+added to the per-DOM hit count, summed ToT and first hit time, so the cost
+of a frame is bound by the number of DOMs and not by the number of hits.
+
+The glyphs are drawn with one point-sprite call from the DOM positions in
+the detector's vertex buffer and a small buffer with the per-DOM values:
+the first hit time is mapped to the colour map, the summed ToT to the size
+and the hit count to the brightness.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+from OpenGL.GL import (
+    glActiveTexture, glBindTexture, glDisable, glDisableClientState,
+    glDisableVertexAttribArray, glDrawArrays, glEnable, glEnableClientState,
+    glEnableVertexAttribArray, glGetAttribLocation, glGetUniformLocation,
+    glUniform1f, glUniform1i, glUseProgram, glVertexAttribPointer,
+    glVertexPointer, GL_FALSE, GL_FLOAT, GL_POINTS, GL_POINT_SPRITE,
+    GL_TEXTURE0, GL_TEXTURE_1D, GL_VERTEX_ARRAY, GL_VERTEX_PROGRAM_POINT_SIZE,
+    GL_VERTEX_SHADER, GL_FRAGMENT_SHADER)
+from OpenGL.arrays import vbo
+from OpenGL.GL.shaders import compileShader, compileProgram
+
+from rainbowalga.hits import passing_tot_cut
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+# hit count, summed ToT, first hit time
+VALUES_SIZE = 3
+STRIDE = VALUES_SIZE * 4
+
+GLYPH_VERTEX_SHADER = """
+#version 120
+uniform float point_scale;
+uniform float value_min;
+uniform float value_max;
+uniform float max_hits;
+attribute float dom_hits;
+attribute float dom_tot;
+attribute float dom_first_time;
+varying float progress;
+varying float brightness;
+
+void main() {
+    if (dom_hits < 0.5) {
+        gl_Position = vec4(2.0, 2.0, 2.0, 1.0);
+        gl_PointSize = 0.0;
+        return;
+    }
+    vec4 eye = gl_ModelViewMatrix * gl_Vertex;
+    gl_Position = gl_ProjectionMatrix * eye;
+    progress = clamp((dom_first_time - value_min)
+                     / max(value_max - value_min, 1.0e-6), 0.0, 1.0);
+    brightness = 0.4 + 0.6 * log(1.0 + dom_hits) / log(1.0 + max_hits);
+    float radius = 2.0 + 3.0 * log(1.0 + dom_tot / 25.0);
+    gl_PointSize = 2.0 * radius * point_scale / max(-eye.z, 0.1);
+}"""
+
+GLYPH_FRAGMENT_SHADER = """
+#version 120
+uniform sampler1D colour_map;
+varying float progress;
+varying float brightness;
+
+void main() {
+    vec2 p = gl_PointCoord * 2.0 - 1.0;
+    float r2 = dot(p, p);
+    if (r2 > 1.0) {
+        discard;
+    }
+    vec3 normal = vec3(p.x, -p.y, sqrt(1.0 - r2));
+    float diffuse = max(dot(normal, normalize(vec3(-1.0, 1.0, 1.0))), 0.0);
+    vec3 colour = texture1D(colour_map, progress).rgb;
+    gl_FragColor = vec4(colour * brightness * (0.3 + 0.7 * diffuse), 1.0);
+}"""
+
+
+class DomHits(object):
+    """The hit count, summed ToT and first hit time per DOM up to a time.
+
+    :param dom_ids: The DOM IDs in the order of the DOM positions
+    :param hits: Calibrated hits, hits on unknown DOMs are ignored
+    :param float min_tot: Only hits with a larger ToT are counted
+
+    """
+
+    def __init__(self, dom_ids, hits, min_tot=None):
+        dom_ids = np.asarray(dom_ids)
+        self.n_doms = len(dom_ids)
+        hits = hits[passing_tot_cut(hits.tot, min_tot)]
+        hits = hits[np.argsort(hits.time, kind='stable')]
+        order = np.argsort(dom_ids)
+        i = np.searchsorted(dom_ids[order], hits.dom_id)
+        i[i == self.n_doms] = 0
+        known = dom_ids[order][i] == hits.dom_id
+        self.dom_index = order[i[known]]
+        self.time = np.asarray(hits.time[known], dtype=np.float64)
+        self.tot = np.asarray(hits.tot[known], dtype=np.float64)
+        self.reset()
+
+    def __len__(self):
+        """The number of hits added so far."""
+        return self.n_added
+
+    @property
+    def time_range(self):
+        """The times of the first and the last hit."""
+        if len(self.time) == 0:
+            return 0, 0
+        return self.time[0], self.time[-1]
+
+    @property
+    def n_hit_doms(self):
+        return int(np.count_nonzero(self.counts))
+
+    def reset(self):
+        self.counts = np.zeros(self.n_doms, dtype=np.int64)
+        self.tot_sums = np.zeros(self.n_doms)
+        self.first_times = np.full(self.n_doms, np.inf)
+        self.n_added = 0
+
+    def advance(self, time):
+        """Add the hits up to the time, returns True if anything changed.
+
+        Going back in time starts over from the first hit.
+        """
+        n_reached = np.searchsorted(self.time, time, side='right')
+        changed = False
+        if n_reached < self.n_added:
+            self.reset()
+            changed = True
+        if n_reached == self.n_added:
+            return changed
+        new = slice(self.n_added, n_reached)
+        dom_index = self.dom_index[new]
+        self.counts += np.bincount(dom_index, minlength=self.n_doms)
+        self.tot_sums += np.bincount(dom_index, weights=self.tot[new],
+                                     minlength=self.n_doms)
+        doms, first = np.unique(dom_index, return_index=True)
+        is_first = np.isinf(self.first_times[doms])
+        self.first_times[doms[is_first]] = self.time[new][first[is_first]]
+        self.n_added = n_reached
+        return True
+
+    def values(self, time_offset=0):
+        """The per-DOM values as a float32 vertex attribute array, the first
+        hit times relative to ``time_offset``."""
+        values = np.zeros((self.n_doms, VALUES_SIZE), dtype=np.float32)
+        values[:, 0] = self.counts
+        values[:, 1] = self.tot_sums
+        values[:, 2] = np.where(self.counts > 0,
+                                self.first_times - time_offset, 0)
+        return values
+
+
+class GlyphRenderer(object):
+    """Draws one glyph per hit DOM at the positions of a vertex buffer.
+
+    The first hit times are passed relative to ``time_offset`` to keep the
+    float32 precision, like the hit times in ``HitRenderer``.
+
+    """
+
+    def __init__(self, positions_vbo, fov=45.0):
+        self.positions_vbo = positions_vbo
+        self.fov = fov
+        self.values = np.zeros((0, VALUES_SIZE), dtype=np.float32)
+        self.max_hits = 1
+        self.vbo = vbo.VBO(self.values)
+        self.program = compileProgram(
+            compileShader(GLYPH_VERTEX_SHADER, GL_VERTEX_SHADER),
+            compileShader(GLYPH_FRAGMENT_SHADER, GL_FRAGMENT_SHADER))
+        self._attributes = {
+            name: glGetAttribLocation(self.program, name)
+            for name in ('dom_hits', 'dom_tot', 'dom_first_time')
+        }
+        self._uniforms = {
+            name: glGetUniformLocation(self.program, name)
+            for name in ('point_scale', 'value_min', 'value_max',
+                         'max_hits', 'colour_map')
+        }
+
+    def update(self, dom_hits, time_offset=0):
+        """Upload the current values of a ``DomHits``."""
+        self.values = dom_hits.values(time_offset)
+        self.max_hits = max(dom_hits.counts.max(initial=0), 1)
+        self.vbo.set_array(self.values)
+
+    def clear(self):
+        self.values = np.zeros((0, VALUES_SIZE), dtype=np.float32)
+        self.vbo.set_array(self.values)
+
+    def draw(self, viewport_height, colour_map, value_range):
+        """Draw the glyphs, the first hit times in ``value_range`` (offset
+        corrected) span the colour map."""
+        if len(self.values) == 0:
+            return
+        point_scale = viewport_height / (2 * np.tan(np.radians(self.fov) / 2))
+        value_min, value_max = value_range
+
+        glUseProgram(self.program)
+        glEnable(GL_VERTEX_PROGRAM_POINT_SIZE)
+        glEnable(GL_POINT_SPRITE)
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_1D, colour_map.texture)
+        glUniform1i(self._uniforms['colour_map'], 0)
+        glUniform1f(self._uniforms['point_scale'], point_scale)
+        glUniform1f(self._uniforms['value_min'], value_min)
+        glUniform1f(self._uniforms['value_max'], value_max)
+        glUniform1f(self._uniforms['max_hits'], self.max_hits)
+        try:
+            self.positions_vbo.bind()
+            glEnableClientState(GL_VERTEX_ARRAY)
+            glVertexPointer(3, GL_FLOAT, 0, self.positions_vbo)
+            self.vbo.bind()
+            self._attribute_pointer('dom_hits', 0)
+            self._attribute_pointer('dom_tot', 1)
+            self._attribute_pointer('dom_first_time', 2)
+            glDrawArrays(GL_POINTS, 0, len(self.values))
+        finally:
+            for location in self._attributes.values():
+                if location >= 0:
+                    glDisableVertexAttribArray(location)
+            glDisableClientState(GL_VERTEX_ARRAY)
+            self.vbo.unbind()
+            self.positions_vbo.unbind()
+            glBindTexture(GL_TEXTURE_1D, 0)
+            glDisable(GL_POINT_SPRITE)
+            glDisable(GL_VERTEX_PROGRAM_POINT_SIZE)
+            glUseProgram(0)
+
+    def _attribute_pointer(self, name, offset):
+        location = self._attributes[name]
+        if location < 0:  # optimised away by the shader compiler
+            return
+        glEnableVertexAttribArray(location)
+        glVertexAttribPointer(location, 1, GL_FLOAT, GL_FALSE, STRIDE,
+                              self.vbo + offset * 4)
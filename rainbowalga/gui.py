@@ -6,12 +6,25 @@ RainbowAlga GUI stuff.
 """
 from __future__ import division, absolute_import, print_function
 
-from OpenGL.GL import glColor3f, glClearColor
+from OpenGL.GL import (
+    glBindTexture, glBegin, glColor3f, glClearColor, glColorPointer,
+    glDisable, glDisableClientState, glDrawArrays, glEnable,
+    glEnableClientState, glEnd, glGenTextures, glPixelStorei, glTexCoord2f,
+    glTexEnvi, glTexImage2D, glTexParameteri, glVertex2f, glVertexPointer,
+    GL_COLOR_ARRAY, GL_FLOAT, GL_LIGHTING, GL_NEAREST, GL_QUADS, GL_REPLACE,
+    GL_RGB, GL_TEXTURE_2D, GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE,
+    GL_TEXTURE_MAG_FILTER, GL_TEXTURE_MIN_FILTER, GL_UNPACK_ALIGNMENT,
+    GL_UNSIGNED_BYTE, GL_VERTEX_ARRAY)
+from OpenGL.arrays import vbo
 
-import pylab
 import itertools
+import math
 
-from km3pipe.logger import logging
+import numpy as np
+
+from .colourmaps import get_colour_map
+
+import logging
 log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
 
 class Colourist(object):
@@ -27,17 +40,18 @@ class Colourist(object):
         log.info("Initialising colourist.")
         self.print_mode = False
         self.cherenkov_cone_enabled = False
-        self.cmap_names = ['RdBu', 'seismic', 'Set1', 'brg', 'gist_rainbow']
+        self.cmap_names = ['RdBu', 'seismic', 'Set1', 'brg', 'bwr', 'jet',
+                           'hot', 'cool', 'gist_rainbow']
         self.cmap_generator = itertools.cycle(self.cmap_names)
         pass
 
     @property
     def default_cmap(self):
-        return pylab.get_cmap(self.cmap_names[-1])
+        return get_colour_map(self.cmap_names[-1])
 
     @property
     def next_cmap(self):
-        return pylab.get_cmap(next(self.cmap_generator))
+        return get_colour_map(next(self.cmap_generator))
 
     def now_text(self):
         if self.print_mode:
@@ -56,3 +70,150 @@ class Colourist(object):
             glClearColor(0.0, 0.0, 0.0, 1.0)
         else:
             glClearColor(1.0, 1.0, 1.0, 1.0)
+
+
+class Logo(object):
+    """An image uploaded once as a texture and drawn as a textured quad."""
+
+    def __init__(self, image_path):
+        from PIL import Image
+        image = Image.open(image_path).convert('RGB')
+        self.size = image.size
+        self.pixels = np.asarray(image, dtype=np.uint8)
+        self._texture = None
+
+    @property
+    def texture(self):
+        if self._texture is None:
+            self._texture = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self._texture)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, self.size[0], self.size[1],
+                         0, GL_RGB, GL_UNSIGNED_BYTE, self.pixels)
+            glBindTexture(GL_TEXTURE_2D, 0)
+        return self._texture
+
+    def draw(self, x, y):
+        """Draw the logo with its top left corner at (x, y).
+
+        Expects an orthographic projection with y pointing downwards.
+        """
+        width, height = self.size
+        glDisable(GL_LIGHTING)
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_REPLACE)
+        glBegin(GL_QUADS)
+        glTexCoord2f(0, 0)
+        glVertex2f(x, y)
+        glTexCoord2f(1, 0)
+        glVertex2f(x + width, y)
+        glTexCoord2f(1, 1)
+        glVertex2f(x + width, y + height)
+        glTexCoord2f(0, 1)
+        glVertex2f(x, y + height)
+        glEnd()
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_TEXTURE_2D)
+
+
+def legend_ticks(min_time, max_time, n_segments=20, base=50):
+    """The segment start times and the step size of the colour legend."""
+    step = math.ceil((max_time - min_time) / n_segments / base) * base
+    if step <= 0:
+        return np.zeros(0, dtype=int), step
+    return np.arange(int(min_time), int(max_time), int(step)), step
+
+
+def legend_vertices(ticks, step, cmap, value_range, left_x, right_x, min_y,
+                    max_y):
+    """Quads of the colour legend as (x, y, r, g, b) float32 vertices.
+
+    Each segment fades from the colour of its start to its end time, the
+    first segment is at the bottom (y pointing downwards).
+    """
+    segment_height = int((max_y - min_y) / len(ticks))
+    n_segments = np.arange(len(ticks))
+    bottom = max_y - segment_height * n_segments
+    top = bottom - segment_height
+    bottom_colours = cmap.map(ticks, *value_range)
+    top_colours = cmap.map(ticks + step, *value_range)
+    vertices = np.empty((len(ticks), 4, 5), dtype=np.float32)
+    vertices[:, 0, :2] = np.column_stack((np.full(len(ticks), left_x), bottom))
+    vertices[:, 1, :2] = np.column_stack((np.full(len(ticks), right_x),
+                                          bottom))
+    vertices[:, 2, :2] = np.column_stack((np.full(len(ticks), right_x), top))
+    vertices[:, 3, :2] = np.column_stack((np.full(len(ticks), left_x), top))
+    vertices[:, :2, 2:] = bottom_colours[:, np.newaxis]
+    vertices[:, 2:, 2:] = top_colours[:, np.newaxis]
+    return vertices.reshape(-1, 5), segment_height
+
+
+class ColourLegend(object):
+    """The colour legend, baked into a vertex buffer.
+
+    The buffer and the labels are only rebuilt when the window size, the
+    time range, the colour map or the print mode changes.
+    """
+
+    def __init__(self):
+        self.vbo = None
+        self.n_vertices = 0
+        self.labels = []
+        self._key = None
+        self.n_builds = 0
+
+    def update(self, width, height, top, value_range, cmap, print_mode,
+               label_offset=0, label_scale=1):
+        """Rebuild the legend if any of the parameters changed.
+
+        The labels are moved left to make room for text scaled by
+        ``label_scale``. Returns True if it was rebuilt.
+        """
+        key = (width, height, top, tuple(value_range), cmap.name, print_mode,
+               label_offset, label_scale)
+        if key == self._key:
+            return False
+        self._key = key
+        self.n_builds += 1
+
+        left_x = width - 20
+        right_x = width - 10
+        min_y = top + 5
+        max_y = height - 20
+        ticks, step = legend_ticks(*value_range)
+        if len(ticks) < 2:
+            self.n_vertices = 0
+            self.labels = []
+            return True
+        vertices, segment_height = legend_vertices(
+            ticks, step, cmap, value_range, left_x, right_x, min_y, max_y)
+        if self.vbo is None:
+            self.vbo = vbo.VBO(vertices)
+        else:
+            self.vbo.set_array(vertices)
+        self.n_vertices = len(vertices)
+        # The labels are drawn with y pointing upwards
+        label_x = left_x - int(60 * label_scale)
+        self.labels = [("{0:>5}ns".format(int(tick - label_offset)),
+                        label_x, (height - max_y) + segment_height * i)
+                       for i, tick in enumerate(ticks)]
+        return True
+
+    def draw(self):
+        if self.n_vertices == 0:
+            return
+        glDisable(GL_LIGHTING)
+        self.vbo.bind()
+        try:
+            glEnableClientState(GL_VERTEX_ARRAY)
+            glEnableClientState(GL_COLOR_ARRAY)
+            glVertexPointer(2, GL_FLOAT, 20, self.vbo)
+            glColorPointer(3, GL_FLOAT, 20, self.vbo + 8)
+            glDrawArrays(GL_QUADS, 0, self.n_vertices)
+        finally:
+            self.vbo.unbind()
+            glDisableClientState(GL_COLOR_ARRAY)
+            glDisableClientState(GL_VERTEX_ARRAY)
@@ -1,92 +1,243 @@
+# coding=utf-8
+# Filename: hardware.py
+"""
+The detector geometry, baked into static vertex buffers.
+
+The DU strings (one line from the lowest to the highest DOM), the DOMs and
+optionally the PMTs are sorted by DU, so the geometry of each DU is a
+contiguous range in one vertex buffer. Each frame, the axis-aligned
+bounding boxes of the DUs are tested against the view frustum and the
+distance of the camera to each box selects the level of detail: distant
+DUs are drawn as strings, closer ones as DOMs and the PMTs are added for
+DUs next to the camera. Neighbouring DUs of the same level are merged into
+a single draw call, so a frame needs at most a few calls per level however
+large the detector is.
+
+"""
 from __future__ import division, absolute_import, print_function
 
-import pickle
-
-from OpenGL.GLUT import glutSolidSphere
-from OpenGL.GL import (glBegin, glColor3f, glColorMaterial, glDisable,
-                       glEnable, glEnd, glLineWidth, glPointSize, glPopMatrix,
-                       glPushMatrix, glShadeModel, glTranslated, glVertex3f,
-                       GL_POINTS, GL_LINES, GL_DEPTH_TEST, GL_FLAT,
-                       GL_LIGHTING, GL_COLOR_MATERIAL, GL_FRONT, GL_DIFFUSE)
-
-from .core import Position
-
-class Detector(object):
-    def __init__(self):
-        omkeys = pickle.load(open('geometry_dump.pickle', 'r')) 
-        self.doms = [pmt for pmt in omkeys.items() if pmt[0][2] == 0]
-        self.dom_positions = [pos for omkey, (pos, dir) in self.doms]
-        self.line_positions = [pos for omkey, (pos, dir) in self.doms
-                                   if omkey[1] == 1 and omkey[2] == 0]
-        self.z_min = min([z for x, y, z in self.dom_positions])
-        self.z_max = max([z for x, y, z in self.dom_positions])
-
-    def draw_lines(self, line_width=1):
-        glEnable(GL_DEPTH_TEST)
-        glShadeModel(GL_FLAT)
-        for position in self.line_positions:
-            glPushMatrix()
-            glTranslated(position[0], position[1], 0)
-            glLineWidth(line_width)
-            glBegin(GL_LINES)
-            glVertex3f(0.0, 0.0, self.z_min)
-            glVertex3f(0.0, 0.0, self.z_max)
-            glEnd()
-            glPopMatrix()
-
-    def draw_doms(self, size=3):
-        glPushMatrix()
-        glPointSize(size)
-        glColor3f(1.0, 1.0, 1.0)
-        glBegin(GL_POINTS)
-        for position in self.dom_positions:
-            glVertex3f(position[0], position[1], position[2])
-        glEnd()
-        glPopMatrix()
-
-
-
-class DetectorLine(object):
-    def __init__(self, x, y, z, length):
-        self.x = x
-        self.y = y
-        self.z = z 
-        self.length = length
-        
-    def draw(self, line_width=2):
-        glEnable(GL_DEPTH_TEST)
-        glShadeModel(GL_FLAT)
-        glPushMatrix()
-        glTranslated(self.x, self.y, self.z)
-        glLineWidth(line_width)
-        glColor3f(1.0, 1.0, 1.0)
-        glBegin(GL_LINES)
-        glVertex3f(0.0, 0.0, 0.0)
-        glVertex3f(0.0, 0.0, self.length)
-        glEnd()
-        glPopMatrix()
-
-
-class DOM(object):
-    def __init__(self, pos=Position(0, 0, 0), radius=0.2):
-        self.pos = pos
-        self.radius = radius
-
-    def draw(self):
-        glPushMatrix()
-        glTranslated(self.pos.x, self.pos.y, self.pos.z)
-
-        glEnable(GL_LIGHTING)
-        color_r = 0.5
-        color_g = 0.0
-        color_b = 0.0
-        glColor3f(color_r, color_g, color_b)
-        glEnable(GL_COLOR_MATERIAL)
-        glColorMaterial(GL_FRONT, GL_DIFFUSE)
-        #glDisable(GL_TEXTURE_2D)
-        glutSolidSphere(self.radius, 64, 64)
-        glDisable(GL_COLOR_MATERIAL)
-
-        glDisable(GL_LIGHTING)
-
-        glPopMatrix()
+import numpy as np
+
+from OpenGL.GL import (
+    glDisableClientState, glDrawArrays, glEnableClientState, glGetFloatv,
+    glGetUniformLocation, glLineWidth, glPointSize, glUniform4f,
+    glUseProgram, glVertexPointer, GL_FLOAT, GL_LINES, GL_MODELVIEW_MATRIX,
+    GL_POINTS, GL_PROJECTION_MATRIX, GL_VERTEX_ARRAY, GL_VERTEX_SHADER,
+    GL_FRAGMENT_SHADER)
+from OpenGL.arrays import vbo
+from OpenGL.GL.shaders import compileShader, compileProgram
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+PMT_DISTANCE = 200  # m
+DOM_DISTANCE = 3000  # m
+
+LINE_COLOUR = (0.3, 0.3, 0.3, 1)
+DOM_COLOUR = (0.5, 0.5, 0.5, 1)
+PMT_COLOUR = (0.7, 0.7, 0.7, 1)
+
+SCENE_VERTEX_SHADER = """
+#version 120
+void main() {
+    gl_Position = gl_ModelViewProjectionMatrix * gl_Vertex;
+}"""
+
+SCENE_FRAGMENT_SHADER = """
+#version 120
+uniform vec4 colour;
+void main() {
+    gl_FragColor = colour;
+}"""
+
+
+def _positions(array):
+    return np.column_stack((array['pos_x'], array['pos_y'], array['pos_z']))
+
+
+def _ranges(group, n_groups):
+    """The first index and the length of each group in a sorted array."""
+    counts = np.bincount(group, minlength=n_groups)
+    return np.cumsum(counts) - counts, counts
+
+
+def frustum_planes(projection, modelview):
+    """The six planes (a, b, c, d) of the view frustum, a point p is inside
+    if ``a * p.x + b * p.y + c * p.z + d >= 0`` for all of them.
+
+    :param projection, modelview: The matrices as returned by
+                                  ``glGetFloatv`` (column-major)
+
+    """
+    clip = np.dot(np.asarray(modelview, dtype=np.float64).reshape(4, 4),
+                  np.asarray(projection, dtype=np.float64).reshape(4, 4)).T
+    return np.array([
+        clip[3] + clip[0], clip[3] - clip[0], clip[3] + clip[1],
+        clip[3] - clip[1], clip[3] + clip[2], clip[3] - clip[2]
+    ])
+
+
+def boxes_in_frustum(planes, lower, upper):
+    """Mask of the axis-aligned boxes which are (partly) inside the
+    frustum, boxes close to a frustum corner may be kept."""
+    normals = planes[:, np.newaxis, :3]
+    # the box corner furthest along each plane normal
+    corners = np.where(normals >= 0, upper, lower)
+    distances = np.sum(corners * normals, axis=2) + planes[:, np.newaxis, 3]
+    return np.all(distances >= 0, axis=0)
+
+
+def box_distances(point, lower, upper):
+    """The distance of a point to each axis-aligned box, 0 if inside."""
+    point = np.asarray(point, dtype=np.float64)
+    return np.linalg.norm(np.clip(point, lower, upper) - point, axis=1)
+
+
+def merged_ranges(first, count, mask):
+    """Merge the selected ranges which follow each other without a gap.
+
+    Returns the first indices and the lengths of the merged ranges.
+    """
+    selected = np.flatnonzero(mask & (count > 0))
+    if len(selected) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    starts, ends = first[selected], first[selected] + count[selected]
+    new_range = np.ones(len(selected), dtype=bool)
+    new_range[1:] = starts[1:] != ends[:-1]
+    last = np.append(np.flatnonzero(new_range)[1:] - 1, len(selected) - 1)
+    return starts[new_range], ends[last] - starts[new_range]
+
+
+class DetectorScene(object):
+    """The DU strings, DOMs and PMTs of a detector in one vertex buffer.
+
+    The geometry is baked on construction, which does not need an OpenGL
+    context; the buffer and the shader are created on the first draw.
+
+    :param doms: A structured array with the fields of ``DOMS_DTYPE``
+    :param pmts: A structured array with the fields of ``PMTS_DTYPE``, no
+                 PMTs are drawn if not given
+    :param float pmt_distance: The PMTs of DUs within this distance to the
+                               camera are drawn
+    :param float dom_distance: The DOMs of DUs within this distance to the
+                               camera are drawn, the strings of the others
+
+    """
+
+    def __init__(self, doms, pmts=None, pmt_distance=PMT_DISTANCE,
+                 dom_distance=DOM_DISTANCE):
+        self.pmt_distance = pmt_distance
+        self.dom_distance = dom_distance
+        self.du_ids, du_index = np.unique(doms['du'], return_inverse=True)
+        n_dus = len(self.du_ids)
+
+        order = np.lexsort((doms['floor'], du_index))
+        dom_du, dom_pos = du_index[order], _positions(doms)[order]
+
+        # one segment from the lowest to the highest DOM of each DU
+        dom_first, dom_count = _ranges(dom_du, n_dus)
+        segments = np.empty((n_dus * 2, 3))
+        segments[0::2] = dom_pos[dom_first]
+        segments[1::2] = dom_pos[dom_first + dom_count - 1]
+        segment_du = np.repeat(np.arange(n_dus), 2)
+
+        if pmts is None:
+            pmts = np.zeros(0, dtype=[('du', 'u2'), ('pos_x', 'f8'),
+                                      ('pos_y', 'f8'), ('pos_z', 'f8')])
+        known = np.isin(pmts['du'], self.du_ids)
+        pmt_du = np.searchsorted(self.du_ids, pmts['du'][known])
+        order = np.argsort(pmt_du, kind='stable')
+        pmt_du, pmt_pos = pmt_du[order], _positions(pmts[known])[order]
+
+        self.vertices = np.concatenate((segments, dom_pos, pmt_pos)).astype(
+            np.float32)
+        self.line_first, self.line_count = _ranges(segment_du, n_dus)
+        self.dom_first, self.dom_count = dom_first, dom_count
+        self.pmt_first, self.pmt_count = _ranges(pmt_du, n_dus)
+        self.dom_first += len(segments)
+        self.pmt_first += len(segments) + len(dom_pos)
+
+        all_pos = np.concatenate((dom_pos, pmt_pos))
+        all_du = np.concatenate((dom_du, pmt_du))
+        self.lower = np.full((n_dus, 3), np.inf)
+        self.upper = np.full((n_dus, 3), -np.inf)
+        np.minimum.at(self.lower, all_du, all_pos)
+        np.maximum.at(self.upper, all_du, all_pos)
+
+        self.n_visible_dus = self.n_dom_dus = self.n_pmt_dus = 0
+        self.vbo = None
+        self.program = None
+
+    def __len__(self):
+        """The number of DUs."""
+        return len(self.du_ids)
+
+    @property
+    def n_pmts(self):
+        return int(self.pmt_count.sum())
+
+    def levels(self, eye, planes=None):
+        """Masks of the DUs whose strings, DOMs and PMTs are drawn.
+
+        :param eye: The camera position
+        :param planes: The frustum planes, no culling if not given
+
+        """
+        if planes is None:
+            visible = np.ones(len(self), dtype=bool)
+        else:
+            visible = boxes_in_frustum(planes, self.lower, self.upper)
+        distances = box_distances(eye, self.lower, self.upper)
+        near = distances <= self.dom_distance
+        return (visible & ~near, visible & near,
+                visible & (distances <= self.pmt_distance))
+
+    def _init_gl(self):
+        self.vbo = vbo.VBO(self.vertices)
+        self.program = compileProgram(
+            compileShader(SCENE_VERTEX_SHADER, GL_VERTEX_SHADER),
+            compileShader(SCENE_FRAGMENT_SHADER, GL_FRAGMENT_SHADER))
+        self._colour = glGetUniformLocation(self.program, 'colour')
+
+    def draw(self, eye):
+        """Draw the DUs in the view frustum of the current matrices, with
+        the level of detail for the camera position ``eye``."""
+        if len(self) == 0:
+            return
+        if self.vbo is None:
+            self._init_gl()
+        planes = frustum_planes(glGetFloatv(GL_PROJECTION_MATRIX),
+                                glGetFloatv(GL_MODELVIEW_MATRIX))
+        lines, doms, pmts = self.levels(eye, planes)
+        self.n_visible_dus = np.count_nonzero(lines | doms)
+        self.n_dom_dus = np.count_nonzero(doms)
+        self.n_pmt_dus = np.count_nonzero(pmts)
+
+        glUseProgram(self.program)
+        try:
+            self.vbo.bind()
+            glEnableClientState(GL_VERTEX_ARRAY)
+            glVertexPointer(3, GL_FLOAT, 0, self.vbo)
+            glLineWidth(1)
+            self._draw_ranges(GL_LINES, LINE_COLOUR, self.line_first,
+                              self.line_count, lines)
+            glPointSize(2)
+            self._draw_ranges(GL_POINTS, DOM_COLOUR, self.dom_first,
+                              self.dom_count, doms)
+            glPointSize(1)
+            self._draw_ranges(GL_POINTS, PMT_COLOUR, self.pmt_first,
+                              self.pmt_count, pmts)
+        finally:
+            glDisableClientState(GL_VERTEX_ARRAY)
+            self.vbo.unbind()
+            glUseProgram(0)
+
+    def _draw_ranges(self, mode, colour, first, count, mask):
+        glUniform4f(self._colour, *colour)
+        for start, length in zip(*merged_ranges(first, count, mask)):
+            glDrawArrays(mode, int(start), int(length))
+
+    def __str__(self):
+        return "DUs: {0} of {1} in view, DOMs of {2}, PMTs of {3}".format(
+            self.n_visible_dus, len(self), self.n_dom_dus, self.n_pmt_dus)
+
@@ -0,0 +1,217 @@
+# coding=utf-8
+# Filename: headless.py
+"""
+Offscreen batch rendering of events into image files.
+
+The events are distributed over a pool of processes, each of them renders
+into its own offscreen EGL (pbuffer) or OSMesa context, so no display is
+needed. Mesa's llvmpipe driver makes this work on CPU-only nodes.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import ctypes
+import multiprocessing
+import os
+import time
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+PLATFORMS = ('egl', 'osmesa')
+
+_worker = None
+
+
+def parse_range(text, n_items):
+    """Parse a 'START:STOP' range (Python slice semantics) to a range."""
+    if ':' not in text:
+        index = int(text)
+        return range(index, index + 1)
+    start, stop = text.split(':', 1)
+    return range(*slice(int(start) if start else None,
+                        int(stop) if stop else None).indices(n_items))
+
+
+def parse_size(text):
+    """Parse a 'WIDTHxHEIGHT' string."""
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def create_egl_context(width, height):
+    """Create and activate an EGL pbuffer context with a desktop GL API."""
+    from OpenGL import EGL
+
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    if not EGL.eglInitialize(display, ctypes.pointer(major),
+                             ctypes.pointer(minor)):
+        raise RuntimeError("Could not initialise the EGL display.")
+    attributes = [
+        EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+        EGL.EGL_RED_SIZE, 8,
+        EGL.EGL_GREEN_SIZE, 8,
+        EGL.EGL_BLUE_SIZE, 8,
+        EGL.EGL_DEPTH_SIZE, 24,
+        EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+        EGL.EGL_NONE
+    ]  # yapf: disable
+    config = EGL.EGLConfig()
+    n_configs = EGL.EGLint()
+    EGL.eglChooseConfig(display, (EGL.EGLint * len(attributes))(*attributes),
+                        ctypes.pointer(config), 1, ctypes.pointer(n_configs))
+    if n_configs.value < 1:
+        raise RuntimeError("No suitable EGL configuration found.")
+    surface_attributes = (EGL.EGLint * 5)(EGL.EGL_WIDTH, width,
+                                          EGL.EGL_HEIGHT, height, EGL.EGL_NONE)
+    surface = EGL.eglCreatePbufferSurface(display, config, surface_attributes)
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+    if not EGL.eglMakeCurrent(display, surface, surface, context):
+        raise RuntimeError("Could not activate the EGL context.")
+    return context
+
+
+def create_osmesa_context(width, height):
+    """Create and activate an OSMesa context rendering into main memory."""
+    from OpenGL import arrays, osmesa
+    from OpenGL.GL import GL_UNSIGNED_BYTE
+
+    context = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0,
+                                            None)
+    if not context:
+        raise RuntimeError("Could not create an OSMesa context.")
+    buffer = arrays.GLubyteArray.zeros((height, width, 4))
+    if not osmesa.OSMesaMakeCurrent(context, buffer, GL_UNSIGNED_BYTE, width,
+                                    height):
+        raise RuntimeError("Could not activate the OSMesa context.")
+    return context, buffer
+
+
+def create_context(platform, width, height):
+    """Create an offscreen context, PyOpenGL must use the same platform."""
+    if platform == 'egl':
+        return create_egl_context(width, height)
+    if platform == 'osmesa':
+        return create_osmesa_context(width, height)
+    raise ValueError("Unknown platform '{0}', choose from: {1}".format(
+        platform, ', '.join(PLATFORMS)))
+
+
+def set_platform(platform):
+    """Select the PyOpenGL platform, must be called before importing GL."""
+    if platform not in PLATFORMS:
+        raise ValueError("Unknown platform '{0}', choose from: {1}".format(
+            platform, ', '.join(PLATFORMS)))
+    os.environ['PYOPENGL_PLATFORM'] = platform
+    if platform == 'egl':
+        os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+
+def chunked(indices, chunk_size):
+    """Split a sequence of indices into contiguous chunks."""
+    indices = list(indices)
+    return [
+        indices[i:i + chunk_size] for i in range(0, len(indices), chunk_size)
+    ]
+
+
+class OffscreenRenderer(object):
+    """A RainbowAlga instance rendering into an offscreen context."""
+
+    def __init__(self, platform, event_file, detector, min_tot, out_dir,
+                 width, height, first_index=0, simulate=None):
+        self.context = create_context(platform, width, height)
+
+        from rainbowalga.__main__ import RainbowAlga
+
+        self.out_dir = out_dir
+        if simulate is None:
+            self.prefix = os.path.splitext(os.path.basename(event_file))[0]
+        else:
+            self.prefix = 'synthetic'
+        self.app = RainbowAlga(detector, event_file, min_tot,
+                               skip_to_blob=first_index, prefetch=1,
+                               cache_size=64, width=width, height=height,
+                               use_index=False, simulate=simulate,
+                               headless=True)
+
+    def filename(self, index):
+        return os.path.join(self.out_dir,
+                            "{0}_{1:06d}.png".format(self.prefix, index))
+
+    def render(self, index):
+        app = self.app
+        if app.event_index != index or app.hits is None:
+            app.load_blob(index)
+        app.show_all_hits()
+        app.render()
+        app.save_screenshot(self.filename(index))
+
+
+def _init_worker(*args):
+    global _worker
+    _worker = OffscreenRenderer(*args)
+
+
+def _render_chunk(indices):
+    n_rendered = 0
+    for index in indices:
+        try:
+            _worker.render(index)
+        except Exception as e:
+            log.error("Could not render event {0}: {1}".format(index, e))
+        else:
+            n_rendered += 1
+    return n_rendered
+
+
+def render_events(event_file, detector, min_tot, events, out_dir, jobs=None,
+                  width=800, height=600, platform='egl', chunk_size=20,
+                  simulate=None):
+    """Render the given events of a file into PNG images in ``out_dir``.
+
+    :param events: Range string 'START:STOP' of the event indices
+    :param int jobs: Number of processes (default: number of CPUs)
+    :param str platform: Offscreen platform, 'egl' or 'osmesa'
+    :param str simulate: Render synthetic events of this generator spec
+                         instead of the events of the file
+
+    """
+    if simulate is not None:
+        from rainbowalga.generator import EventGenerator
+        n_events = len(EventGenerator.from_spec(simulate))
+    elif event_file is not None:
+        import km3io
+        n_events = len(km3io.OnlineReader(event_file).events)
+    else:
+        raise ValueError("Either an event file or a generator spec is "
+                         "needed.")
+    indices = parse_range(events, n_events)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    chunks = chunked(indices, chunk_size)
+    if not chunks:
+        print("No events in range '{0}'.".format(events))
+        return 0
+    jobs = min(jobs or multiprocessing.cpu_count(), len(chunks))
+
+    # The workers are spawned, so they import OpenGL with this platform
+    set_platform(platform)
+    context = multiprocessing.get_context('spawn')
+    print("Rendering {0} events with {1} processes...".format(
+        len(indices), jobs))
+    start = time.time()
+    n_rendered = 0
+    with context.Pool(jobs,
+                      initializer=_init_worker,
+                      initargs=(platform, event_file, detector, min_tot,
+                                out_dir, width, height, indices[0],
+                                simulate)) as pool:
+        for n in pool.imap_unordered(_render_chunk, chunks):
+            n_rendered += n
+            print("{0}/{1} events rendered".format(n_rendered, len(indices)))
+    print("Rendered {0} events in {1:.1f}s".format(n_rendered,
+                                                  time.time() - start))
+    return n_rendered
@@ -0,0 +1,268 @@
+# coding=utf-8
+# Filename: hits.py
+"""
+Batched rendering of hits.
+
+All hits of an event live in a single vertex buffer and are drawn with one
+point-sprite call. The visibility by clock time and ToT cut, the sphere
+radius derived from the ToT and the colour lookup in the colour map texture
+are evaluated in the shaders, so changing the ToT cut does not touch the
+vertex buffer.
+
+Hits which are replaced by a later hit with a larger ToT on the same DOM
+carry the time of the replacement, the shader hides them from then on.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+from OpenGL.GL import (
+    glActiveTexture, glBindTexture, glDisable, glDisableClientState,
+    glDisableVertexAttribArray, glDrawArrays, glEnable, glEnableClientState,
+    glEnableVertexAttribArray, glGetAttribLocation, glGetUniformLocation,
+    glUniform1f, glUniform1i, glUseProgram, glVertexAttribPointer,
+    glVertexPointer, GL_FALSE, GL_FLOAT, GL_POINTS, GL_POINT_SPRITE,
+    GL_TEXTURE0, GL_TEXTURE_1D, GL_VERTEX_ARRAY, GL_VERTEX_PROGRAM_POINT_SIZE,
+    GL_VERTEX_SHADER, GL_FRAGMENT_SHADER)
+from OpenGL.arrays import vbo
+from OpenGL.GL.shaders import compileShader, compileProgram
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+# x, y, z, time, tot, value (the quantity mapped to the colour map),
+# hidden_at (the time the hit is replaced)
+VERTEX_SIZE = 7
+STRIDE = VERTEX_SIZE * 4
+NEVER = 1e30  # hidden_at of hits which are never replaced
+
+HIT_VERTEX_SHADER = """
+#version 120
+uniform float time;
+uniform float min_tot;
+uniform float point_scale;
+uniform float value_min;
+uniform float value_max;
+attribute float hit_time;
+attribute float hit_tot;
+attribute float hit_value;
+attribute float hit_hidden_at;
+varying float progress;
+
+void main() {
+    vec4 eye = gl_ModelViewMatrix * gl_Vertex;
+    progress = clamp((hit_value - value_min)
+                     / max(value_max - value_min, 1.0e-6), 0.0, 1.0);
+    if (time < hit_time || time >= hit_hidden_at || hit_tot <= min_tot) {
+        gl_Position = vec4(2.0, 2.0, 2.0, 1.0);
+        gl_PointSize = 0.0;
+        return;
+    }
+    gl_Position = gl_ProjectionMatrix * eye;
+    float radius = floor(1.0 + sqrt(hit_tot) * 1.5);
+    gl_PointSize = 2.0 * radius * point_scale / max(-eye.z, 0.1);
+}"""
+
+HIT_FRAGMENT_SHADER = """
+#version 120
+uniform sampler1D colour_map;
+varying float progress;
+
+void main() {
+    vec2 p = gl_PointCoord * 2.0 - 1.0;
+    float r2 = dot(p, p);
+    if (r2 > 1.0) {
+        discard;
+    }
+    vec3 normal = vec3(p.x, -p.y, sqrt(1.0 - r2));
+    float diffuse = max(dot(normal, normalize(vec3(-1.0, 1.0, 1.0))), 0.0);
+    vec3 colour = texture1D(colour_map, progress).rgb;
+    gl_FragColor = vec4(colour * (0.3 + 0.7 * diffuse), 1.0);
+}"""
+
+
+def hit_vertices(pos_x, pos_y, pos_z, time, tot, values=None,
+                 hidden_at=None):
+    """Interleave the hit attributes into a float32 vertex array.
+
+    If no values are given, the hits are coloured by their time. Without
+    ``hidden_at`` (same time base as ``time``) no hit is ever hidden.
+    """
+    n_hits = len(time)
+    vertices = np.zeros((n_hits, VERTEX_SIZE), dtype=np.float32)
+    vertices[:, 0] = pos_x
+    vertices[:, 1] = pos_y
+    vertices[:, 2] = pos_z
+    vertices[:, 3] = time
+    vertices[:, 4] = tot
+    vertices[:, 5] = time if values is None else values
+    vertices[:, 6] = NEVER if hidden_at is None else hidden_at
+    return vertices
+
+
+def passing_tot_cut(tot, min_tot):
+    """Mask of the hits shown by the hit shader for a ToT cut."""
+    if not min_tot:
+        return np.ones(len(tot), dtype=bool)
+    return np.asarray(tot) > min_tot
+
+
+def hit_radius(tot):
+    """The radius of the hit spheres drawn by the hit shader."""
+    return np.floor(1 + np.sqrt(np.asarray(tot, dtype=np.float64)) * 1.5)
+
+
+def _dom_order(dom_id, time):
+    """The hit indices sorted by DOM and time and the first position of each
+    DOM in this order."""
+    order = np.lexsort((time, dom_id))
+    _, starts = np.unique(np.asarray(dom_id)[order], return_index=True)
+    return order, starts
+
+
+def first_dom_hits(dom_id, time):
+    """The indices of the first hit on each DOM, in time order."""
+    if len(time) == 0:
+        return np.zeros(0, dtype=np.intp)
+    order, starts = _dom_order(dom_id, time)
+    first = order[starts]
+    return first[np.argsort(np.asarray(time)[first], kind='stable')]
+
+
+def largest_tot_hits(dom_id, time, tot):
+    """The hits with a larger ToT than all earlier hits on their DOM.
+
+    Each of these representatives replaces the earlier ones on its DOM.
+    Returns the indices of the representatives (sorted by DOM and time) and
+    for each of them the index of the representative replacing it, or -1 if
+    it is the last one on its DOM.
+    """
+    n_hits = len(time)
+    if n_hits == 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    order, starts = _dom_order(dom_id, time)
+    group = np.zeros(n_hits, dtype=np.int64)
+    group[starts[1:]] = 1
+    group = np.cumsum(group)
+    # shifting each DOM above the previous ones lets a single running
+    # maximum restart at every DOM
+    tot = np.asarray(tot, dtype=np.float64)[order]
+    keys = tot - tot.min() + group * (tot.max() - tot.min() + 1)
+    is_largest = np.ones(n_hits, dtype=bool)
+    is_largest[1:] = keys[1:] > np.maximum.accumulate(keys)[:-1]
+    representatives = order[is_largest]
+    replaced_by = np.full(len(representatives), -1, dtype=np.intp)
+    same_dom = group[is_largest][1:] == group[is_largest][:-1]
+    replaced_by[:-1][same_dom] = representatives[1:][same_dom]
+    return representatives, replaced_by
+
+
+class HitRenderer(object):
+    """Draws all hits of an event with a single point-sprite call.
+
+    The hit times are stored relative to ``time_offset`` to keep the float32
+    precision in the vertex buffer, so the clock time passed to ``draw()``
+    has to be shifted by the same offset. The colours are looked up in a
+    colour map texture, so changing the colour map or the value range does
+    not touch the vertex buffer.
+
+    """
+
+    def __init__(self, fov=45.0):
+        self.fov = fov
+        self.vertices = np.zeros((0, VERTEX_SIZE), dtype=np.float32)
+        self.value_offset = 0
+        self.vbo = vbo.VBO(self.vertices)
+        self.program = compileProgram(
+            compileShader(HIT_VERTEX_SHADER, GL_VERTEX_SHADER),
+            compileShader(HIT_FRAGMENT_SHADER, GL_FRAGMENT_SHADER))
+        self._attributes = {
+            name: glGetAttribLocation(self.program, name)
+            for name in ('hit_time', 'hit_tot', 'hit_value',
+                         'hit_hidden_at')
+        }
+        self._uniforms = {
+            name: glGetUniformLocation(self.program, name)
+            for name in ('time', 'min_tot', 'point_scale', 'value_min',
+                         'value_max', 'colour_map')
+        }
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def upload(self, hits, time_offset=0, values=None, hidden_at=None):
+        """Replace the vertex buffer with the given hits.
+
+        The values mapped to the colours default to the hit times. The hits
+        are hidden from the times in ``hidden_at`` on (e.g. the times of the
+        hits replacing them, ``NEVER`` to keep them).
+        """
+        if values is None:
+            self.value_offset = time_offset
+        else:
+            self.value_offset = 0
+        if hidden_at is not None:
+            hidden_at = np.asarray(hidden_at) - time_offset
+        self.vertices = hit_vertices(hits.pos_x, hits.pos_y, hits.pos_z,
+                                     hits.time - time_offset, hits.tot,
+                                     values, hidden_at)
+        self.vbo.set_array(self.vertices)
+        log.debug("Uploaded {0} hits".format(len(self.vertices)))
+
+    def clear(self):
+        self.vertices = np.zeros((0, VERTEX_SIZE), dtype=np.float32)
+        self.vbo.set_array(self.vertices)
+
+    def draw(self, time, viewport_height, colour_map, value_range,
+             min_tot=None):
+        """Draw the hits which are reached by the (offset corrected) time.
+
+        :param colour_map: A ``rainbowalga.colourmaps.ColourMap``
+        :param value_range: The (min, max) values of the colour map
+        :param float min_tot: Only hits with a larger ToT are shown
+
+        """
+        if len(self.vertices) == 0:
+            return
+        point_scale = viewport_height / (2 * np.tan(np.radians(self.fov) / 2))
+        value_min, value_max = value_range
+
+        glUseProgram(self.program)
+        glEnable(GL_VERTEX_PROGRAM_POINT_SIZE)
+        glEnable(GL_POINT_SPRITE)
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_1D, colour_map.texture)
+        glUniform1i(self._uniforms['colour_map'], 0)
+        glUniform1f(self._uniforms['time'], time)
+        glUniform1f(self._uniforms['min_tot'], min_tot or -1)
+        glUniform1f(self._uniforms['point_scale'], point_scale)
+        glUniform1f(self._uniforms['value_min'], value_min - self.value_offset)
+        glUniform1f(self._uniforms['value_max'], value_max - self.value_offset)
+        self.vbo.bind()
+        try:
+            glEnableClientState(GL_VERTEX_ARRAY)
+            glVertexPointer(3, GL_FLOAT, STRIDE, self.vbo)
+            self._attribute_pointer('hit_time', 1, 3)
+            self._attribute_pointer('hit_tot', 1, 4)
+            self._attribute_pointer('hit_value', 1, 5)
+            self._attribute_pointer('hit_hidden_at', 1, 6)
+            glDrawArrays(GL_POINTS, 0, len(self.vertices))
+        finally:
+            for location in self._attributes.values():
+                if location >= 0:
+                    glDisableVertexAttribArray(location)
+            glDisableClientState(GL_VERTEX_ARRAY)
+            self.vbo.unbind()
+            glBindTexture(GL_TEXTURE_1D, 0)
+            glDisable(GL_POINT_SPRITE)
+            glDisable(GL_VERTEX_PROGRAM_POINT_SIZE)
+            glUseProgram(0)
+
+    def _attribute_pointer(self, name, size, offset):
+        location = self._attributes[name]
+        if location < 0:  # optimised away by the shader compiler
+            return
+        glEnableVertexAttribArray(location)
+        glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, STRIDE,
+                              self.vbo + offset * 4)
@@ -0,0 +1,250 @@
+# coding=utf-8
+# Filename: index.py
+"""
+Persistent per-file index of the events.
+
+The first time a file is opened, the headers and hit counts of all events
+are collected in one pass and stored in a small sidecar file next to it
+(``<ROOT_FILE>.index.npz``, or in the cache directory if the file's
+directory is not writable). Later sessions load the index in a few
+milliseconds, it is rebuilt when the size or the modification time of the
+file changes.
+
+The index is used to jump to an event by its trigger counter or time and to
+step only through the events passing a cut on the index columns, without
+reading the skipped events.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import hashlib
+import operator
+import os
+import re
+
+import numpy as np
+
+from rainbowalga.calibration import CACHE_DIR
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+INDEX_VERSION = 1
+SIDECAR_SUFFIX = '.index.npz'
+
+INDEX_DTYPE = np.dtype([
+    ('entry', '<i8'),
+    ('run', '<i4'),
+    ('frame_index', '<u4'),
+    ('trigger_counter', '<u8'),
+    ('trigger_mask', '<u8'),
+    ('utc_seconds', '<u4'),
+    ('utc_nanoseconds', '<u4'),
+    ('n_hits', '<u4'),
+    ('n_triggered_hits', '<u4'),
+    ('tot_sum', '<u8'),
+])
+
+CUT_OPERATORS = {
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '<': operator.lt,
+    '&': lambda column, mask: (column & mask) != 0,
+}
+CUT_PATTERN = re.compile(
+    r'^\s*(\w+)\s*(>=|<=|==|!=|>|<|&)\s*([\w.+-]+)\s*$')
+
+
+def _lengths_and_sums(jagged):
+    """The number of values per event and their sums."""
+    try:
+        import awkward as ak
+        return (np.asarray(ak.num(jagged), dtype=np.int64),
+                np.asarray(ak.sum(jagged, axis=1), dtype=np.int64))
+    except (ImportError, TypeError, ValueError):  # e.g. awkward0 arrays
+        rows = [np.asarray(row) for row in jagged]
+        return (np.array([len(row) for row in rows], dtype=np.int64),
+                np.array([np.sum(row, dtype=np.int64) for row in rows],
+                         dtype=np.int64))
+
+
+def build_index(events, chunk_size=10000):
+    """Collect the index entries of the events of an ``OnlineReader``.
+
+    Only the headers and the ToT columns are read, in chunks of
+    ``chunk_size`` events.
+    """
+    n_events = len(events)
+    table = np.zeros(n_events, dtype=INDEX_DTYPE)
+    table['entry'] = np.arange(n_events)
+    headers = events.headers
+    for start in range(0, n_events, chunk_size):
+        stop = min(start + chunk_size, n_events)
+        chunk = table[start:stop]
+        chunk['run'] = headers['run'][start:stop]
+        chunk['frame_index'] = headers['frame_index'][start:stop]
+        chunk['trigger_counter'] = headers['trigger_counter'][start:stop]
+        chunk['trigger_mask'] = headers['trigger_mask'][start:stop]
+        chunk['utc_seconds'] = headers['UTC_seconds'][start:stop]
+        chunk['utc_nanoseconds'] = \
+            np.asarray(headers['UTC_16nanosecondcycles'][start:stop]) * 16
+        chunk['n_hits'], chunk['tot_sum'] = _lengths_and_sums(
+            events.snapshot_hits.tot[start:stop])
+        chunk['n_triggered_hits'], _ = _lengths_and_sums(
+            events.triggered_hits.tot[start:stop])
+        log.info("Indexed {0} of {1} events".format(stop, n_events))
+    return table
+
+
+def file_signature(filename):
+    stat = os.stat(filename)
+    return np.array([stat.st_size, stat.st_mtime_ns, INDEX_VERSION],
+                    dtype=np.int64)
+
+
+def index_files(filename, cache_dir=CACHE_DIR):
+    """The sidecar file and its fallback in the cache directory."""
+    files = [filename + SIDECAR_SUFFIX]
+    if cache_dir is not None:
+        key = hashlib.sha1(os.path.abspath(filename).encode('utf-8'))
+        files.append(
+            os.path.join(cache_dir, key.hexdigest() + SIDECAR_SUFFIX))
+    return files
+
+
+def read_index(index_file, signature):
+    """Return the index table or None if missing or out of date."""
+    try:
+        with np.load(index_file) as data:
+            if not np.array_equal(data['signature'], signature):
+                log.info("Outdated event index '{0}'".format(index_file))
+                return None
+            return data['events']
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+
+
+def write_index(index_file, table, signature):
+    directory = os.path.dirname(os.path.abspath(index_file))
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp_filename = "{0}.{1}.tmp".format(index_file, os.getpid())
+    try:
+        with open(tmp_filename, 'wb') as fobj:
+            np.savez(fobj, events=table, signature=signature)
+        os.replace(tmp_filename, index_file)
+    except (IOError, OSError):
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+
+
+def load_event_index(filename, events=None, cache_dir=CACHE_DIR):
+    """Load the index of a file, build and store it on the first call.
+
+    :param events: The events of the file (``OnlineReader.events``), only
+                   needed if the index has to be built
+    :param cache_dir: Fallback directory if the sidecar is not writable
+
+    """
+    signature = file_signature(filename)
+    files = index_files(filename, cache_dir)
+    for index_file in files:
+        table = read_index(index_file, signature)
+        if table is not None:
+            log.info("Loaded event index '{0}'".format(index_file))
+            return EventIndex(table)
+
+    if events is None:
+        import km3io
+        events = km3io.OnlineReader(filename).events
+    print("Indexing {0} events...".format(len(events)))
+    table = build_index(events)
+    for index_file in files:
+        try:
+            write_index(index_file, table, signature)
+        except (IOError, OSError) as e:
+            log.info("Could not write '{0}': {1}".format(index_file, e))
+        else:
+            log.info("Event index written to '{0}'".format(index_file))
+            break
+    else:
+        log.warning("The event index could not be stored.")
+    return EventIndex(table)
+
+
+def parse_cut(cut, columns=INDEX_DTYPE.names):
+    """Parse cuts like ``n_hits>1000,trigger_mask&0x4`` to a list of
+    (column, operator, value)."""
+    cuts = []
+    for part in cut.split(','):
+        match = CUT_PATTERN.match(part)
+        if match is None:
+            raise ValueError("Invalid cut '{0}'".format(part))
+        column, op, value = match.groups()
+        if column not in columns:
+            raise ValueError("Unknown column '{0}', choose from {1}".format(
+                column, ', '.join(columns)))
+        try:
+            value = int(value, 0)
+        except ValueError:
+            value = float(value)
+        cuts.append((column, CUT_OPERATORS[op], value))
+    return cuts
+
+
+def apply_cut(table, cut):
+    """Boolean mask of the rows of a structured array passing a cut."""
+    mask = np.ones(len(table), dtype=bool)
+    for column, op, value in parse_cut(cut, table.dtype.names):
+        mask &= op(table[column], value)
+    return mask
+
+
+class EventIndex(object):
+    """Lookups and selections on the index table of a file."""
+
+    def __init__(self, table):
+        self.table = table
+        self._by_trigger_counter = None
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, index):
+        return self.table[index]
+
+    @property
+    def times(self):
+        """The UTC times of the events in seconds."""
+        return self.table['utc_seconds'] + \
+            self.table['utc_nanoseconds'] * 1e-9
+
+    def find_trigger_counter(self, trigger_counter):
+        """The index of the event with the given trigger counter."""
+        if self._by_trigger_counter is None:
+            self._by_trigger_counter = np.argsort(
+                self.table['trigger_counter'], kind='stable')
+        order = self._by_trigger_counter
+        counters = self.table['trigger_counter'][order]
+        i = np.searchsorted(counters, trigger_counter)
+        if i == len(counters) or counters[i] != trigger_counter:
+            raise KeyError("No event with trigger counter {0}".format(
+                trigger_counter))
+        return int(order[i])
+
+    def find_time(self, utc_time):
+        """The index of the first event at or after the UTC time (seconds),
+        or of the last event if all are earlier."""
+        times = self.times
+        later = np.flatnonzero(times >= utc_time)
+        if len(later) == 0:
+            return len(times) - 1
+        return int(later[np.argmin(times[later])])
+
+    def select(self, cut):
+        """The indices of the events passing a cut string."""
+        return np.flatnonzero(apply_cut(self.table, cut))
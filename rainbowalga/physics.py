@@ -2,261 +2,192 @@ from __future__ import division, absolute_import, print_function
 
 import numpy as np
 
-from km3pipe import constants
-from km3pipe.dataclasses import Vec3
-
-from OpenGL.GL import (glPushMatrix, glLineWidth, glColor3f, glBegin, GL_LINES,
-                       glEnd, glVertex3f, glPushMatrix, glPopMatrix, glEnable,
-                       glTranslated, glRotated, GL_FLAT, GL_DEPTH_TEST,
-                       glShadeModel, glDisable, GL_LIGHTING, glMultMatrixf,
-                       glColor4f)
-from OpenGL.GLUT import glutSolidSphere, glutSolidCone
+from OpenGL.GL import (glLineWidth, glEnable, GL_DEPTH_TEST, glColorPointer,
+                       glDisableClientState, glDrawArrays,
+                       glEnableClientState, glVertexPointer, GL_COLOR_ARRAY,
+                       GL_FLOAT, GL_LINES, GL_VERTEX_ARRAY)
 
 from .gui import Colourist
+from . import constants as rb_constants
 
 VEC_DT = [('x', float), ('y', float), ('z', float)]
 
 
-class Neutrino(object):
-    def __init__(self,
-                 x,
-                 y,
-                 z,
-                 dx,
-                 dy,
-                 dz,
-                 time,
-                 color=(1.0, 0.0, 0.0),
-                 line_width=3):
-        self.x = x
-        self.y = y
-        self.z = z
-        self.dx = dx
-        self.dy = dy
-        self.dz = dz
-        self.pos = Vec3(x, y, z)
-        self.dir = Vec3(dx, dy, dz)
-        self.start_pos = Vec3(x, y, z) - self.dir * 1000
-        self.time = time * 1e-9
-        self.color = color
-        self.line_width = line_width
-        self.hidden = False
-
-    def draw(self, time, line_width=None):
-        if self.hidden:
-            return
-        time = time * 1e-9
-
-        pos_start = self.start_pos + (constants.c * (-self.time) * self.dir)
-        if time >= self.time:
-            pos_end = self.pos
-        else:
-            path = (constants.c * (time - self.time) * self.dir)
-            pos_end = self.pos + path
-
-        glPushMatrix()
-        glLineWidth(self.line_width)
-        glColor3f(*self.color)
-        glBegin(GL_LINES)
-        glVertex3f(*pos_start)
-        glVertex3f(*pos_end)
-        glEnd()
-        glPopMatrix()
-
-
-class Particle(object):
-    def __init__(self,
-                 x,
-                 y,
-                 z,
-                 dx,
-                 dy,
-                 dz,
-                 time,
-                 speed,
-                 colourist,
-                 energy,
-                 length=0,
-                 color=(0.0, 0.5, 0.7),
-                 line_width=1,
-                 cherenkov_cone_enabled=False):
-        self.x = x
-        self.y = y
-        self.z = z
-        self.dx = dx
-        self.dy = dy
-        self.dz = dz
-        self.pos = Vec3(x, y, z)
-        self.dir = Vec3(dx, dy, dz)
-        self.time = time * 1e-9
-        self.speed = speed
-        self.energy = energy
-        self.length = abs(length)
-        self.color = color
-        self.line_width = line_width
-        self.cherenkov_cone_enabled = cherenkov_cone_enabled
+class TrackSet(object):
+    """All tracks of a category in flat arrays, drawn with one call per
+    line width.
+
+    Each track is a segment along its direction, from ``start`` to
+    ``speed * (clock - time)`` (clipped to ``max_extent``) metres from its
+    position. Tracks with ``appears`` set are only shown once the clock
+    reaches their time. Neutrinos, particles and reconstructed tracks are
+    added with ``add_neutrinos()``, ``add_particles()`` and ``add_fits()``,
+    which take arrays (or scalars) for all parameters.
+
+    :param color: Default colour of the tracks
+    :param float line_width: Default line width of the tracks
+    :param colourist: Decides whether the Cherenkov cones are drawn
+
+    """
+    FIELDS = (('pos', float, (3, )), ('dir', float, (3, )),
+              ('time', float, ()), ('speed', float, ()), ('start', float, ()),
+              ('max_extent', float, ()), ('appears', bool, ()),
+              ('energy', float, ()), ('color', float, (3, )),
+              ('line_width', float, ()), ('hidden', bool, ()),
+              ('cherenkov_cone', bool, ()), ('axes', float, (3, 3)))
+
+    def __init__(self, color=(0.0, 0.5, 0.7), line_width=1, colourist=None):
+        self.default_color = color
+        self.default_line_width = line_width
         self.colourist = colourist
-        self.hidden = False
+        self._cones = None
+        for name, dtype, shape in self.FIELDS:
+            setattr(self, name, np.zeros((0, ) + shape, dtype=dtype))
+
+    def __len__(self):
+        return len(self.time)
+
+    def extend(self, pos, dir, time, speed, start=0, max_extent=np.inf,
+               appears=True, energy=0, color=None, line_width=None,
+               hidden=False, cherenkov_cone=False):
+        """Add tracks, the times are in ns and the speeds in m/s.
+
+        Positions and directions have the shape (n, 3) or (3, ), all other
+        parameters are broadcast. Returns the indices of the new tracks.
+        """
+        pos = np.atleast_2d(np.asarray(pos, dtype=float))
+        dir = np.broadcast_to(np.atleast_2d(np.asarray(dir, dtype=float)),
+                              pos.shape)
+        n_tracks = len(pos)
+        values = dict(pos=pos,
+                      dir=dir,
+                      time=time,
+                      speed=speed,
+                      start=start,
+                      max_extent=max_extent,
+                      appears=appears,
+                      energy=energy,
+                      color=np.atleast_2d(self.default_color
+                                          if color is None else color),
+                      line_width=(self.default_line_width
+                                  if line_width is None else line_width),
+                      hidden=hidden,
+                      cherenkov_cone=cherenkov_cone,
+                      axes=track_bases(dir))
+        for name, dtype, shape in self.FIELDS:
+            new = np.broadcast_to(np.asarray(values[name], dtype=dtype),
+                                  (n_tracks, ) + shape)
+            setattr(self, name, np.concatenate((getattr(self, name), new)))
+        return np.arange(len(self) - n_tracks, len(self))
+
+    def add_neutrinos(self, pos, dir, time=0, **kwargs):
+        """Coming in from 1 km away, stopping at the vertex at ``time``."""
+        speed = rb_constants.c
+        kwargs.setdefault('color', (1.0, 0.0, 0.0))
+        kwargs.setdefault('line_width', 3)
+        return self.extend(pos, dir, time, speed,
+                           start=-1000 - speed * np.asarray(time) * 1e-9,
+                           max_extent=0, appears=False, **kwargs)
+
+    def add_particles(self, pos, dir, time, speed=rb_constants.c, length=0,
+                      **kwargs):
+        """Starting at ``time``, limited to ``length`` if it is not 0."""
+        length = np.abs(length)
+        return self.extend(pos, dir, time, speed,
+                           start=-speed * np.asarray(time) * 1e-9,
+                           max_extent=np.where(length > 0, length, np.inf),
+                           **kwargs)
+
+    def add_fits(self, pos, dir, time, speed=rb_constants.c, **kwargs):
+        """Reconstructed tracks, growing from their positions at ``time``."""
+        kwargs.setdefault('color', (1.0, 1.0, 0.6))
+        kwargs.setdefault('line_width', 2)
+        return self.extend(pos, dir, time, speed, **kwargs)
+
+    def segments(self, time):
+        """Start and end points of the visible tracks at the clock time [ns].
+
+        Returns ``(indices, starts, ends)``.
+        """
+        visible = ~self.hidden & (~self.appears | (time > self.time))
+        indices = np.flatnonzero(visible)
+        extent = np.minimum(self.speed[indices] *
+                            (time - self.time[indices]) * 1e-9,
+                            self.max_extent[indices])
+        pos = self.pos[indices]
+        dir = self.dir[indices]
+        starts = pos + dir * self.start[indices, np.newaxis]
+        ends = pos + dir * extent[:, np.newaxis]
+        return indices, starts, ends
+
+    def vertices(self, time):
+        """Interleaved line vertices and colours, sorted by line width.
+
+        Returns ``(vertices, colours, groups)`` where ``groups`` is a list
+        of ``(line_width, first_vertex, n_vertices)``.
+        """
+        indices, starts, ends = self.segments(time)
+        widths = self.line_width[indices]
+        order = np.argsort(widths, kind='stable')
+        indices, widths = indices[order], widths[order]
+        n_tracks = len(indices)
+        vertices = np.empty((n_tracks, 2, 3), dtype=np.float32)
+        vertices[:, 0] = starts[order]
+        vertices[:, 1] = ends[order]
+        colours = np.repeat(self.color[indices], 2, axis=0).astype(np.float32)
+        groups = []
+        if n_tracks:
+            boundaries = np.flatnonzero(np.diff(widths)) + 1
+            firsts = np.concatenate(([0], boundaries))
+            lasts = np.concatenate((boundaries, [n_tracks]))
+            groups = [(float(widths[first]), int(2 * first),
+                       int(2 * (last - first)))
+                      for first, last in zip(firsts, lasts)]
+        return vertices.reshape(-1, 3), colours, groups
 
     def draw(self, time, line_width=None):
-        if self.hidden:
-            return
-        time = time * 1e-9
-        if time <= self.time:
+        vertices, colours, groups = self.vertices(time)
+        if len(vertices) == 0:
             return
-
-        pos_start = self.pos + (self.speed * (-self.time) * self.dir)
-        path = (self.speed * (time - self.time) * self.dir)
-        if self.length:
-            max_path = self.length * self.dir
-            if np.linalg.norm(max_path) <= np.linalg.norm(path):
-                path = max_path
-        pos_end = self.pos + path
-
-        glPushMatrix()
-        if line_width:
-            glLineWidth(line_width)
-        else:
-            glLineWidth(self.line_width)
-        glColor3f(*self.color)
-        glBegin(GL_LINES)
-        glVertex3f(*pos_start)
-        glVertex3f(*pos_end)
-        glEnd()
-        glPopMatrix()
-
-        if self.cherenkov_cone_enabled and \
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        try:
+            glVertexPointer(3, GL_FLOAT, 0, vertices)
+            glColorPointer(3, GL_FLOAT, 0, colours)
+            for width, first, count in groups:
+                glLineWidth(line_width or width)
+                glDrawArrays(GL_LINES, first, count)
+        finally:
+            glDisableClientState(GL_COLOR_ARRAY)
+            glDisableClientState(GL_VERTEX_ARRAY)
+
+        if self.colourist is not None and \
                 self.colourist.cherenkov_cone_enabled:
-
-            height = np.linalg.norm(pos_end - pos_start)
-            position = pos_end - self.dir * height
-
-            glEnable(GL_LIGHTING)
-            glEnable(GL_DEPTH_TEST)
-            glShadeModel(GL_FLAT)
-            glColor4f(0.0, 0.0, 0.8, 0.3)
-
-            glPushMatrix()
-            glTranslated(*position)
-            glPushMatrix()
-
-            glMultMatrixf(transform(self.dir))
-
-            glutSolidCone(0.6691 * height, height, 128, 64)
-            glPopMatrix()
-            glPopMatrix()
-
-            glDisable(GL_LIGHTING)
-
-
-class ParticleFit(object):
-    def __init__(self,
-                 x,
-                 y,
-                 z,
-                 dx,
-                 dy,
-                 dz,
-                 speed,
-                 ts,
-                 te,
-                 color=(1.0, 1.0, 0.6),
-                 line_width=2):
-        self.x = x
-        self.y = y
-        self.z = z
-        self.dx = dx
-        self.dy = dy
-        self.dz = dz
-        self.pos = Vec3(x, y, z)
-        self.dir = Vec3(dx, dy, dz)
-        self.speed = speed
-        self.ts = ts
-        self.te = te
-        self.color = color
-        self.line_width = line_width
-        self.hidden = False
-
-    def draw(self, time, line_width=None):
-        if self.hidden:
+            self.draw_cherenkov_cones(time)
+
+    def cones(self, time):
+        """Base positions, axes and heights of the visible Cherenkov cones.
+
+        The cones span the visible part of their tracks, with the apex at
+        the current end point.
+        """
+        indices, starts, ends = self.segments(time)
+        with_cone = self.cherenkov_cone[indices]
+        indices = indices[with_cone]
+        starts, ends = starts[with_cone], ends[with_cone]
+        heights = np.linalg.norm(ends - starts, axis=1)
+        bases = ends - self.dir[indices] * heights[:, np.newaxis]
+        return bases, self.axes[indices], heights
+
+    def draw_cherenkov_cones(self, time):
+        bases, axes, heights = self.cones(time)
+        if len(heights) == 0:
             return
-        if time <= self.ts:
-            return
-        time = time * 1e-9
-
-        pos_start = self.pos
-        path = (self.speed * (time - self.ts * 1e-9) * self.dir)
-        #max_end = self.pos + (self.speed * self.te * self.dir)
-        #if not int(self.te) == 0 and time > self.te:
-        #    pos_end = max_end
-        #else:
-        #    pos_end = self.pos + path
-        pos_end = self.pos + path
-
-        glPushMatrix()
-        if line_width:
-            glLineWidth(line_width)
-        else:
-            glLineWidth(self.line_width)
-        glColor3f(*self.color)
-        glBegin(GL_LINES)
-        glVertex3f(*pos_start)
-        glVertex3f(*pos_end)
-        glEnd()
-        glPopMatrix()
-
-
-class Hit(object):
-    def __init__(self,
-                 x,
-                 y,
-                 z,
-                 time,
-                 pmt_id,
-                 hit_id,
-                 tot=10,
-                 replaces_hits=None):
-        self.x = x
-        self.y = y
-        self.z = z
-        self.time = time
-        self.tot = tot
-        self.pmt_id = pmt_id
-        self.hidden = False
-        self.t_cherenkov = None
-        self.replaces_hits = replaces_hits
-
-    def _hide_replaced_hits(self):
-        if self.replaces_hits:
-            for hit in self.replaces_hits:
-                hit.hidden = True
-
-    def _show_replaced_hits(self):
-        if self.replaces_hits:
-            for hit in self.replaces_hits:
-                hit.hidden = False
-
-    def draw(self, time, spectrum):
-        if self.hidden:
-            return
-        if time < self.time:
-            self._show_replaced_hits()
-            return
-
-        self._hide_replaced_hits()
-
-        #color = (1.0, 1.0-self.time/2000.0, self.time/2000.0)
-        color = spectrum(self.time, self)
-        glPushMatrix()
-        glTranslated(self.x, self.y, self.z)
-
-        glColor3f(*color)
-        #glEnable(GL_COLOR_MATERIAL)
-        #glColorMaterial(GL_FRONT, GL_DIFFUSE)
-        glutSolidSphere(int(1 + np.sqrt(self.tot) * 1.5), 16, 16)
-        #glDisable(GL_COLOR_MATERIAL)
-
-        glPopMatrix()
+        if self._cones is None:
+            from .cones import ConeRenderer
+            self._cones = ConeRenderer()
+        glEnable(GL_DEPTH_TEST)
+        self._cones.draw(bases, axes, heights)
 
 
 def normalize(v):
@@ -269,7 +200,7 @@ def normalize(v):
 
 def transform(v):
     bz = normalize(v)
-    if (abs(v[2]) < abs(v[0])) and (abs(v[2]) < abs(v[1])):
+    if (abs(v[2]) <= abs(v[0])) and (abs(v[2]) <= abs(v[1])):
         by = normalize(np.array([v[1], -v[0], 0]))
     else:
         by = normalize(np.array([v[2], 0, -v[0]]))
@@ -282,3 +213,70 @@ def transform(v):
         dtype=np.float32)
 
     return R.T
+
+
+def track_bases(directions):
+    """Orthonormal bases with the z axis along each direction.
+
+    The vectorised version of ``transform()``, returns an array with shape
+    (n, 3, 3) with the x, y and z axes as columns.
+    """
+    v = np.atleast_2d(np.asarray(directions, dtype=float))
+
+    def normalize_rows(vectors):
+        norms = np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+        return np.where(norms > 1.0e-8, vectors / np.maximum(norms, 1e-300),
+                        vectors)
+
+    zeros = np.zeros(len(v))
+    z_is_smallest = (np.abs(v[:, 2]) <= np.abs(v[:, 0])) & \
+                    (np.abs(v[:, 2]) <= np.abs(v[:, 1]))
+    by = np.where(z_is_smallest[:, np.newaxis],
+                  np.column_stack((v[:, 1], -v[:, 0], zeros)),
+                  np.column_stack((v[:, 2], zeros, -v[:, 0])))
+    bz = normalize_rows(v)
+    by = normalize_rows(by)
+    bx = np.cross(by, bz)
+    return np.stack((bx, by, bz), axis=2)
+
+
+def cherenkov_times(pmt_pos, track_pos, track_dir, track_time=0):
+    """Expected arrival times [ns] of Cherenkov light from a muon track.
+
+    :param pmt_pos: Array with shape (N, 3) of PMT positions
+    :param track_pos: Position of the track at ``track_time``
+    :param track_dir: Direction of the track
+    :param float track_time: Time [ns] when the muon passes ``track_pos``
+
+    """
+    v = np.atleast_2d(pmt_pos) - np.asarray(track_pos, dtype=float)
+    direction = normalize(np.asarray(track_dir, dtype=float))
+    l = v.dot(direction)
+    k = np.sqrt(np.maximum(np.sum(v * v, axis=1) - l**2, 0))
+    theta = rb_constants.theta_cherenkov_water_km3net
+    a_1 = k / np.tan(theta)
+    a_2 = k / np.sin(theta)
+    t_c = (l - a_1) / rb_constants.c + a_2 / rb_constants.c_water_km3net
+    return t_c * 1e9 + track_time
+
+
+def point_source_times(pmt_pos, vertex_pos, vertex_time=0):
+    """Expected arrival times [ns] of light from a point-like cascade."""
+    v = np.atleast_2d(pmt_pos) - np.asarray(vertex_pos, dtype=float)
+    distance = np.sqrt(np.sum(v * v, axis=1))
+    return distance / rb_constants.c_water_antares * 1e9 + vertex_time
+
+
+def time_residuals(hit_times, pmt_pos, pos, dir=None, time=0):
+    """Expected arrival times and time residuals [ns] for all hits at once.
+
+    A track hypothesis is used if a direction is given, otherwise the
+    light is assumed to originate from a point source at ``pos``.
+
+    Returns a tuple ``(expected_times, residuals)``.
+    """
+    if dir is None:
+        expected_times = point_source_times(pmt_pos, pos, time)
+    else:
+        expected_times = cherenkov_times(pmt_pos, pos, dir, time)
+    return expected_times, np.asarray(hit_times) - expected_times
@@ -0,0 +1,182 @@
+# coding=utf-8
+# Filename: picking.py
+"""
+Picking of hits and DOMs with the mouse, without an OpenGL selection pass.
+
+The mouse position is unprojected to a ray with the camera parameters, the
+same ones which ``Camera.look()`` and the perspective projection use. The
+ray is intersected with the points of a uniform grid: the points are sorted
+by their cell once, so looking up a cell is a binary search and a pick only
+tests the points in the cells along the ray. The grids are built once per
+detector (PMTs and DOMs) and once per event (the uploaded hits).
+
+The region-of-interest selections (``query_ball()`` and ``query_box()``)
+use the same grids.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import numpy as np
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+DOM_PICK_RADIUS = 5  # m
+ROI_RADIUS = 50  # m
+
+
+def _normalised(vector):
+    vector = np.asarray(vector, dtype=np.float64)
+    return vector / np.linalg.norm(vector)
+
+
+def mouse_ray(camera, x, y, width, height, fov=45.0):
+    """The origin and the direction of the ray through a window position.
+
+    :param camera: A ``rainbowalga.tools.Camera``
+    :param x, y: Window coordinates (GLUT, origin at the top left)
+    :param float fov: Vertical field of view of the projection in degrees
+
+    """
+    eye = np.array(camera.pos, dtype=np.float64)
+    forward = _normalised(np.array(camera.target, dtype=np.float64) - eye)
+    side = _normalised(np.cross(forward, np.array(camera.up, dtype=float)))
+    up = np.cross(side, forward)
+    tan_half_fov = np.tan(np.radians(fov) / 2)
+    ndc_x = 2 * (x + 0.5) / width - 1
+    ndc_y = 1 - 2 * (y + 0.5) / height
+    direction = forward + tan_half_fov * (ndc_x * width / height * side +
+                                          ndc_y * up)
+    return eye, _normalised(direction)
+
+
+class UniformGrid(object):
+    """Points sorted into the cells of a uniform grid.
+
+    :param points: Array with shape (n, 3)
+    :param float cell_size: The edge length of the cells, by default about
+                            one point per cell for evenly spread points
+
+    """
+
+    def __init__(self, points, cell_size=None):
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        n_points = len(self.points)
+        if n_points:
+            self.lower = self.points.min(axis=0)
+            extent = self.points.max(axis=0) - self.lower
+        else:
+            self.lower = extent = np.zeros(3)
+        if cell_size is None:
+            cell_size = max(extent.max(), 1) / max(n_points, 1)**(1 / 3)
+        self.cell_size = cell_size
+        self.shape = np.floor(extent / cell_size).astype(np.int64) + 1
+        keys = self._keys(self._cells(self.points))
+        self.order = np.argsort(keys, kind='stable')
+        self.cell_keys, self.cell_starts = np.unique(keys[self.order],
+                                                     return_index=True)
+        self.cell_ends = np.append(self.cell_starts[1:], n_points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cells(self, points):
+        return np.floor((points - self.lower) / self.cell_size).astype(
+            np.int64)
+
+    def _keys(self, cells):
+        return (cells[:, 0] * self.shape[1] + cells[:, 1]) * self.shape[2] \
+            + cells[:, 2]
+
+    def _points_in_cells(self, cells):
+        """The indices of the points in the given cells."""
+        inside = np.all((cells >= 0) & (cells < self.shape), axis=1)
+        keys = np.unique(self._keys(cells[inside]))
+        i = np.searchsorted(self.cell_keys, keys)
+        found = i < len(self.cell_keys)
+        i, keys = i[found], keys[found]
+        i = i[self.cell_keys[i] == keys]
+        if len(i) == 0:
+            return np.zeros(0, dtype=np.intp)
+        return np.concatenate([
+            self.order[start:end]
+            for start, end in zip(self.cell_starts[i], self.cell_ends[i])
+        ])
+
+    def query_box(self, lower, upper):
+        """The indices of the points inside the axis-aligned box."""
+        lower = np.asarray(lower, dtype=np.float64)
+        upper = np.asarray(upper, dtype=np.float64)
+        first = np.clip(self._cells(lower[np.newaxis])[0], 0, self.shape - 1)
+        last = np.clip(self._cells(upper[np.newaxis])[0], 0, self.shape - 1)
+        n_cells = np.prod(last - first + 1)
+        if n_cells > len(self.points):
+            candidates = np.arange(len(self.points))
+        else:
+            axes = [np.arange(a, b + 1) for a, b in zip(first, last)]
+            cells = np.stack(np.meshgrid(*axes, indexing='ij'),
+                             axis=-1).reshape(-1, 3)
+            candidates = self._points_in_cells(cells)
+        points = self.points[candidates]
+        inside = np.all((points >= lower) & (points <= upper), axis=1)
+        return np.sort(candidates[inside])
+
+    def query_ball(self, center, radius):
+        """The indices of the points within the radius of the center."""
+        center = np.asarray(center, dtype=np.float64)
+        candidates = self.query_box(center - radius, center + radius)
+        distances = np.linalg.norm(self.points[candidates] - center, axis=1)
+        return candidates[distances <= radius]
+
+    def pick(self, origin, direction, radius, mask=None):
+        """The index of the first point along the ray which is closer to the
+        ray than its radius, None if there is none.
+
+        :param direction: Normalised direction of the ray
+        :param radius: The pick radius, a scalar or one per point
+        :param mask: Only points where the mask is True are picked
+
+        """
+        if len(self.points) == 0:
+            return None
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        radius = np.broadcast_to(np.asarray(radius, dtype=np.float64),
+                                 (len(self.points), ))
+        reach = radius.max()
+
+        # clip the ray to the bounding box of the grid (slab method)
+        lower = self.lower - reach
+        upper = self.lower + self.shape * self.cell_size + reach
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_lower = (lower - origin) / direction
+            t_upper = (upper - origin) / direction
+        t_lower = np.where(direction == 0, -np.inf, t_lower)
+        t_upper = np.where(direction == 0, np.inf, t_upper)
+        outside = (direction == 0) & ((origin < lower) | (origin > upper))
+        t_enter = max(np.max(np.minimum(t_lower, t_upper)), 0)
+        t_exit = np.min(np.maximum(t_lower, t_upper))
+        if np.any(outside) or t_exit < t_enter:
+            return None
+
+        # the cells along the ray and their neighbours within reach
+        step = self.cell_size / 2
+        ts = np.arange(t_enter, t_exit + step, step)
+        cells = np.unique(self._cells(origin + ts[:, np.newaxis] * direction),
+                          axis=0)
+        n = int(np.ceil(reach / self.cell_size)) + 1
+        offsets = np.stack(np.meshgrid(*[np.arange(-n, n + 1)] * 3,
+                                       indexing='ij'), axis=-1).reshape(-1, 3)
+        cells = (cells[:, np.newaxis] + offsets).reshape(-1, 3)
+        candidates = self._points_in_cells(cells)
+        if mask is not None:
+            candidates = candidates[np.asarray(mask)[candidates]]
+
+        vectors = self.points[candidates] - origin
+        along = vectors.dot(direction)
+        off = np.linalg.norm(vectors - along[:, np.newaxis] * direction,
+                             axis=1)
+        hit = (along > 0) & (off <= radius[candidates])
+        if not np.any(hit):
+            return None
+        return int(candidates[hit][np.argmin(along[hit])])
@@ -0,0 +1,213 @@
+# coding=utf-8
+# Filename: prefetch.py
+"""
+Background preparation of events for a lag-free navigation.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import numpy as np
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+
+def nbytes(value):
+    """Memory footprint of a cached value (arrays and tuples of arrays)."""
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(v) for v in value)
+    return getattr(value, 'nbytes', 0)
+
+
+class LRUCache(object):
+    """A thread-safe least-recently-used cache bounded by its size in bytes.
+
+    :param int max_bytes: Maximum summed size of the cached values
+
+    """
+
+    def __init__(self, max_bytes=512 * 1024**2):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        """Return the cached value and record a cache hit or miss."""
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._items[key] = value
+            self.hits += 1
+            return value
+
+    def peek(self, key, default=None):
+        """Return the cached value without touching the statistics."""
+        with self._lock:
+            return self._items.get(key, default)
+
+    def put(self, key, value):
+        size = nbytes(value)
+        with self._lock:
+            if key in self._items:
+                self.nbytes -= nbytes(self._items.pop(key))
+            self._items[key] = value
+            self.nbytes += size
+            while self.nbytes > self.max_bytes and len(self._items) > 1:
+                _, evicted = self._items.popitem(last=False)
+                self.nbytes -= nbytes(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    @property
+    def hit_rate(self):
+        try:
+            return self.hits / (self.hits + self.misses)
+        except ZeroDivisionError:
+            return 0
+
+    def __str__(self):
+        return "{0} events, {1:.1f} MB, {2:.0%} hit rate".format(
+            len(self), self.nbytes / 1024**2, self.hit_rate)
+
+
+class EventPrefetcher(object):
+    """Prepares the events around the current one on a pool of workers.
+
+    :param loader: Callable which returns the prepared data for an index
+    :param int n_events: Number of available events
+    :param int depth: Number of events to prefetch in each direction
+    :param int workers: Number of worker threads
+    :param int max_bytes: Size limit of the cache
+
+    """
+
+    def __init__(self, loader, n_events, depth=3, workers=2,
+                 max_bytes=512 * 1024**2):
+        self.loader = loader
+        self.n_events = n_events
+        self.depth = depth
+        self.selection = None
+        self.cache = LRUCache(max_bytes)
+        self._pending = {}
+        # the requested event is kept until peek() collects it, even if the
+        # prefetched neighbours push it out of the cache meanwhile
+        self._requested = None
+        self._ready = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def __contains__(self, index):
+        return 0 <= index < self.n_events
+
+    def request(self, index):
+        """Make sure the event gets prepared and is kept for ``peek()``,
+        returns True if already ready."""
+        value = self.cache.get(index)
+        with self._lock:
+            self._requested = index
+            self._ready = None if value is None else (index, value)
+        if value is not None:
+            return True
+        self._submit(index)
+        return False
+
+    def prefetch(self, index):
+        """Schedule the neighbours of the given event, nearest first."""
+        for neighbour in self.neighbours(index):
+            if neighbour in self and neighbour not in self.cache:
+                self._submit(neighbour)
+
+    def neighbours(self, index):
+        """The events around the given one, nearest first.
+
+        If ``selection`` (a sorted array of event indices) is set, only the
+        selected events are considered.
+        """
+        if self.selection is None:
+            for distance in range(1, self.depth + 1):
+                yield index + distance
+                yield index - distance
+            return
+        after = np.searchsorted(self.selection, index, side='right')
+        before = np.searchsorted(self.selection, index, side='left') - 1
+        for distance in range(self.depth):
+            if after + distance < len(self.selection):
+                yield int(self.selection[after + distance])
+            if before - distance >= 0:
+                yield int(self.selection[before - distance])
+
+    def peek(self, index):
+        """Return the prepared data or None if it is not ready yet.
+
+        Exceptions raised by the loader are re-raised here.
+        """
+        with self._lock:
+            if self._ready is not None and self._ready[0] == index:
+                value = self._ready[1]
+                self._requested = self._ready = None
+                return value
+        value = self.cache.peek(index)
+        if value is not None:
+            return value
+        with self._lock:
+            future = self._pending.get(index)
+        if future is not None and future.done():
+            with self._lock:
+                self._pending.pop(index, None)
+            return future.result()
+
+    def result(self, index):
+        """Block until the event is prepared and return it."""
+        if index not in self:
+            raise IndexError("Event index {0} out of range".format(index))
+        value = self.cache.get(index)
+        if value is not None:
+            return value
+        return self._submit(index).result()
+
+    def is_pending(self, index):
+        with self._lock:
+            return index in self._pending
+
+    def _submit(self, index):
+        if index not in self:
+            raise IndexError("Event index {0} out of range".format(index))
+        with self._lock:
+            future = self._pending.get(index)
+            if future is None:
+                future = self._executor.submit(self._load, index)
+                self._pending[index] = future
+        return future
+
+    def _load(self, index):
+        value = self.loader(index)
+        self.cache.put(index, value)
+        with self._lock:
+            self._pending.pop(index, None)
+            if index == self._requested and self._ready is None:
+                self._ready = (index, value)
+        log.debug("Prefetched event {0} ({1})".format(index, self.cache))
+        return value
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,228 @@
+# coding=utf-8
+# Filename: profiling.py
+"""
+Per-stage timing of the render loop and of the startup.
+
+Each stage of a frame is timed on the CPU. The draw calls only queue work
+for the GPU, so with ``sync`` enabled the profiler calls ``glFinish()`` at
+the end of each stage. The stage times then include the GPU work: a stage
+which only gets slow with ``sync`` is GPU-bound, one which is slow either
+way is CPU-bound in Python.
+
+The startup profiler records the wall-clock time of each startup stage up
+to the first frame, including the stages running on a background thread.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import csv
+import json
+import threading
+import time
+
+import numpy as np
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+PERCENTILES = (50, 95, 99)
+FRAME = 'frame'
+
+
+class FrameProfiler(object):
+    """Collects the durations of the render stages in rolling windows.
+
+    :param int window: Number of frames to keep per stage
+    :param finish: Callable which blocks until the GPU is done (glFinish)
+
+    """
+
+    def __init__(self, window=300, finish=None):
+        self.window = window
+        self.finish = finish
+        self.sync = False
+        self.n_frames = 0
+        self._samples = OrderedDict()
+        self._frame_start = None
+
+    def _record(self, name, duration):
+        try:
+            samples = self._samples[name]
+        except KeyError:
+            samples = self._samples[name] = deque(maxlen=self.window)
+        samples.append(duration)
+
+    def start_frame(self):
+        self._frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if self._frame_start is None:
+            return
+        self._record(FRAME, time.perf_counter() - self._frame_start)
+        self._frame_start = None
+        self.n_frames += 1
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as the given stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.sync and self.finish is not None:
+                self.finish()
+            self._record(name, time.perf_counter() - start)
+
+    @property
+    def stages(self):
+        """The names of the recorded stages, in the order of appearance."""
+        return [name for name in self._samples if name != FRAME]
+
+    def samples(self, name):
+        """The recorded durations of a stage in seconds."""
+        return np.array(self._samples.get(name, ()))
+
+    def histogram(self, name, bins=20):
+        """Histogram of the durations (in ms) of a stage."""
+        return np.histogram(self.samples(name) * 1000, bins=bins)
+
+    def statistics(self, name):
+        """Mean and percentiles of a stage in milliseconds."""
+        samples = self.samples(name) * 1000
+        stats = OrderedDict([('n', len(samples))])
+        if len(samples) == 0:
+            return stats
+        stats['mean'] = float(np.mean(samples))
+        values = np.percentile(samples, PERCENTILES)
+        for percentile, value in zip(PERCENTILES, values):
+            stats['p{0}'.format(percentile)] = float(value)
+        stats['max'] = float(np.max(samples))
+        return stats
+
+    def summary(self):
+        """The statistics of all stages and of the whole frame."""
+        summary = OrderedDict()
+        for name in self.stages + [FRAME]:
+            if name in self._samples:
+                summary[name] = self.statistics(name)
+        return summary
+
+    def reset(self):
+        self._samples.clear()
+        self._frame_start = None
+        self.n_frames = 0
+
+    def to_json(self, filename):
+        with open(filename, 'w') as fobj:
+            json.dump({
+                'sync': self.sync,
+                'window': self.window,
+                'stages': self.summary()
+            }, fobj, indent=2)
+
+    def to_csv(self, filename):
+        columns = ['stage', 'n', 'mean'] + \
+                  ['p{0}'.format(p) for p in PERCENTILES] + ['max']
+        with open(filename, 'w') as fobj:
+            writer = csv.writer(fobj)
+            writer.writerow(columns)
+            for name, stats in self.summary().items():
+                writer.writerow([name] +
+                                [stats.get(c, '') for c in columns[1:]])
+
+    def dump(self, prefix='rainbowalga_profile'):
+        """Write the summary to ``prefix``.json and ``prefix``.csv"""
+        self.to_json(prefix + '.json')
+        self.to_csv(prefix + '.csv')
+        log.info("Profile written to '{0}.json' and '{0}.csv'".format(prefix))
+        return prefix + '.json', prefix + '.csv'
+
+    def overlay_text(self):
+        """A table of the stage timings for the on-screen overlay."""
+        lines = [
+            "{0:<10}{1:>7}{2:>7}{3:>7} ms{4}".format(
+                'stage', 'p50', 'p95', 'p99',
+                '  (GPU sync)' if self.sync else '')
+        ]
+        for name, stats in self.summary().items():
+            if stats['n'] == 0:
+                continue
+            lines.append("{0:<10}{1:>7.2f}{2:>7.2f}{3:>7.2f}".format(
+                name, stats['p50'], stats['p95'], stats['p99']))
+        return '\n'.join(lines)
+
+
+class StartupProfiler(object):
+    """Wall-clock times of the startup stages up to the first frame.
+
+    The stages may overlap, e.g. the detector is loaded on a background
+    thread while the OpenGL context is created on the main thread.
+
+    :param float start: ``time.perf_counter()`` at the beginning of the
+                        startup, e.g. before the imports (default: now)
+
+    """
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.first_frame = None
+        self._stages = []
+        self._lock = threading.Lock()
+
+    def record(self, name, start, end):
+        """Record a stage from its ``time.perf_counter()`` values."""
+        if threading.current_thread() is threading.main_thread():
+            thread = 'main'
+        else:
+            thread = 'background'
+        with self._lock:
+            self._stages.append((name, thread, start, end))
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as the given stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def end(self):
+        """Mark the first frame as done, returns False after the first
+        call."""
+        if self.first_frame is not None:
+            return False
+        self.first_frame = time.perf_counter()
+        return True
+
+    @property
+    def stages(self):
+        """(name, thread, start, duration) of the stages in milliseconds
+        since the start, sorted by their start."""
+        with self._lock:
+            stages = sorted(self._stages, key=lambda stage: stage[2])
+        return [(name, thread, (start - self.start) * 1000,
+                 (end - start) * 1000)
+                for name, thread, start, end in stages]
+
+    @property
+    def time_to_first_frame(self):
+        """Milliseconds from the start to the end of the first frame."""
+        if self.first_frame is None:
+            return None
+        return (self.first_frame - self.start) * 1000
+
+    def report(self):
+        """A table of the startup stages."""
+        lines = ["{0:<24}{1:>8}{2:>10}  {3}".format('Startup stage [ms]',
+                                                    'start', 'duration',
+                                                    'thread')]
+        for name, thread, start, duration in self.stages:
+            lines.append("{0:<24}{1:>8.0f}{2:>10.0f}  {3}".format(
+                name, start, duration, thread))
+        if self.first_frame is not None:
+            lines.append("{0:<24}{1:>8.0f}".format(
+                'first frame done', self.time_to_first_frame))
+        return '\n'.join(lines)
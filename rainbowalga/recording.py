@@ -0,0 +1,333 @@
+# coding=utf-8
+# Filename: recording.py
+"""
+Asynchronous screenshots and frame recording.
+
+The frames are read back through two alternating pixel buffer objects, so
+``glReadPixels`` returns immediately and the pixels of the previous frame
+are mapped while the GPU copies the current one. The frames are handed to
+a writer thread over a bounded queue, which does the flipping, colour
+conversion and encoding. If the writer cannot keep up, frames are dropped
+(and counted) instead of slowing down the render loop.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import ctypes
+import shlex
+import subprocess
+import threading
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+import numpy as np
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+FRAME_PATTERN = "Frame_{0:05d}.jpg"
+
+
+def rgb_to_yuv444(frame):
+    """Convert an RGB frame to limited range BT.601 Y, Cb and Cr planes."""
+    rgb = frame.astype(np.float32)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    y = 16 + 0.257 * r + 0.504 * g + 0.098 * b
+    cb = 128 - 0.148 * r - 0.291 * g + 0.439 * b
+    cr = 128 + 0.439 * r - 0.368 * g - 0.071 * b
+    return np.stack((y, cb, cr)).round().clip(0, 255).astype(np.uint8)
+
+
+class ImageSequenceWriter(object):
+    """Writes each frame as an image file, the format is given by the suffix.
+
+    :param str pattern: File name pattern, formatted with the frame number
+
+    """
+
+    def __init__(self, pattern=FRAME_PATTERN):
+        self.pattern = pattern
+        self.n_frames = 0
+
+    def write(self, frame, filename=None):
+        from PIL import Image
+        self.n_frames += 1
+        if filename is None:
+            filename = self.pattern.format(self.n_frames)
+        Image.fromarray(frame).save(filename)
+        return filename
+
+    def close(self):
+        pass
+
+
+class RawWriter(object):
+    """Writes the frames as raw rgb24 to a binary stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.n_frames = 0
+
+    def write(self, frame, filename=None):
+        self.stream.write(np.ascontiguousarray(frame).tobytes())
+        self.n_frames += 1
+
+    def close(self):
+        self.stream.flush()
+
+
+class Y4MWriter(object):
+    """Writes the frames as a YUV4MPEG2 (4:4:4) stream.
+
+    The header is written with the first frame, so the frame size does not
+    have to be known in advance.
+    """
+
+    def __init__(self, stream, fps=30):
+        self.stream = stream
+        self.fps = fps
+        self.n_frames = 0
+        self.shape = None
+
+    def write(self, frame, filename=None):
+        if self.shape is None:
+            self.shape = frame.shape
+            height, width = frame.shape[:2]
+            self.stream.write("YUV4MPEG2 W{0} H{1} F{2}:1 Ip A1:1 C444\n"
+                              .format(width, height, self.fps)
+                              .encode('ascii'))
+        elif frame.shape != self.shape:
+            raise ValueError("Frame size changed from {0} to {1}".format(
+                self.shape, frame.shape))
+        self.stream.write(b"FRAME\n")
+        self.stream.write(rgb_to_yuv444(frame).tobytes())
+        self.n_frames += 1
+
+    def close(self):
+        self.stream.flush()
+
+
+class PipeWriter(object):
+    """Pipes the frames to a local encoder, e.g. ffmpeg.
+
+    :param command: Command line (string or list) reading from stdin
+    :param str fmt: Stream format, 'y4m' or 'raw' (rgb24)
+
+    """
+
+    def __init__(self, command, fmt='y4m', fps=30):
+        if isinstance(command, str):
+            command = shlex.split(command)
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        if fmt == 'y4m':
+            self.writer = Y4MWriter(self.process.stdin, fps=fps)
+        elif fmt == 'raw':
+            self.writer = RawWriter(self.process.stdin)
+        else:
+            raise ValueError("Unknown stream format '{0}'".format(fmt))
+
+    @property
+    def n_frames(self):
+        return self.writer.n_frames
+
+    def write(self, frame, filename=None):
+        self.writer.write(frame)
+
+    def close(self):
+        try:
+            self.writer.close()
+            self.process.stdin.close()
+        finally:
+            self.process.wait()
+
+
+class ArrayWriter(object):
+    """Keeps the frames in memory as NumPy arrays.
+
+    :param int max_frames: Keep only the most recent frames (default: all)
+
+    """
+
+    def __init__(self, max_frames=None):
+        self.max_frames = max_frames
+        self.frames = []
+        self.n_frames = 0
+
+    def write(self, frame, filename=None):
+        self.frames.append(frame)
+        if self.max_frames is not None and len(self.frames) > self.max_frames:
+            del self.frames[0]
+        self.n_frames += 1
+
+    def close(self):
+        pass
+
+    def as_array(self):
+        """All kept frames as an array with shape (n, height, width, 3)."""
+        return np.array(self.frames)
+
+
+def make_writer(target, fps=30):
+    """Create a writer from a command line target.
+
+    ``|COMMAND`` pipes a Y4M stream to COMMAND, a ``.y4m`` file name writes
+    a Y4M file and everything else is an image file name pattern.
+    """
+    if target.startswith('|'):
+        return PipeWriter(target[1:], fmt='y4m', fps=fps)
+    if target.endswith('.y4m'):
+        return Y4MWriter(open(target, 'wb'), fps=fps)
+    return ImageSequenceWriter(target)
+
+
+class FrameQueue(object):
+    """Hands frames over to a writer running in a background thread.
+
+    The frames are expected bottom-up (as read from OpenGL) and are flipped
+    in the writer thread. ``submit()`` never blocks, if the queue is full
+    the frame is dropped.
+
+    :param writer: An object with ``write(frame, filename)`` and ``close()``
+    :param int max_size: Number of frames which can wait for the writer
+
+    """
+    _STOP = object()
+
+    def __init__(self, writer, max_size=8):
+        self.writer = writer
+        self.n_submitted = 0
+        self.n_written = 0
+        self.n_dropped = 0
+        self.n_failed = 0
+        self._queue = queue.Queue(maxsize=max_size)
+        self._thread = threading.Thread(target=self._run,
+                                        name='rainbowalga-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, frame, filename=None):
+        """Queue a frame, returns False if it had to be dropped."""
+        self.n_submitted += 1
+        try:
+            self._queue.put_nowait((frame, filename))
+        except queue.Full:
+            self.n_dropped += 1
+            return False
+        return True
+
+    def close(self, wait=True):
+        """Write the queued frames and close the writer."""
+        self._queue.put(self._STOP)
+        if wait:
+            self._thread.join()
+
+    @property
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is self._STOP:
+                    break
+                frame, filename = item
+                try:
+                    self.writer.write(np.flipud(frame), filename)
+                except Exception as e:
+                    self.n_failed += 1
+                    log.error("Could not write frame: {0}".format(e))
+                else:
+                    self.n_written += 1
+        finally:
+            self.writer.close()
+            log.info("Writer closed: {0}".format(self))
+
+    def __str__(self):
+        return "{0} frames written, {1} dropped".format(
+            self.n_written, self.n_dropped)
+
+
+def read_pixels(width, height):
+    """Read the RGB pixels of the current frame buffer (blocking)."""
+    from OpenGL.GL import (glPixelStorei, glReadPixels, GL_PACK_ALIGNMENT,
+                           GL_RGB, GL_UNSIGNED_BYTE)
+    glPixelStorei(GL_PACK_ALIGNMENT, 1)
+    data = glReadPixels(0, 0, width, height, GL_RGB, GL_UNSIGNED_BYTE)
+    return np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+
+
+class PixelBufferReader(object):
+    """Reads the frame buffer asynchronously through two pixel buffers.
+
+    Each ``read()`` starts the transfer of the current frame and returns
+    the previous one (None for the first frame). Needs an OpenGL context.
+    """
+
+    def __init__(self):
+        from OpenGL.GL import glGenBuffers
+        self.buffers = [int(b) for b in glGenBuffers(2)]
+        self.size = (0, 0)
+        self._index = 0
+        self._pending = None
+
+    def _allocate(self, width, height):
+        from OpenGL.GL import (glBindBuffer, glBufferData,
+                               GL_PIXEL_PACK_BUFFER, GL_STREAM_READ)
+        for buffer in self.buffers:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer)
+            glBufferData(GL_PIXEL_PACK_BUFFER, width * height * 3, None,
+                         GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.size = (width, height)
+        self._pending = None
+
+    def read(self, width, height):
+        from OpenGL.GL import (glBindBuffer, glPixelStorei,
+                               GL_PACK_ALIGNMENT, GL_PIXEL_PACK_BUFFER,
+                               GL_RGB, GL_UNSIGNED_BYTE)
+        from OpenGL.raw.GL.VERSION.GL_1_0 import glReadPixels
+        if (width, height) != self.size:
+            self._allocate(width, height)
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.buffers[self._index])
+        glReadPixels(0, 0, width, height, GL_RGB, GL_UNSIGNED_BYTE,
+                     ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        frame = self.flush()
+        self._pending = self._index
+        self._index = 1 - self._index
+        return frame
+
+    def flush(self):
+        """Return the frame still waiting in a pixel buffer, if any."""
+        from OpenGL.GL import (glBindBuffer, glMapBuffer, glUnmapBuffer,
+                               GL_PIXEL_PACK_BUFFER, GL_READ_ONLY)
+        if self._pending is None:
+            return None
+        width, height = self.size
+        n_bytes = width * height * 3
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.buffers[self._pending])
+        self._pending = None
+        try:
+            address = glMapBuffer(GL_PIXEL_PACK_BUFFER, GL_READ_ONLY)
+            if not address:
+                log.warning("Could not map the pixel buffer")
+                return None
+            try:
+                data = (ctypes.c_ubyte * n_bytes).from_address(address)
+                frame = np.frombuffer(data, dtype=np.uint8).reshape(
+                    height, width, 3).copy()
+            finally:
+                glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        finally:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return frame
+
+    def delete(self):
+        from OpenGL.GL import glDeleteBuffers
+        glDeleteBuffers(2, self.buffers)
+        self.buffers = []
@@ -0,0 +1,284 @@
+# coding=utf-8
+# Filename: scan.py
+"""
+Parallel scan of many online ROOT files for interesting events.
+
+The files are split into chunks of events which are processed on a pool of
+processes. For each chunk the hits are read as flat arrays and the event
+features (hits after the ToT cut, hit DOMs and DUs, triggered hit fraction)
+are calculated with a few NumPy operations. Only the events passing the cut
+are sent back, so the memory usage is bounded by the chunk size and not by
+the size of the files.
+
+The candidates are written to a CSV file which the viewer opens with
+``-c FILE``.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+from collections import namedtuple, OrderedDict
+import csv
+import multiprocessing
+import time
+
+import numpy as np
+
+from rainbowalga.index import apply_cut, parse_cut
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+FEATURES_DTYPE = np.dtype([
+    ('index', '<i8'),
+    ('trigger_counter', '<u8'),
+    ('n_hits', '<u4'),
+    ('n_doms', '<u4'),
+    ('n_dus', '<u4'),
+    ('n_triggered_hits', '<u4'),
+    ('triggered_fraction', '<f8'),
+])
+
+EventChunk = namedtuple(
+    'EventChunk',
+    'start counts dom_id tot n_triggered_hits trigger_counter')
+
+
+def flatten(jagged):
+    """The number of values per event and all values as one flat array."""
+    try:
+        import awkward as ak
+        return (np.asarray(ak.num(jagged), dtype=np.int64),
+                np.asarray(ak.flatten(jagged)))
+    except (ImportError, TypeError, ValueError):  # e.g. awkward0 arrays
+        rows = [np.asarray(row) for row in jagged]
+        counts = np.array([len(row) for row in rows], dtype=np.int64)
+        if not rows:
+            return counts, np.zeros(0)
+        return counts, np.concatenate(rows)
+
+
+class OnlineFile(object):
+    """Reads chunks of events from an online (DAQ) ROOT file."""
+
+    def __init__(self, filename):
+        import km3io
+        self.events = km3io.OnlineReader(filename).events
+
+    def __len__(self):
+        return len(self.events)
+
+    def read(self, start, stop):
+        snapshot_hits = self.events.snapshot_hits
+        counts, dom_id = flatten(snapshot_hits.dom_id[start:stop])
+        _, tot = flatten(snapshot_hits.tot[start:stop])
+        n_triggered_hits, _ = flatten(
+            self.events.triggered_hits.tot[start:stop])
+        trigger_counter = self.events.headers['trigger_counter'][start:stop]
+        return EventChunk(start, counts, dom_id, tot, n_triggered_hits,
+                          np.asarray(trigger_counter))
+
+
+def open_file(filename):
+    """Open an online ROOT file for chunked reading.
+
+    Offline files are refused, the viewer opens the candidates of a scan
+    with the ``OnlineReader``.
+    """
+    import uproot
+    with uproot.open(filename) as fobj:
+        is_offline = 'E' in fobj
+    if is_offline:
+        raise ValueError("'{0}' is an offline file, only online files can "
+                         "be scanned".format(filename))
+    return OnlineFile(filename)
+
+
+def dom_du_lookup(doms):
+    """A function mapping DOM IDs to DU numbers (0 for unknown DOMs)."""
+    order = np.argsort(doms['dom_id'])
+    dom_ids = np.asarray(doms['dom_id'])[order]
+    dus = np.asarray(doms['du'])[order]
+
+    def lookup(dom_id):
+        i = np.clip(np.searchsorted(dom_ids, dom_id), 0, len(dom_ids) - 1)
+        return np.where(dom_ids[i] == dom_id, dus[i], 0)
+
+    return lookup
+
+
+def _n_unique_per_event(event, values, n_events):
+    if len(event) == 0:
+        return np.zeros(n_events, dtype=np.int64)
+    # (event, value) pairs packed into one key, values are 32 bit IDs
+    keys = (event.astype(np.int64) << 32) | \
+        (np.asarray(values, dtype=np.int64) & 0xffffffff)
+    keys.sort()
+    is_new = np.ones(len(keys), dtype=bool)
+    is_new[1:] = keys[1:] != keys[:-1]
+    return np.bincount(keys[is_new] >> 32, minlength=n_events)
+
+
+def event_features(chunk, min_tot=None, dom_du=None):
+    """Calculate the features of all events of a chunk at once.
+
+    The ToT cut is the one of ``RainbowAlga.extract_hits()``, the triggered
+    fraction refers to all snapshot hits.
+    """
+    n_events = len(chunk.counts)
+    event = np.repeat(np.arange(n_events), chunk.counts)
+    dom_id = chunk.dom_id
+    if min_tot:
+        kept = chunk.tot > min_tot
+        event, dom_id = event[kept], dom_id[kept]
+
+    features = np.zeros(n_events, dtype=FEATURES_DTYPE)
+    features['index'] = chunk.start + np.arange(n_events)
+    features['trigger_counter'] = chunk.trigger_counter
+    features['n_hits'] = np.bincount(event, minlength=n_events)
+    features['n_doms'] = _n_unique_per_event(event, dom_id, n_events)
+    if dom_du is not None:
+        du = dom_du(dom_id)
+        known = du > 0
+        features['n_dus'] = _n_unique_per_event(event[known], du[known],
+                                                n_events)
+    features['n_triggered_hits'] = chunk.n_triggered_hits
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = chunk.n_triggered_hits / chunk.counts
+    features['triggered_fraction'] = np.where(chunk.counts > 0, fraction, 0)
+    return features
+
+
+def check_cut(where, detector=None):
+    """Parse the cut on the features, the DUs are only known with a
+    detector."""
+    cuts = parse_cut(where, FEATURES_DTYPE.names)
+    if detector is None and any(column == 'n_dus' for column, _, _ in cuts):
+        raise ValueError("The n_dus cut needs a detector (-d)")
+    return cuts
+
+
+class Scanner(object):
+    """Evaluates the cut on chunks of events, keeps one file open."""
+
+    def __init__(self, where, min_tot=None, detector=None, opener=open_file):
+        check_cut(where, detector)  # fail early
+        self.where = where
+        self.min_tot = min_tot
+        self.opener = opener
+        self.dom_du = None
+        if detector is not None:
+            from rainbowalga.calibration import load_pmt_lookup
+            self.dom_du = dom_du_lookup(load_pmt_lookup(detector).doms)
+        self._filename = None
+        self._file = None
+
+    def open(self, filename):
+        if filename != self._filename:
+            self._file = self.opener(filename)
+            self._filename = filename
+        return self._file
+
+    def scan(self, filename, start, stop):
+        """The features of the events passing the cut."""
+        chunk = self.open(filename).read(start, stop)
+        features = event_features(chunk, self.min_tot, self.dom_du)
+        return features[apply_cut(features, self.where)]
+
+
+def tasks(filenames, chunk_size, opener=open_file):
+    """(filename, start, stop) of all chunks of all files."""
+    for filename in filenames:
+        n_events = len(opener(filename))
+        for start in range(0, n_events, chunk_size):
+            yield filename, start, min(start + chunk_size, n_events)
+
+
+_scanner = None
+
+
+def _init_worker(*args):
+    global _scanner
+    _scanner = Scanner(*args)
+
+
+def _scan_chunk(task):
+    filename, start, stop = task
+    try:
+        return task, _scanner.scan(filename, start, stop)
+    except Exception as e:
+        log.error("Could not scan events {0}:{1} of '{2}': {3}".format(
+            start, stop, filename, e))
+        return task, None
+
+
+def write_candidates(fobj, rows):
+    """Write (filename, features) rows as CSV, returns the number of rows."""
+    writer = csv.writer(fobj)
+    writer.writerow(('filename', ) + FEATURES_DTYPE.names)
+    n_rows = 0
+    for filename, features in rows:
+        for event in features:
+            writer.writerow((filename, ) + event.tolist())
+            n_rows += 1
+        fobj.flush()
+    return n_rows
+
+
+def read_candidates(filename):
+    """The candidate event indices per file, in the order of the list."""
+    candidates = OrderedDict()
+    with open(filename) as fobj:
+        for row in csv.DictReader(fobj):
+            candidates.setdefault(row['filename'], []).append(
+                int(row['index']))
+    return candidates
+
+
+def scan_files(filenames, where, output, min_tot=None, detector=None,
+               jobs=None, chunk_size=1000, opener=open_file):
+    """Scan the files and write the candidates to ``output``.
+
+    :param str where: Cut on the columns of ``FEATURES_DTYPE``, e.g.
+                      'n_doms>=20,triggered_fraction>0.1'
+    :param int jobs: Number of processes (default: number of CPUs), 1 scans
+                     in this process
+
+    """
+    check_cut(where, detector)
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    args = (where, min_tot, detector, opener)
+    chunks = tasks(filenames, chunk_size, opener)
+    print("Scanning {0} files with {1} processes...".format(
+        len(filenames), jobs))
+    start = time.time()
+    stats = {'events': 0, 'failed': 0}
+
+    def rows(results):
+        for (filename, first, last), features in results:
+            stats['events'] += last - first
+            if features is None:
+                stats['failed'] += last - first
+                continue
+            yield filename, features
+
+    with open(output, 'w') as fobj:
+        if jobs == 1:
+            _init_worker(*args)
+            n_candidates = write_candidates(fobj,
+                                            rows(map(_scan_chunk, chunks)))
+        else:
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(jobs, initializer=_init_worker,
+                              initargs=args) as pool:
+                n_candidates = write_candidates(
+                    fobj, rows(pool.imap(_scan_chunk, chunks)))
+    elapsed = time.time() - start
+    print("Scanned {0} events in {1:.1f}s ({2:.0f} events/s), {3} "
+          "candidates written to '{4}'".format(
+              stats['events'], elapsed, stats['events'] / max(elapsed, 1e-9),
+              n_candidates, output))
+    if stats['failed']:
+        log.warning("{0} events could not be scanned".format(
+            stats['failed']))
+    return n_candidates
@@ -0,0 +1,370 @@
+# coding=utf-8
+# Filename: stream.py
+"""
+Live events from a ControlHost (JLigier) dispatcher.
+
+A background thread subscribes to the event tag, receives and decodes the
+events and hands them to the render loop over a bounded queue, which never
+blocks the receiver: when it is full, the oldest event is dropped. A
+selection policy decides which events are queued at all. The events are
+only prepared for the display (e.g. the hits calibrated) when the render
+loop takes them from the queue, so the dropped ones cost no more than
+their decoding.
+
+Selection policies (``--policy``):
+
+    latest          Keep only the most recent event
+    nth:N           Keep every Nth event
+    trigger:MASK    Keep events matching any bit of the trigger mask
+
+"""
+from __future__ import division, absolute_import, print_function
+
+from collections import deque
+from io import BytesIO
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from km3pipe.controlhost import Message, Prefix
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+EVENT_TAG = 'IO_EVT'
+DAQ_EVENT_TYPE = 10001
+DAQ_EVENT_VERSION = 4
+SNAPSHOT_HIT_DTYPE = np.dtype([('dom_id', '<i4'), ('channel_id', 'u1'),
+                               ('time', '>u4'), ('tot', 'u1')])
+TRIGGERED_HIT_DTYPE = np.dtype([('dom_id', '<i4'), ('channel_id', 'u1'),
+                                ('time', '>u4'), ('tot', 'u1'),
+                                ('trigger_mask', '<u8')])
+
+
+def decode_event(data):
+    """Decode the payload of an IO_EVT message to a ``DAQEvent``."""
+    from km3pipe.io.daq import DAQEvent, DAQPreamble
+    stream = BytesIO(data)
+    preamble = DAQPreamble(file_obj=stream)
+    if preamble.data_type != DAQ_EVENT_TYPE:
+        raise ValueError("Not a DAQ event (data type {0})".format(
+            preamble.data_type))
+    return DAQEvent(file_obj=stream)
+
+
+def _pack_hits(hits, dtype):
+    """Copy the matching fields of the hits, missing ones are zero."""
+    packed = np.zeros(len(hits), dtype=dtype)
+    if len(hits):
+        for name in dtype.names:
+            if name in hits.dtype.names:
+                packed[name] = hits[name]
+    return packed
+
+
+def encode_event(snapshot_hits, triggered_hits=None, trigger_counter=0,
+                 trigger_mask=0, det_id=0, run=0, frame_index=0,
+                 timestamp=0, ticks=0, overlays=0):
+    """Encode an IO_EVT payload, the inverse of ``decode_event()``.
+
+    :param snapshot_hits: Record array with dom_id, channel_id, time and tot
+    :param triggered_hits: The same with an additional trigger_mask field
+
+    """
+    snapshot = _pack_hits(snapshot_hits, SNAPSHOT_HIT_DTYPE)
+    triggered = _pack_hits(() if triggered_hits is None else triggered_hits,
+                           TRIGGERED_HIT_DTYPE)
+    body = b''.join((
+        struct.pack('<h', DAQ_EVENT_VERSION),
+        struct.pack('<iiiii', det_id, run, frame_index, timestamp, ticks),
+        struct.pack('<QQi', trigger_counter, trigger_mask, overlays),
+        struct.pack('<i', len(triggered)),
+        triggered.tobytes(),
+        struct.pack('<i', len(snapshot)),
+        snapshot.tobytes(),
+    ))
+    preamble = struct.pack('<ii', len(body) + 8, DAQ_EVENT_TYPE)
+    return preamble + body
+
+
+class EveryNth(object):
+    """Selects every Nth event."""
+
+    def __init__(self, n):
+        if n < 1:
+            raise ValueError("N has to be positive")
+        self.n = n
+        self._count = 0
+
+    def __call__(self, event):
+        self._count += 1
+        return (self._count - 1) % self.n == 0
+
+
+class TriggerFilter(object):
+    """Selects the events with any bit of the trigger mask set."""
+
+    def __init__(self, mask):
+        self.mask = mask
+
+    def __call__(self, event):
+        return bool(event.trigger_mask & self.mask)
+
+
+def parse_policy(policy):
+    """Return the selection and queue size limit of a policy string.
+
+    The selection is None if every event is selected and the size limit
+    is None if the configured queue size applies.
+    """
+    name, _, value = policy.partition(':')
+    if name == 'latest' and not value:
+        return None, 1
+    if name == 'nth' and value:
+        return EveryNth(int(value)), None
+    if name == 'trigger' and value:
+        return TriggerFilter(int(value, 0)), None
+    raise ValueError("Unknown stream policy '{0}'".format(policy))
+
+
+class EventQueue(object):
+    """A bounded queue which drops the oldest item instead of blocking."""
+
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self.n_dropped = 0
+        self._items = deque()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        """Add an item, returns False if an older one had to be dropped."""
+        with self._lock:
+            self._items.append(item)
+            if len(self._items) <= self.max_size:
+                return True
+            self._items.popleft()
+            self.n_dropped += 1
+            return False
+
+    def get(self):
+        """Return the oldest item or None if the queue is empty."""
+        with self._lock:
+            if self._items:
+                return self._items.popleft()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class EventStream(object):
+    """Receives events from a dispatcher on a background thread.
+
+    :param prepare: Callable which turns a ``DAQEvent`` into the data to
+                    display, it runs in ``get()`` for the delivered events
+    :param str policy: Selection policy, see the module docstring
+    :param int max_size: Number of decoded events which can wait
+    :param float timeout: Socket timeout in seconds, also the reaction
+                          time to ``stop()``
+    :param float reconnect_interval: Seconds to wait before reconnecting
+
+    """
+
+    def __init__(self, host='localhost', port=5553, prepare=None,
+                 policy='latest', max_size=16, tag=EVENT_TAG, timeout=0.5,
+                 reconnect_interval=2):
+        self.host = host
+        self.port = port
+        self.tag = tag
+        self.prepare = prepare
+        self.select, size_limit = parse_policy(policy)
+        self.policy = policy
+        self.queue = EventQueue(size_limit or max_size)
+        self.timeout = timeout
+        self.reconnect_interval = reconnect_interval
+        self.n_received = 0
+        self.n_selected = 0
+        self.n_failed = 0
+        self.n_delivered = 0
+        self.is_connected = False
+        self._socket = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run,
+                                        name='rainbowalga-stream')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    @property
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def get(self):
+        """Return the next (event, prepared data) or None.
+
+        Events which cannot be prepared are skipped.
+        """
+        while True:
+            event = self.queue.get()
+            if event is None:
+                return None
+            try:
+                prepared = (event if self.prepare is None else
+                            self.prepare(event))
+            except Exception as e:
+                self.n_failed += 1
+                log.error("Could not prepare a streamed event: {0}".format(e))
+                continue
+            self.n_delivered += 1
+            return event, prepared
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port),
+                                        timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(Message(b'_Subscri', ' w ' + self.tag).data)
+        sock.sendall(Message(b'_Always').data)
+        return sock
+
+    def _recv(self, size):
+        """Receive exactly ``size`` bytes, None if stopped."""
+        chunks = []
+        while size > 0:
+            try:
+                chunk = self._socket.recv(min(size, 1 << 20))
+            except socket.timeout:
+                if self._stop.is_set():
+                    return None
+                continue
+            if not chunk:
+                raise EOFError("The dispatcher closed the connection")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._socket = self._connect()
+            except (OSError, socket.error) as e:
+                log.warning("Could not connect to {0}:{1}: {2}".format(
+                    self.host, self.port, e))
+                self._stop.wait(self.reconnect_interval)
+                continue
+            self.is_connected = True
+            log.info("Connected to {0}:{1}".format(self.host, self.port))
+            try:
+                self._receive_messages()
+            except (EOFError, OSError, socket.error, ValueError,
+                    struct.error) as e:
+                log.warning("Lost the connection: {0}".format(e))
+                self._stop.wait(self.reconnect_interval)
+            finally:
+                self.is_connected = False
+                self._socket.close()
+
+    def _receive_messages(self):
+        while not self._stop.is_set():
+            data = self._recv(Prefix.SIZE)
+            if data is None:
+                return
+            prefix = Prefix(data=data)
+            data = self._recv(prefix.length)
+            if data is None:
+                return
+            if str(prefix.tag) != self.tag:
+                continue
+            self.n_received += 1
+            self._process(data)
+
+    def _process(self, data):
+        try:
+            event = decode_event(data)
+            if self.select is not None and not self.select(event):
+                return
+        except Exception as e:
+            self.n_failed += 1
+            log.error("Could not decode a streamed event: {0}".format(e))
+            return
+        self.n_selected += 1
+        self.queue.put(event)
+
+    def __str__(self):
+        return "{0} received, {1} selected, {2} shown, {3} dropped".format(
+            self.n_received, self.n_selected, self.n_delivered,
+            self.queue.n_dropped)
+
+
+class StandInDispatcher(object):
+    """A local dispatcher which sends the given payloads to its clients.
+
+    It accepts any subscription and sends each payload to every client
+    once, ``rate`` messages per second (as fast as possible if None).
+    It is meant for testing without a running JLigier.
+    """
+
+    def __init__(self, payloads, tag=EVENT_TAG, host='127.0.0.1', port=0,
+                 rate=None, repeat=False):
+        self.payloads = payloads
+        self.tag = tag
+        self.rate = rate
+        self.repeat = repeat
+        self.n_sent = 0
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind((host, port))
+        self._server.listen(4)
+        self._server.settimeout(0.2)
+        self.host, self.port = self._server.getsockname()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name='rainbowalga-dispatcher')
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._server.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                client, _ = self._server.accept()
+            except socket.timeout:
+                continue
+            try:
+                self._serve(client)
+            except (OSError, socket.error):
+                pass
+            finally:
+                client.close()
+
+    def _serve(self, client):
+        while True:
+            for payload in self.payloads:
+                if self._stop.is_set():
+                    return
+                client.sendall(Message(self.tag, payload).data)
+                self.n_sent += 1
+                if self.rate:
+                    time.sleep(1 / self.rate)
+            if not self.repeat:
+                break
+        self._stop.wait()
@@ -0,0 +1,138 @@
+from __future__ import division, absolute_import, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from rainbowalga.calibration import (PMTLookup, PMTS_DTYPE, pmt_keys,
+                                     sort_by_time, detector_cache_key,
+                                     load_pmt_lookup)
+
+DETX = """23 2
+1 1 1 3
+ 1 0 0 10.1 0 0 1 5
+ 2 0.1 0 10 1 0 0 6
+ 3 0 0.1 10 0 1 0 7
+2 1 2 3
+ 4 0 0 20.1 0 0 1 8
+ 5 0.1 0 20 1 0 0 9
+ 6 0 0.1 20 0 1 0 10
+"""
+
+
+def make_pmts():
+    pmts = np.zeros(6, dtype=PMTS_DTYPE)
+    pmts['dom_id'] = [808, 808, 808, 2, 2, 2]
+    pmts['channel_id'] = [2, 0, 1, 0, 1, 2]
+    pmts['pmt_id'] = np.arange(6) + 1
+    pmts['du'] = [2, 2, 2, 1, 1, 1]
+    pmts['floor'] = 1
+    pmts['pos_x'] = np.arange(6) * 10
+    pmts['dir_z'] = -1
+    pmts['t0'] = np.arange(6) * 100
+    return pmts
+
+
+class TestPMTLookup(unittest.TestCase):
+
+    def setUp(self):
+        self.lookup = PMTLookup(make_pmts())
+
+    def test_len(self):
+        self.assertEqual(6, len(self.lookup))
+
+    def test_dom_positions_from_pmts(self):
+        self.assertListEqual([1, 2], list(self.lookup.doms['du']))
+        np.testing.assert_allclose([[40, 0, 0], [10, 0, 0]],
+                                   self.lookup.dom_positions)
+
+    def test_keys_are_sorted(self):
+        self.assertTrue(np.all(np.diff(self.lookup.keys) > 0))
+
+    def test_pmt_keys_are_unique_per_channel(self):
+        self.assertNotEqual(pmt_keys(1, 2), pmt_keys(2, 1))
+
+    def test_indices(self):
+        idx = self.lookup.indices([808, 2], [1, 2])
+        self.assertListEqual([3, 6], list(self.lookup.pmts['pmt_id'][idx]))
+
+    def test_unknown_pmt(self):
+        with self.assertRaises(KeyError):
+            self.lookup.indices([808, 808], [0, 3])
+        with self.assertRaises(KeyError):
+            self.lookup.indices([9999], [0])
+
+    def test_apply(self):
+        hits = self.lookup.apply([808, 2], [0, 1], [1000, 2000], [20, 30],
+                                 correct_slewing=False)
+        self.assertListEqual([10, 40], list(hits.pos_x))
+        self.assertListEqual([100, 400], list(hits.t0))
+        self.assertListEqual([1100, 2400], list(hits.time))
+        self.assertListEqual([2, 1], list(hits.du))
+        self.assertListEqual([-1, -1], list(hits.dir_z))
+        self.assertListEqual([20, 30], list(hits.tot))
+        self.assertFalse(np.any(hits.triggered))
+
+    def test_apply_corrects_slewing(self):
+        raw = self.lookup.apply([2], [0], [1000], [20], correct_slewing=False)
+        hits = self.lookup.apply([2], [0], [1000], [20])
+        self.assertLess(hits.time[0], raw.time[0])
+
+    def test_apply_without_hits(self):
+        hits = self.lookup.apply([], [], [], [])
+        self.assertEqual(0, len(hits))
+
+    def test_sort_by_time(self):
+        hits = self.lookup.apply([2, 2, 808], [0, 1, 0], [300, 100, 200],
+                                 [1, 2, 3], correct_slewing=False)
+        hits = sort_by_time(hits)
+        self.assertTrue(np.all(np.diff(hits.time) >= 0))
+        self.assertListEqual([3, 2, 1], list(hits.tot))
+
+
+class TestDetectorCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+        self.detx = os.path.join(self.tmpdir, 'test.detx')
+        with open(self.detx, 'w') as fobj:
+            fobj.write(DETX)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cache_key_changes_with_file(self):
+        key = detector_cache_key(self.detx)
+        self.assertEqual(key, detector_cache_key(self.detx))
+        with open(self.detx, 'a') as fobj:
+            fobj.write('\n')
+        self.assertNotEqual(key, detector_cache_key(self.detx))
+
+    def test_cache_key_for_det_id(self):
+        self.assertNotEqual(detector_cache_key('D_ARCA003'),
+                            detector_cache_key('D_ORCA006'))
+
+    def test_load_writes_and_maps_the_cache(self):
+        lookup = load_pmt_lookup(self.detx, self.cache_dir)
+        self.assertEqual(2, len(os.listdir(self.cache_dir)))
+        cached = load_pmt_lookup(self.detx, self.cache_dir)
+        self.assertIsInstance(cached.pmts, np.memmap)
+        np.testing.assert_array_equal(lookup.pmts, cached.pmts)
+        np.testing.assert_array_equal(lookup.doms, cached.doms)
+        np.testing.assert_allclose([[0, 0, 10], [0, 0, 20]],
+                                   cached.dom_positions)
+        hits = cached.apply([2], [1], [100], [20], correct_slewing=False)
+        self.assertListEqual([109], list(hits.time))
+
+    def test_load_without_cache(self):
+        lookup = load_pmt_lookup(self.detx, None)
+        self.assertEqual(6, len(lookup))
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+from __future__ import division, absolute_import, print_function
+
+import unittest
+
+import numpy as np
+
+from rainbowalga.colourmaps import (ColourMap, COLOUR_MAPS, get_colour_map,
+                                    hex2rgb)
+
+
+class TestColourMap(unittest.TestCase):
+
+    def setUp(self):
+        self.cmap = ColourMap('test', [(0, 0, 0), (0.5, 0.5, 0.5), (1, 1, 1)])
+
+    def test_scalar(self):
+        self.assertListEqual([0.5, 0.5, 0.5], list(self.cmap(0.5)))
+
+    def test_array_shape(self):
+        self.assertEqual((4, 5, 3), self.cmap(np.zeros((4, 5))).shape)
+
+    def test_values_outside_are_clipped(self):
+        colours = self.cmap([-1, 0, 1, 2])
+        self.assertListEqual([0, 0, 1, 1], list(colours[:, 0]))
+
+    def test_nan_maps_to_lowest_colour(self):
+        self.assertListEqual([0, 0, 0], list(self.cmap(np.nan)))
+
+    def test_map(self):
+        colours = self.cmap.map([100, 150, 200], 100, 200)
+        self.assertListEqual([0, 0.5, 1], list(colours[:, 0]))
+
+    def test_map_with_empty_range(self):
+        colours = self.cmap.map([100, 150], 100, 100)
+        self.assertListEqual([0, 0], list(colours[:, 0]))
+
+
+class TestColourMaps(unittest.TestCase):
+
+    def test_default_colour_maps_are_available(self):
+        for name in ('RdBu', 'seismic', 'Set1', 'brg', 'gist_rainbow'):
+            self.assertEqual(name, get_colour_map(name).name)
+
+    def test_unknown_colour_map(self):
+        with self.assertRaises(KeyError):
+            get_colour_map('foo')
+
+    def test_luts_are_within_unit_range(self):
+        for cmap in COLOUR_MAPS.values():
+            self.assertTrue(np.all((cmap.lut >= 0) & (cmap.lut <= 1)))
+
+    def test_brg(self):
+        cmap = get_colour_map('brg')
+        np.testing.assert_allclose([0, 0, 1], cmap(0))
+        np.testing.assert_allclose([0, 1, 0], cmap(1))
+
+    def test_listed_colour_map_has_flat_bands(self):
+        cmap = get_colour_map('Set1')
+        np.testing.assert_allclose(hex2rgb('#e41a1c'), cmap(0.1))
+        np.testing.assert_allclose(hex2rgb('#999999'), cmap(0.95))
+
+    def test_hex2rgb(self):
+        self.assertEqual((1, 0, 0), hex2rgb('#ff0000'))
+
+
+if __name__ == '__main__':
+    unittest.main()
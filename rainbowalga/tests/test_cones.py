@@ -0,0 +1,46 @@
+from __future__ import division, absolute_import, print_function
+
+import unittest
+
+import numpy as np
+
+from rainbowalga.cones import (unit_cone, instances, RADIUS_RATIO,
+                               MESH_VERTEX_SIZE, INSTANCE_SIZE)
+from rainbowalga.physics import track_bases
+
+
+class TestUnitCone(unittest.TestCase):
+
+    def test_shape(self):
+        mesh = unit_cone(16)
+        self.assertEqual((16 * 6, MESH_VERTEX_SIZE), mesh.shape)
+        self.assertEqual(np.float32, mesh.dtype)
+
+    def test_extent(self):
+        positions = unit_cone(32)[:, :3]
+        self.assertAlmostEqual(0, positions[:, 2].min())
+        self.assertAlmostEqual(1, positions[:, 2].max())
+        radii = np.linalg.norm(positions[:, :2], axis=1)
+        self.assertAlmostEqual(1, radii.max(), places=6)
+
+    def test_normals_are_unit_vectors(self):
+        normals = unit_cone(8)[:, 3:]
+        self.assertTrue(np.allclose(1, np.linalg.norm(normals, axis=1)))
+
+    def test_side_normals_point_outwards(self):
+        mesh = unit_cone(8)
+        side = mesh[:8 * 3]
+        rim = side[side[:, 2] == 0]
+        self.assertTrue(np.all(np.sum(rim[:, :2] * rim[:, 3:5], axis=1) > 0))
+
+
+class TestInstances(unittest.TestCase):
+
+    def test_layout(self):
+        axes = track_bases([[0, 0, 1], [1, 0, 0]])
+        data = instances([[1, 2, 3], [4, 5, 6]], axes, [10, 20])
+        self.assertEqual((2, INSTANCE_SIZE), data.shape)
+        self.assertListEqual([1, 2, 3], list(data[0, :3]))
+        self.assertTrue(np.allclose(axes[1][:, 2], data[1, 9:12]))
+        self.assertAlmostEqual(RADIUS_RATIO * 20, data[1, 12], places=5)
+        self.assertEqual(20, data[1, 13])
@@ -2,16 +2,29 @@ from __future__ import division, absolute_import, print_function
 
 import unittest
 
-from rainbowalga.core import Position
+import numpy as np
 
+from rainbowalga.core import Vec3
 
-class TestPosition(unittest.TestCase):
+
+class TestVec3(unittest.TestCase):
 
     def test_x_y_z(self):
-        position = Position(1, 2, 3)
-        self.assertEqual(1, position.x)
-        self.assertEqual(2, position.y)
-        self.assertEqual(3, position.z)
+        vec = Vec3(1, 2, 3)
+        self.assertEqual(1, vec.x)
+        self.assertEqual(2, vec.y)
+        self.assertEqual(3, vec.z)
+
+    def test_arithmetic(self):
+        vec = Vec3(1, 2, 3) + Vec3(1, 1, 1) * 2 - (1, 0, 0)
+        self.assertListEqual([2, 4, 5], list(np.array(vec)))
+        self.assertEqual(4, vec.y)
+        self.assertListEqual([1, 2, 2.5], list(np.array(vec / 2)))
+
+    def test_numpy_operations(self):
+        vec = Vec3(3, 0, 4)
+        self.assertEqual(5, np.linalg.norm(vec))
+        self.assertEqual(3, vec[0])
 
 
 if __name__ == '__main__':
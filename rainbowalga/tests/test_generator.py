@@ -0,0 +1,168 @@
+from __future__ import division, absolute_import, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from rainbowalga.calibration import load_pmt_lookup
+from rainbowalga.generator import (detector_pmts, du_positions,
+                                   dom_pmt_directions, parse_spec,
+                                   write_detx, EventGenerator)
+from rainbowalga.physics import (cherenkov_times, point_source_times,
+                                 time_residuals)
+
+
+class TestDetector(unittest.TestCase):
+
+    def test_pmt_directions(self):
+        directions = dom_pmt_directions()
+        self.assertEqual((31, 3), directions.shape)
+        self.assertTrue(np.allclose(1, np.linalg.norm(directions, axis=1)))
+        self.assertTrue(np.allclose((0, 0, -1), directions[0]))
+
+    def test_du_positions(self):
+        positions = du_positions(7, 90)
+        self.assertTrue(np.allclose((0, 0), positions[0]))
+        distances = np.hypot(positions[1:, 0], positions[1:, 1])
+        self.assertTrue(np.allclose(90, distances))
+        self.assertEqual(230, len(np.unique(du_positions(230, 1), axis=0)))
+
+    def test_detector_pmts(self):
+        pmts = detector_pmts(n_dus=3, n_floors=2, floor_spacing=10)
+        self.assertEqual(3 * 2 * 31, len(pmts))
+        self.assertEqual(6, len(np.unique(pmts['dom_id'])))
+        self.assertListEqual([1, 2, 3], list(np.unique(pmts['du'])))
+        self.assertEqual(800000302, pmts['dom_id'][-1])
+        floor_2 = pmts[(pmts['du'] == 1) & (pmts['floor'] == 2)]
+        self.assertAlmostEqual(40, floor_2['pos_z'].mean(), places=1)
+
+    def test_write_detx(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        filename = os.path.join(tmpdir, 'synthetic.detx')
+        pmts = detector_pmts(n_dus=2, n_floors=3)
+        write_detx(filename, pmts)
+        lookup = load_pmt_lookup(filename, cache_dir=None)
+        self.assertEqual(len(pmts), len(lookup))
+        self.assertListEqual(list(pmts['dom_id']),
+                             list(lookup.pmts['dom_id']))
+        self.assertListEqual(list(pmts['floor']), list(lookup.pmts['floor']))
+        self.assertTrue(np.allclose(pmts['pos_z'], lookup.pmts['pos_z'],
+                                    atol=1e-3))
+
+
+class TestParseSpec(unittest.TestCase):
+
+    def test_preset_and_values(self):
+        kwargs = parse_spec('arca, events=10,energy=10:1000, window=1e5')
+        self.assertEqual(230, kwargs['n_dus'])
+        self.assertEqual(10, kwargs['n_events'])
+        self.assertEqual((10, 1000), kwargs['energy_range'])
+        self.assertEqual(1e5, kwargs['time_window'])
+
+    def test_invalid(self):
+        for spec in ('foo', 'events=x', 'bar=1'):
+            with self.assertRaises(ValueError):
+                parse_spec(spec)
+
+
+class TestEventGenerator(unittest.TestCase):
+
+    def setUp(self):
+        self.generator = EventGenerator.from_spec(
+            'demo,events=5,cascades=1,energy=1e4:1e5')
+
+    def test_events_are_reproducible(self):
+        event = self.generator[3]
+        self.assertTrue(np.array_equal(event.time, self.generator[3].time))
+        self.assertFalse(np.array_equal(event.time, self.generator[2].time))
+        with self.assertRaises(IndexError):
+            self.generator[5]
+
+    def test_hits_can_be_calibrated(self):
+        event = self.generator[0]
+        hits = self.generator.pmt_lookup.apply(event.dom_id, event.channel_id,
+                                               event.time, event.tot)
+        self.assertEqual(len(event.dom_id), len(hits))
+        self.assertTrue(np.all(event.tot >= 1))
+
+    def test_noise(self):
+        generator = EventGenerator.from_spec(
+            'orca,muons=0,noise=10000,coincidences=0,window=100000')
+        event = generator[0]
+        self.assertEqual(0, len(event.tracks))
+        self.assertFalse(np.any(event.triggered))
+        expected = len(generator.pmts) * 10000 * 1e-4
+        self.assertLess(abs(len(event.time) - expected), 5 * expected**0.5)
+
+    def test_muon_hits_follow_the_cherenkov_times(self):
+        generator = EventGenerator.from_spec(
+            'orca,muons=1,noise=0,coincidences=0,energy=1e4:1e4')
+        for index in range(5):
+            event = generator[index]
+            if len(event.tracks) == 1:
+                break
+        track = event.tracks[0]
+        hits = generator.pmt_lookup.apply(event.dom_id, event.channel_id,
+                                          event.time, event.tot)
+        pmt_pos = np.column_stack((hits.pos_x, hits.pos_y, hits.pos_z))
+        _, residuals = time_residuals(
+            hits.time, pmt_pos, [track['pos_x'], track['pos_y'],
+                                  track['pos_z']],
+            [track['dir_x'], track['dir_y'], track['dir_z']], track['time'])
+        self.assertGreater(len(residuals), 20)
+        self.assertTrue(np.all(event.triggered))
+        self.assertLess(abs(np.median(residuals)), 5)
+        self.assertGreater(np.min(residuals), -15)
+
+    def test_calibration_restores_the_arrival_times(self):
+        class Exact(EventGenerator):
+            TTS = 0
+            SCATTERING_DELAY = 0
+
+        pmts = detector_pmts(n_dus=7, n_floors=18, du_spacing=90,
+                             floor_spacing=36)
+        pmts['t0'] = np.random.RandomState(1).uniform(0, 300, len(pmts))
+        generator = Exact(pmts, n_events=3, n_muons=2, n_cascades=2,
+                          noise_rate=0, coincidence_rate=0)
+        lookup = generator.pmt_lookup
+        n_hits = 0
+        for index in range(len(generator)):
+            event = generator[index]
+            if len(event.tracks) == 0:
+                continue
+            hits = lookup.apply(event.dom_id, event.channel_id, event.time,
+                                event.tot)
+            pmt_pos = np.column_stack((hits.pos_x, hits.pos_y, hits.pos_z))
+            arrival_times = []
+            for track in event.tracks:
+                pos = [track['pos_x'], track['pos_y'], track['pos_z']]
+                if track['type'] == 13:
+                    arrival_times.append(cherenkov_times(
+                        pmt_pos, pos, [track['dir_x'], track['dir_y'],
+                                       track['dir_z']], track['time']))
+                else:
+                    arrival_times.append(
+                        point_source_times(pmt_pos, pos, track['time']))
+            # each hit comes from one of the tracks
+            residuals = np.min(np.abs(hits.time - np.array(arrival_times)),
+                               axis=0)
+            self.assertLess(np.max(residuals, initial=0), 1e-6)
+            n_hits += len(hits)
+        self.assertGreater(n_hits, 0)
+
+    def test_tracks(self):
+        tracks = self.generator.tracks(1)
+        self.assertTrue(np.array_equal(tracks, self.generator[1].tracks))
+        directions = np.column_stack(
+            (tracks['dir_x'], tracks['dir_y'], tracks['dir_z']))
+        self.assertTrue(np.allclose(1, np.linalg.norm(directions, axis=1)))
+
+    def test_events_on_given_pmts(self):
+        pmts = detector_pmts(n_dus=2, n_floors=2)
+        generator = EventGenerator.from_spec('arca,events=3', pmts)
+        self.assertEqual(3, len(generator))
+        self.assertIs(pmts, generator.pmts)
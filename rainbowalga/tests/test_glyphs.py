@@ -0,0 +1,61 @@
+from __future__ import division, absolute_import, print_function
+
+import unittest
+
+import numpy as np
+
+from rainbowalga.calibration import HITS_DTYPE
+from rainbowalga.glyphs import DomHits
+
+
+def make_hits(dom_id, time, tot):
+    hits = np.zeros(len(time), dtype=HITS_DTYPE).view(np.recarray)
+    hits.dom_id = dom_id
+    hits.time = time
+    hits.tot = tot
+    return hits
+
+
+class TestDomHits(unittest.TestCase):
+
+    def setUp(self):
+        self.hits = make_hits([3, 1, 3, 9, 1, 3], [50, 10, 20, 5, 40, 30],
+                              [10, 20, 30, 40, 50, 60])
+
+    def test_advance(self):
+        dom_hits = DomHits([1, 2, 3], self.hits)
+        self.assertFalse(dom_hits.advance(0))
+        self.assertTrue(dom_hits.advance(25))
+        self.assertListEqual([1, 0, 1], list(dom_hits.counts))
+        self.assertTrue(dom_hits.advance(100))
+        self.assertListEqual([2, 0, 3], list(dom_hits.counts))
+        self.assertListEqual([70, 0, 100], list(dom_hits.tot_sums))
+        self.assertListEqual([10, 20], list(dom_hits.first_times[[0, 2]]))
+        self.assertEqual(2, dom_hits.n_hit_doms)
+        self.assertFalse(dom_hits.advance(200))
+
+    def test_going_back_in_time(self):
+        dom_hits = DomHits([1, 2, 3], self.hits)
+        dom_hits.advance(100)
+        self.assertTrue(dom_hits.advance(15))
+        self.assertListEqual([1, 0, 0], list(dom_hits.counts))
+        self.assertListEqual([10], list(dom_hits.first_times[[0]]))
+
+    def test_tot_cut_and_unknown_doms(self):
+        dom_hits = DomHits([3, 1], self.hits, min_tot=25)
+        self.assertEqual((20, 40), dom_hits.time_range)
+        dom_hits.advance(100)
+        self.assertListEqual([2, 1], list(dom_hits.counts))
+
+    def test_values(self):
+        dom_hits = DomHits([1, 2, 3], self.hits)
+        dom_hits.advance(100)
+        values = dom_hits.values(time_offset=10)
+        self.assertEqual(np.float32, values.dtype)
+        self.assertListEqual([2, 70, 0], list(values[0]))
+        self.assertListEqual([0, 0, 0], list(values[1]))
+        self.assertListEqual([3, 100, 10], list(values[2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+from __future__ import division, absolute_import, print_function
+
+import unittest
+
+import numpy as np
+
+from rainbowalga.colourmaps import get_colour_map
+from rainbowalga.gui import legend_ticks, legend_vertices, ColourLegend
+
+
+class TestLegendTicks(unittest.TestCase):
+
+    def test_ticks(self):
+        ticks, step = legend_ticks(0, 3000)
+        self.assertEqual(150, step)
+        self.assertEqual(20, len(ticks))
+        self.assertEqual(2850, ticks[-1])
+
+    def test_empty_range(self):
+        ticks, _ = legend_ticks(100, 100)
+        self.assertEqual(0, len(ticks))
+
+
+class TestLegendVertices(unittest.TestCase):
+
+    def test_quads(self):
+        cmap = get_colour_map('jet')
+        ticks = np.array([0, 10, 20])
+        vertices, segment_height = legend_vertices(ticks, 10, cmap, (0, 30),
+                                                   90, 100, 10, 70)
+        self.assertEqual((12, 5), vertices.shape)
+        self.assertEqual(20, segment_height)
+        # first segment at the bottom, counter-clockwise
+        self.assertListEqual([90, 70, 100, 70, 100, 50, 90, 50],
+                             list(vertices[:4, :2].ravel()))
+        self.assertTrue(np.allclose(cmap.map(0, 0, 30), vertices[0, 2:]))
+        self.assertTrue(np.allclose(cmap.map(10, 0, 30), vertices[3, 2:]))
+        self.assertTrue(np.allclose(vertices[3, 2:], vertices[4, 2:]))
+
+
+class TestColourLegend(unittest.TestCase):
+
+    def setUp(self):
+        self.legend = ColourLegend()
+        self.cmap = get_colour_map('jet')
+
+    def update(self, **kwargs):
+        args = dict(width=800, height=600, top=41, value_range=(0, 1000),
+                    cmap=self.cmap, print_mode=False)
+        args.update(kwargs)
+        return self.legend.update(**args)
+
+    def test_rebuilt_only_on_change(self):
+        self.assertTrue(self.update())
+        self.assertFalse(self.update())
+        self.assertTrue(self.update(value_range=(0, 1010)))
+        self.assertTrue(self.update(value_range=(0, 1010), width=900))
+        self.assertTrue(self.update(value_range=(0, 1010), width=900,
+                                    cmap=get_colour_map('hot')))
+        self.assertTrue(self.update(value_range=(0, 1010), width=900,
+                                    cmap=get_colour_map('hot'),
+                                    print_mode=True))
+        self.assertEqual(5, self.legend.n_builds)
+
+    def test_labels(self):
+        self.update(value_range=(1000, 2000), label_offset=1000)
+        self.assertEqual(20, len(self.legend.labels))
+        self.assertEqual("    0ns", self.legend.labels[0][0])
+        self.assertEqual("  950ns", self.legend.labels[-1][0])
+        self.assertEqual(80, self.legend.n_vertices)
+
+    def test_scaled_labels_move_left(self):
+        self.update()
+        self.assertEqual(720, self.legend.labels[0][1])
+        self.assertTrue(self.update(label_scale=1.5))
+        self.assertEqual(690, self.legend.labels[0][1])
+
+    def test_too_small_range(self):
+        self.update(value_range=(0, 40))
+        self.assertEqual(0, self.legend.n_vertices)
+        self.assertEqual([], self.legend.labels)
@@ -0,0 +1,129 @@
+from __future__ import division, absolute_import, print_function
+
+import unittest
+
+import numpy as np
+
+from rainbowalga.calibration import DOMS_DTYPE, PMTS_DTYPE
+from rainbowalga.hardware import (boxes_in_frustum, box_distances,
+                                  DetectorScene, frustum_planes,
+                                  merged_ranges)
+
+
+def perspective(fov, aspect, near, far):
+    """The matrix of ``gluPerspective()``."""
+    f = 1 / np.tan(np.radians(fov) / 2)
+    return np.array([
+        [f / aspect, 0, 0, 0],
+        [0, f, 0, 0],
+        [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+        [0, 0, -1, 0],
+    ])
+
+
+def make_doms(du, floor, z):
+    doms = np.zeros(len(du), dtype=DOMS_DTYPE)
+    doms['du'] = du
+    doms['floor'] = floor
+    doms['pos_x'] = np.asarray(du) * 100
+    doms['pos_z'] = z
+    return doms
+
+
+class TestFrustumCulling(unittest.TestCase):
+
+    def setUp(self):
+        # camera at the origin looking along -z, matrices column-major
+        self.planes = frustum_planes(perspective(90, 1, 1, 100).T,
+                                     np.identity(4))
+
+    def test_planes(self):
+        inside = np.array([[0, 0, -10, 1], [9, -9, -10, 1]])
+        outside = np.array([[0, 0, 10, 1], [11, 0, -10, 1], [0, 0, -101, 1],
+                            [0, 0, -0.5, 1]])
+        self.assertTrue(np.all(inside.dot(self.planes.T) >= 0))
+        self.assertTrue(np.all(np.any(outside.dot(self.planes.T) < 0,
+                                      axis=1)))
+
+    def test_boxes(self):
+        lower = np.array([[-1, -1, -20], [5, 5, 5], [9, -1, -12],
+                          [-200, -200, -50]])
+        upper = np.array([[1, 1, -10], [6, 6, 6], [20, 1, -8],
+                          [200, 200, -40]])
+        self.assertListEqual([True, False, True, True],
+                             list(boxes_in_frustum(self.planes, lower, upper)))
+
+    def test_box_distances(self):
+        lower = np.array([[0, 0, 0], [10, 0, 0]])
+        upper = np.array([[1, 1, 1], [11, 1, 1]])
+        self.assertTrue(
+            np.allclose([0, 9.5],
+                        box_distances((0.5, 0.5, 0.5), lower, upper)))
+
+
+class TestMergedRanges(unittest.TestCase):
+
+    def test_merge(self):
+        first = np.array([0, 3, 5, 5, 9])
+        count = np.array([3, 2, 0, 4, 1])
+        starts, lengths = merged_ranges(first, count,
+                                        np.array([1, 1, 1, 0, 1], bool))
+        self.assertListEqual([0, 9], list(starts))
+        self.assertListEqual([5, 1], list(lengths))
+        starts, lengths = merged_ranges(first, count, np.ones(5, bool))
+        self.assertListEqual([0], list(starts))
+        self.assertListEqual([10], list(lengths))
+        self.assertEqual(0, len(merged_ranges(first, count,
+                                              np.zeros(5, bool))[0]))
+
+
+class TestDetectorScene(unittest.TestCase):
+
+    def setUp(self):
+        doms = make_doms([2, 1, 2, 1, 1, 2], [2, 1, 1, 3, 2, 3],
+                         [20, 10, 10, 30, 20, 30])
+        pmts = np.zeros(4, dtype=PMTS_DTYPE)
+        pmts['du'] = [2, 1, 2, 7]
+        pmts['pos_x'] = [201, 101, 199, 700]
+        pmts['pos_z'] = [10, 10, 5, 10]
+        self.scene = DetectorScene(doms, pmts, pmt_distance=50,
+                                   dom_distance=150)
+
+    def test_geometry(self):
+        scene = self.scene
+        self.assertEqual(2, len(scene))
+        self.assertEqual(3, scene.n_pmts)
+        self.assertListEqual([0, 2], list(scene.line_first))
+        self.assertListEqual([2, 2], list(scene.line_count))
+        self.assertListEqual([4, 7], list(scene.dom_first))
+        self.assertListEqual([10, 11], list(scene.pmt_first))
+        self.assertListEqual([1, 2], list(scene.pmt_count))
+        lines = scene.vertices[:4, [0, 2]]
+        self.assertListEqual([[100, 10], [100, 30], [200, 10], [200, 30]],
+                             lines.tolist())
+        self.assertListEqual([10, 20, 30], list(scene.vertices[4:7, 2]))
+
+    def test_bounding_boxes(self):
+        self.assertListEqual([[100, 0, 10], [199, 0, 5]],
+                             self.scene.lower.tolist())
+        self.assertListEqual([[101, 0, 30], [201, 0, 30]],
+                             self.scene.upper.tolist())
+
+    def test_levels(self):
+        lines, doms, pmts = self.scene.levels((100, 0, 60))
+        self.assertListEqual([False, False], list(lines))
+        self.assertListEqual([True, True], list(doms))
+        self.assertListEqual([True, False], list(pmts))
+        lines, doms, pmts = self.scene.levels((300, 0, 20))
+        self.assertListEqual([True, False], list(lines))
+        self.assertListEqual([False, True], list(doms))
+        self.assertListEqual([False, False], list(pmts))
+
+    def test_without_pmts(self):
+        scene = DetectorScene(make_doms([1, 1], [1, 2], [0, 10]))
+        self.assertEqual(0, scene.n_pmts)
+        self.assertEqual(4, len(scene.vertices))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+from __future__ import division, absolute_import, print_function
+
+import unittest
+
+from rainbowalga.headless import (parse_range, parse_size, chunked,
+                                  set_platform)
+
+
+class TestParseRange(unittest.TestCase):
+
+    def test_open_range(self):
+        self.assertEqual([3, 4], list(parse_range('3:', 5)))
+        self.assertEqual([0, 1], list(parse_range(':2', 5)))
+        self.assertEqual([0, 1, 2, 3, 4], list(parse_range('0:', 5)))
+
+    def test_negative_indices(self):
+        self.assertEqual([3, 4], list(parse_range('-2:', 5)))
+
+    def test_single_index(self):
+        self.assertEqual([7], list(parse_range('7', 10)))
+
+    def test_stop_is_clipped(self):
+        self.assertEqual([8, 9], list(parse_range('8:100', 10)))
+
+
+class TestParseSize(unittest.TestCase):
+
+    def test_parse_size(self):
+        self.assertEqual((800, 600), parse_size('800x600'))
+        self.assertEqual((1920, 1080), parse_size('1920X1080'))
+
+
+class TestChunked(unittest.TestCase):
+
+    def test_chunked(self):
+        self.assertEqual([[0, 1], [2, 3], [4]], chunked(range(5), 2))
+
+    def test_empty(self):
+        self.assertEqual([], chunked(range(0), 2))
+
+
+class TestSetPlatform(unittest.TestCase):
+
+    def test_unknown_platform(self):
+        with self.assertRaises(ValueError):
+            set_platform('glx')
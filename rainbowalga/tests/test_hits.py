@@ -0,0 +1,104 @@
+from __future__ import division, absolute_import, print_function
+
+import unittest
+
+import numpy as np
+
+from rainbowalga.hits import (hit_vertices, first_dom_hits, hit_radius,
+                              largest_tot_hits, passing_tot_cut, NEVER,
+                              VERTEX_SIZE)
+
+
+class TestHitVertices(unittest.TestCase):
+
+    def test_shape(self):
+        vertices = hit_vertices([1, 2], [3, 4], [5, 6], [10, 20], [30, 40])
+        self.assertEqual((2, VERTEX_SIZE), vertices.shape)
+        self.assertEqual(np.float32, vertices.dtype)
+
+    def test_attributes_are_interleaved(self):
+        vertices = hit_vertices([1], [2], [3], [4], [5], [6], [7])
+        self.assertListEqual([1, 2, 3, 4, 5, 6, 7], list(vertices[0]))
+
+    def test_values_default_to_time(self):
+        vertices = hit_vertices([1, 1], [2, 2], [3, 3], [4, 7], [5, 5])
+        self.assertListEqual([4, 7], list(vertices[:, 5]))
+
+    def test_hits_are_never_hidden_by_default(self):
+        vertices = hit_vertices([1], [2], [3], [4], [5])
+        self.assertEqual(np.float32(NEVER), vertices[0, 6])
+
+
+class TestPassingTotCut(unittest.TestCase):
+
+    def test_cut(self):
+        tot = np.array([10, 27, 28, 40], dtype=np.uint8)
+        self.assertListEqual([False, False, True, True],
+                             list(passing_tot_cut(tot, 27)))
+        self.assertListEqual([False, False, False, True],
+                             list(passing_tot_cut(tot, 27.5 + 10)))
+
+    def test_no_cut(self):
+        self.assertTrue(np.all(passing_tot_cut(np.zeros(3), None)))
+        self.assertTrue(np.all(passing_tot_cut(np.zeros(3), 0)))
+
+
+class TestHitRadius(unittest.TestCase):
+
+    def test_radius(self):
+        tot = np.array([0, 1, 4, 26], dtype=np.uint8)
+        self.assertListEqual([1, 2, 4, 8], list(hit_radius(tot)))
+
+
+def largest_tot_hits_loop(dom_id, time, tot):
+    """The hits replacing the earlier ones on their DOM, one by one"""
+    largest = {}
+    replaced_by = {}
+    for i in np.argsort(time, kind='stable'):
+        previous = largest.get(dom_id[i])
+        if previous is None or tot[i] > tot[previous]:
+            if previous is not None:
+                replaced_by[previous] = i
+            largest[dom_id[i]] = i
+            replaced_by[i] = -1
+    return replaced_by
+
+
+class TestFirstDomHits(unittest.TestCase):
+
+    def test_first_hits(self):
+        dom_id = np.array([2, 1, 2, 3, 1])
+        time = np.array([5., 4., 1., 3., 2.])
+        self.assertListEqual([2, 4, 3], list(first_dom_hits(dom_id, time)))
+
+    def test_no_hits(self):
+        self.assertEqual(0, len(first_dom_hits([], [])))
+
+
+class TestLargestTotHits(unittest.TestCase):
+
+    def test_replacements(self):
+        dom_id = np.array([1, 1, 2, 1, 1, 2])
+        time = np.array([1., 2., 3., 4., 5., 6.])
+        tot = np.array([10, 5, 7, 20, 20, 7], dtype=np.uint8)
+        kept, replaced_by = largest_tot_hits(dom_id, time, tot)
+        self.assertListEqual([0, 3, 2], list(kept))
+        self.assertListEqual([3, -1, -1], list(replaced_by))
+
+    def test_matches_loop(self):
+        rng = np.random.RandomState(1)
+        dom_id = rng.randint(0, 20, 500)
+        time = rng.uniform(0, 1000, 500)
+        tot = rng.randint(0, 256, 500).astype(np.uint8)
+        kept, replaced_by = largest_tot_hits(dom_id, time, tot)
+        self.assertDictEqual(largest_tot_hits_loop(dom_id, time, tot),
+                             dict(zip(kept.tolist(), replaced_by.tolist())))
+
+    def test_no_hits(self):
+        kept, replaced_by = largest_tot_hits([], [], [])
+        self.assertEqual(0, len(kept))
+        self.assertEqual(0, len(replaced_by))
+
+
+if __name__ == '__main__':
+    unittest.main()
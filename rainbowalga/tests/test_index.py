@@ -0,0 +1,137 @@
+from __future__ import division, absolute_import, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from rainbowalga.index import (build_index, load_event_index, index_files,
+                               parse_cut, EventIndex)
+
+
+class Hits(object):
+    def __init__(self, tot):
+        self.tot = tot
+
+
+class Events(object):
+    """Stand-in for ``OnlineReader.events`` with n events"""
+
+    def __init__(self, n):
+        self.headers = {
+            'run': np.full(n, 42),
+            'frame_index': np.arange(n) + 100,
+            'trigger_counter': np.arange(n)[::-1] * 2,
+            'trigger_mask': np.arange(n) % 4,
+            'UTC_seconds': np.full(n, 1600000000) + np.arange(n) // 2,
+            'UTC_16nanosecondcycles': (np.arange(n) % 2) * 1000,
+        }
+        self.snapshot_hits = Hits([np.full(i, 10) for i in range(n)])
+        self.triggered_hits = Hits([np.full(i // 2, 10) for i in range(n)])
+        self.n_reads = 0
+
+    def __len__(self):
+        self.n_reads += 1
+        return len(self.headers['run'])
+
+
+class TestBuildIndex(unittest.TestCase):
+
+    def test_columns(self):
+        table = build_index(Events(5), chunk_size=2)
+        self.assertListEqual([0, 1, 2, 3, 4], list(table['entry']))
+        self.assertListEqual([8, 6, 4, 2, 0], list(table['trigger_counter']))
+        self.assertListEqual([100, 101, 102, 103, 104],
+                             list(table['frame_index']))
+        self.assertListEqual([0, 1, 2, 3, 4], list(table['n_hits']))
+        self.assertListEqual([0, 0, 1, 1, 2],
+                             list(table['n_triggered_hits']))
+        self.assertListEqual([0, 10, 20, 30, 40], list(table['tot_sum']))
+        self.assertListEqual([0, 16000, 0, 16000, 0],
+                             list(table['utc_nanoseconds']))
+
+    def test_awkward_columns(self):
+        import awkward as ak
+        events = Events(3)
+        tots = [np.full(300 * i, 200, dtype=np.uint8) for i in range(3)]
+        events.snapshot_hits = Hits(ak.Array(tots))
+        table = build_index(events)
+        self.assertListEqual([0, 300, 600], list(table['n_hits']))
+        self.assertListEqual([0, 60000, 120000], list(table['tot_sum']))
+
+
+class TestLoadEventIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+        self.filename = os.path.join(self.tmpdir, 'events.root')
+        with open(self.filename, 'wb') as fobj:
+            fobj.write(b'root')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_sidecar_is_written_and_reused(self):
+        events = Events(5)
+        index = load_event_index(self.filename, events, self.cache_dir)
+        self.assertEqual(5, len(index))
+        self.assertTrue(os.path.exists(index_files(self.filename)[0]))
+        n_reads = events.n_reads
+        reloaded = load_event_index(self.filename, events, self.cache_dir)
+        self.assertEqual(n_reads, events.n_reads)
+        self.assertTrue(np.array_equal(index.table, reloaded.table))
+
+    def test_outdated_sidecar_is_rebuilt(self):
+        load_event_index(self.filename, Events(5), self.cache_dir)
+        with open(self.filename, 'ab') as fobj:
+            fobj.write(b'more')
+        index = load_event_index(self.filename, Events(3), self.cache_dir)
+        self.assertEqual(3, len(index))
+
+    def test_cache_dir_fallback(self):
+        sidecar, fallback = index_files(self.filename, self.cache_dir)
+        os.mkdir(sidecar)  # not writable as a file
+        events = Events(5)
+        load_event_index(self.filename, events, self.cache_dir)
+        self.assertTrue(os.path.exists(fallback))
+        self.assertListEqual([os.path.basename(sidecar)],
+                             [f for f in os.listdir(self.tmpdir)
+                              if f.startswith('events.root.')])
+        n_reads = events.n_reads
+        load_event_index(self.filename, events, self.cache_dir)
+        self.assertEqual(n_reads, events.n_reads)
+
+
+class TestEventIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = EventIndex(build_index(Events(6)))
+
+    def test_find_trigger_counter(self):
+        self.assertEqual(1, self.index.find_trigger_counter(8))
+        self.assertEqual(5, self.index.find_trigger_counter(0))
+        with self.assertRaises(KeyError):
+            self.index.find_trigger_counter(3)
+
+    def test_find_time(self):
+        self.assertEqual(0, self.index.find_time(0))
+        self.assertEqual(1, self.index.find_time(1600000000.000001))
+        self.assertEqual(2, self.index.find_time(1600000001))
+        self.assertEqual(5, self.index.find_time(1700000000))
+
+    def test_select(self):
+        self.assertListEqual([3, 4, 5],
+                             list(self.index.select('n_hits >= 3')))
+        self.assertListEqual([2, 3],
+                             list(self.index.select('n_hits>1,n_hits<4')))
+        self.assertListEqual([2, 3],
+                             list(self.index.select('trigger_mask&0x2')))
+
+    def test_parse_cut(self):
+        self.assertEqual(2, len(parse_cut('n_hits>1, tot_sum<=100')))
+        for cut in ('n_hits', 'foo>1', 'n_hits>>1', 'n_hits>x'):
+            with self.assertRaises(ValueError):
+                parse_cut(cut)
@@ -0,0 +1,157 @@
+from __future__ import division, absolute_import, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from rainbowalga.__main__ import RainbowAlga
+from rainbowalga.generator import EventGenerator
+from rainbowalga.gui import Colourist
+from rainbowalga.index import (file_signature, write_index, SIDECAR_SUFFIX,
+                               INDEX_DTYPE)
+from rainbowalga.text import BitmapTextRenderer, PRINT_SCALE
+from rainbowalga.tools import Clock
+
+
+class ScreenshotRecorder(RainbowAlga):
+    """The viewer without OpenGL, recording the requested screenshots"""
+
+    def __init__(self, event_index=0, file_index=None):
+        self.event_index = event_index
+        self.file_index = file_index
+        self.min_tot = 20
+        self.clock = Clock()
+        self.clock.pause()
+        self.calibrated_hits = None
+        self.timeslices = None
+        self.screenshots = []
+
+    def save_screenshot(self, name='screenshot.png', wait=None):
+        self.screenshots.append(name)
+
+
+class TestScreenshotKey(unittest.TestCase):
+
+    def test_event_index(self):
+        app = ScreenshotRecorder(event_index=7)
+        app.keyboard(b's', 0, 0)
+        self.assertListEqual(["RA_Event7_ToTCut20_t0ns.png"], app.screenshots)
+
+    def test_trigger_counter_from_the_event_index(self):
+        file_index = np.zeros(3, dtype=[('trigger_counter', '<u8')])
+        file_index['trigger_counter'] = [100, 205, 310]
+        app = ScreenshotRecorder(event_index=1, file_index=file_index)
+        app.keyboard(b's', 0, 0)
+        self.assertListEqual(["RA_Event205_ToTCut20_t0ns.png"],
+                             app.screenshots)
+
+
+class PrintModeRecorder(RainbowAlga):
+    """The viewer without OpenGL, recording the loaded logos"""
+
+    def __init__(self):
+        self.colourist = Colourist()
+        self.text = BitmapTextRenderer()
+        self.logos_loaded = 0
+
+    def load_logo(self):
+        self.logos_loaded += 1
+
+
+class TestPrintModeKey(unittest.TestCase):
+
+    def test_text_scale(self):
+        app = PrintModeRecorder()
+        app.keyboard(b'm', 0, 0)
+        self.assertTrue(app.colourist.print_mode)
+        self.assertEqual(PRINT_SCALE, app.text.scale)
+        app.keyboard(b'm', 0, 0)
+        self.assertFalse(app.colourist.print_mode)
+        self.assertEqual(1, app.text.scale)
+        self.assertEqual(2, app.logos_loaded)
+
+
+class TrackRecorder(RainbowAlga):
+    """The viewer without OpenGL, only collecting the tracks"""
+
+    def __init__(self, synthetic_events=None):
+        self.colourist = Colourist()
+        self.synthetic_events = synthetic_events
+        self.show_secondaries = True
+        self.objects = {}
+
+
+class MCTracks(object):
+    def __init__(self, pdgid):
+        n = len(pdgid)
+        self.pdgid = pdgid
+        for name in ('pos_x', 'pos_y', 'pos_z', 'dir_x', 'dir_y', 't',
+                     'len', 'E'):
+            setattr(self, name, np.zeros(n))
+        self.dir_z = np.ones(n)
+
+
+class MCEvent(object):
+    def __init__(self, pdgid):
+        self.t_sec = self.t_ns = self.mc_t = 0
+        self.mc_tracks = MCTracks(pdgid)
+
+
+class TestCherenkovCones(unittest.TestCase):
+
+    def test_synthetic_muons(self):
+        generator = EventGenerator.from_spec('demo,muons=2,cascades=2')
+        for index in range(len(generator)):
+            tracks = generator.tracks(index)
+            if np.any(tracks['type'] == 13) and np.any(tracks['type'] == 11):
+                break
+        app = TrackRecorder(generator)
+        app.add_synthetic_tracks(index)
+        self.assertListEqual(list(tracks['type'] == 13),
+                             list(app.objects['mc_tracks'].cherenkov_cone))
+
+    def test_mc_muons(self):
+        app = TrackRecorder()
+        app.add_mc_tracks(MCEvent(np.array([13, 22, -13, 11, 0, 2212])))
+        self.assertListEqual([True, True, False, False],
+                             list(app.objects['mc_tracks'].cherenkov_cone))
+
+
+class IndexRecorder(RainbowAlga):
+    """The viewer without OpenGL and events"""
+
+    def __init__(self):
+        self.file_index = None
+
+
+class TestBackgroundIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'events.root')
+        with open(self.filename, 'wb') as fobj:
+            fobj.write(b'root')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_loads_the_sidecar(self):
+        table = np.zeros(4, dtype=INDEX_DTYPE)
+        table['trigger_counter'] = [10, 20, 30, 40]
+        write_index(self.filename + SIDECAR_SUFFIX, table,
+                    file_signature(self.filename))
+        app = IndexRecorder()
+        app.load_file_index_in_background(self.filename).join()
+        self.assertEqual(2, app.file_index.find_trigger_counter(30))
+
+    def test_unreadable_file(self):
+        app = IndexRecorder()
+        app.load_file_index_in_background(self.filename).join()
+        self.assertIsNone(app.file_index)
+
+
+if __name__ == '__main__':
+    unittest.main()
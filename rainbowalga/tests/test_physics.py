@@ -0,0 +1,164 @@
+from __future__ import division, absolute_import, print_function
+
+import unittest
+
+import numpy as np
+
+from rainbowalga import constants
+from rainbowalga.physics import (cherenkov_times, point_source_times,
+                                 time_residuals, TrackSet, track_bases,
+                                 transform)
+
+
+class TestCherenkovTimes(unittest.TestCase):
+
+    def test_pmt_on_track_axis(self):
+        t = cherenkov_times([[0, 0, 100]], [0, 0, 0], [0, 0, 1])
+        self.assertAlmostEqual(100 / constants.c * 1e9, t[0])
+
+    def test_track_time_is_added(self):
+        t0 = cherenkov_times([[0, 0, 100]], [0, 0, 0], [0, 0, 1])
+        t1 = cherenkov_times([[0, 0, 100]], [0, 0, 0], [0, 0, 1], 42)
+        self.assertAlmostEqual(42, t1[0] - t0[0])
+
+    def test_direction_is_normalised(self):
+        t0 = cherenkov_times([[10, 0, 100]], [0, 0, 0], [0, 0, 1])
+        t1 = cherenkov_times([[10, 0, 100]], [0, 0, 0], [0, 0, 5])
+        self.assertAlmostEqual(t0[0], t1[0])
+
+    def test_perpendicular_distance(self):
+        k = 20
+        theta = constants.theta_cherenkov_water_km3net
+        expected = ((50 - k / np.tan(theta)) / constants.c +
+                    k / np.sin(theta) / constants.c_water_km3net) * 1e9
+        t = cherenkov_times([[k, 0, 50], [0, k, 50]], [0, 0, 0], [0, 0, 1])
+        np.testing.assert_allclose([expected, expected], t)
+
+
+class TestPointSourceTimes(unittest.TestCase):
+
+    def test_times(self):
+        pmt_pos = np.array([[30, 40, 0], [0, 0, 10]])
+        t = point_source_times(pmt_pos, [0, 0, 0], 5)
+        expected = np.array([50, 10]) / constants.c_water_antares * 1e9 + 5
+        np.testing.assert_allclose(expected, t)
+
+
+class TestTimeResiduals(unittest.TestCase):
+
+    def test_point_source_hypothesis(self):
+        pmt_pos = np.array([[30, 40, 0]])
+        expected, residuals = time_residuals([300], pmt_pos, pos=[0, 0, 0])
+        np.testing.assert_allclose(point_source_times(pmt_pos, [0, 0, 0]),
+                                   expected)
+        np.testing.assert_allclose(300 - expected, residuals)
+
+    def test_track_hypothesis(self):
+        pmt_pos = np.array([[10, 0, 100], [0, 10, 20]])
+        expected, residuals = time_residuals([1, 2], pmt_pos, pos=[0, 0, 0],
+                                             dir=[0, 0, 1], time=3)
+        np.testing.assert_allclose(
+            cherenkov_times(pmt_pos, [0, 0, 0], [0, 0, 1], 3), expected)
+        np.testing.assert_allclose([1, 2] - expected, residuals)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestTrackSet(unittest.TestCase):
+
+    def test_extend_broadcasts(self):
+        tracks = TrackSet(color=(1, 0, 0), line_width=2)
+        indices = tracks.extend([[0, 0, 0], [1, 1, 1]], [0, 0, 1], 0, 1e9)
+        self.assertListEqual([0, 1], list(indices))
+        self.assertEqual(2, len(tracks))
+        self.assertEqual((2, 3), tracks.dir.shape)
+        self.assertListEqual([2, 2], list(tracks.line_width))
+        self.assertListEqual([1, 0, 0], list(tracks.color[1]))
+        indices = tracks.extend([5, 5, 5], [1, 0, 0], 10, 1e9, line_width=4)
+        self.assertListEqual([2], list(indices))
+        self.assertListEqual([2, 2, 4], list(tracks.line_width))
+
+    def test_particle_appears_and_grows(self):
+        tracks = TrackSet()
+        tracks.add_particles([0, 0, 0], [0, 0, 1], 100, speed=1e9)
+        indices, _, _ = tracks.segments(100)
+        self.assertEqual(0, len(indices))
+        _, starts, ends = tracks.segments(110)
+        self.assertListEqual([0, 0, -100], list(starts[0]))
+        self.assertListEqual([0, 0, 10], list(ends[0]))
+
+    def test_particle_length(self):
+        tracks = TrackSet()
+        tracks.add_particles([[0, 0, 0], [0, 0, 0]], [0, 0, 1], 0, speed=1e9,
+                             length=[5, 0])
+        _, _, ends = tracks.segments(20)
+        self.assertListEqual([5, 20], list(ends[:, 2]))
+
+    def test_neutrino_stops_at_vertex(self):
+        tracks = TrackSet()
+        tracks.add_neutrinos([0, 0, 0], [0, 0, 1])
+        _, starts, ends = tracks.segments(-1)
+        self.assertAlmostEqual(-1000, starts[0, 2])
+        self.assertAlmostEqual(-constants.c * 1e-9, ends[0, 2])
+        _, _, ends = tracks.segments(100)
+        self.assertListEqual([0, 0, 0], list(ends[0]))
+
+    def test_fit_starts_at_position(self):
+        tracks = TrackSet()
+        tracks.add_fits([1, 2, 3], [1, 0, 0], 10, speed=1e9)
+        self.assertEqual(0, len(tracks.segments(10)[0]))
+        _, starts, ends = tracks.segments(15)
+        self.assertListEqual([1, 2, 3], list(starts[0]))
+        self.assertListEqual([6, 2, 3], list(ends[0]))
+
+    def test_hidden_tracks_are_skipped(self):
+        tracks = TrackSet()
+        tracks.add_particles(np.zeros((3, 3)), [0, 0, 1], 0, hidden=True)
+        tracks.hidden[1] = False
+        indices, _, _ = tracks.segments(10)
+        self.assertListEqual([1], list(indices))
+
+    def test_vertices_grouped_by_line_width(self):
+        tracks = TrackSet(color=(0, 0, 1))
+        tracks.add_particles(np.zeros((4, 3)), [0, 0, 1], 0,
+                             line_width=[3, 1, 3, 1])
+        tracks.color[0] = (0, 1, 0)
+        vertices, colours, groups = tracks.vertices(10)
+        self.assertEqual((8, 3), vertices.shape)
+        self.assertEqual((8, 3), colours.shape)
+        self.assertListEqual([(1, 0, 4), (3, 4, 4)], groups)
+        self.assertListEqual([0, 1, 0], list(colours[4]))
+        self.assertListEqual([0, 1, 0], list(colours[5]))
+
+    def test_empty(self):
+        vertices, colours, groups = TrackSet().vertices(10)
+        self.assertEqual((0, 3), vertices.shape)
+        self.assertEqual([], groups)
+
+    def test_cones(self):
+        tracks = TrackSet()
+        tracks.add_particles(np.zeros((2, 3)), [[0, 0, 1], [1, 0, 0]], 0,
+                             speed=1e9, cherenkov_cone=[True, False])
+        bases, axes, heights = tracks.cones(10)
+        self.assertEqual((1, 3), bases.shape)
+        self.assertEqual((1, 3, 3), axes.shape)
+        self.assertAlmostEqual(10, heights[0])
+        self.assertListEqual([0, 0, 0], list(bases[0]))
+        self.assertListEqual([0, 0, 1], list(axes[0][:, 2]))
+
+
+class TestTrackBases(unittest.TestCase):
+
+    def test_matches_transform(self):
+        directions = np.random.RandomState(23).normal(size=(20, 3))
+        for direction, axes in zip(directions, track_bases(directions)):
+            self.assertTrue(np.allclose(transform(direction)[:3, :3].T, axes,
+                                        atol=1e-6))
+
+    def test_orthonormal(self):
+        axes = track_bases([[0, 0, 1], [1, 1, 0], [0, -3, 0]])
+        for basis in axes:
+            self.assertTrue(np.allclose(np.identity(3), basis.T.dot(basis)))
+        self.assertTrue(np.allclose([0, -1, 0], axes[2][:, 2]))
@@ -0,0 +1,94 @@
+from __future__ import division, absolute_import, print_function
+
+import unittest
+
+import numpy as np
+
+from rainbowalga.core import Vec3
+from rainbowalga.picking import mouse_ray, UniformGrid
+from rainbowalga.tools import Camera
+
+
+def brute_force_pick(points, origin, direction, radius):
+    vectors = points - origin
+    along = vectors.dot(direction)
+    off = np.linalg.norm(vectors - along[:, np.newaxis] * direction, axis=1)
+    hit = (along > 0) & (off <= radius)
+    if not np.any(hit):
+        return None
+    return np.flatnonzero(hit)[np.argmin(along[hit])]
+
+
+class TestMouseRay(unittest.TestCase):
+
+    def setUp(self):
+        self.camera = Camera(distance=10)
+        self.camera._pos = Vec3(1, 0, 0)
+
+    def test_center(self):
+        origin, direction = mouse_ray(self.camera, 399.5, 299.5, 800, 600)
+        self.assertTrue(np.allclose([10, 0, 0], origin))
+        self.assertTrue(np.allclose([-1, 0, 0], direction))
+
+    def test_edges(self):
+        tan = np.tan(np.radians(45) / 2)
+        _, direction = mouse_ray(self.camera, -0.5, -0.5, 800, 600)
+        expected = np.array([-1, -tan * 800 / 600, tan])
+        self.assertTrue(
+            np.allclose(expected / np.linalg.norm(expected), direction))
+        _, direction = mouse_ray(self.camera, 799.5, 599.5, 800, 600)
+        expected = np.array([-1, tan * 800 / 600, -tan])
+        self.assertTrue(
+            np.allclose(expected / np.linalg.norm(expected), direction))
+
+
+class TestUniformGrid(unittest.TestCase):
+
+    def setUp(self):
+        self.points = np.random.RandomState(5).uniform(-500, 500, (5000, 3))
+        self.grid = UniformGrid(self.points)
+
+    def test_query_ball(self):
+        for center, radius in (((0, 0, 0), 100), ((480, -490, 0), 60),
+                               ((2000, 0, 0), 100), ((0, 0, 0), 2000)):
+            distances = np.linalg.norm(self.points - center, axis=1)
+            self.assertListEqual(
+                list(np.flatnonzero(distances <= radius)),
+                list(self.grid.query_ball(center, radius)))
+
+    def test_query_box(self):
+        lower, upper = np.array([-100, 0, 200]), np.array([50, 120, 600])
+        inside = np.all((self.points >= lower) & (self.points <= upper),
+                        axis=1)
+        self.assertListEqual(list(np.flatnonzero(inside)),
+                             list(self.grid.query_box(lower, upper)))
+
+    def test_pick(self):
+        rnd = np.random.RandomState(7)
+        radius = rnd.uniform(1, 20, len(self.points))
+        for _ in range(20):
+            origin = rnd.uniform(-1000, 1000, 3)
+            direction = -origin / np.linalg.norm(origin)
+            self.assertEqual(
+                brute_force_pick(self.points, origin, direction, radius),
+                self.grid.pick(origin, direction, radius))
+
+    def test_pick_nearest_along_the_ray(self):
+        grid = UniformGrid([(0, 0, 0), (5, 0.5, 0), (10, 0, 0), (-5, 0, 0)])
+        self.assertEqual(2, grid.pick((20, 0, 0), (-1, 0, 0), 1))
+        self.assertEqual(1, grid.pick((20, 0, 0), (-1, 0, 0), 1,
+                                      mask=[True, True, False, True]))
+        self.assertEqual(0, grid.pick((20, 0, 0), (-1, 0, 0), 0.1,
+                                      mask=[True, True, False, True]))
+        self.assertIsNone(grid.pick((20, 0, 0), (1, 0, 0), 1))
+        self.assertIsNone(grid.pick((20, 10, 0), (-1, 0, 0), 1))
+
+    def test_empty(self):
+        grid = UniformGrid(np.zeros((0, 3)))
+        self.assertEqual(0, len(grid))
+        self.assertIsNone(grid.pick((0, 0, 0), (1, 0, 0), 1))
+        self.assertEqual(0, len(grid.query_ball((0, 0, 0), 10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+from __future__ import division, absolute_import, print_function
+
+import unittest
+import threading
+
+import numpy as np
+
+from rainbowalga.prefetch import LRUCache, EventPrefetcher
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_get_and_put(self):
+        cache = LRUCache()
+        cache.put(1, 'a')
+        self.assertEqual('a', cache.get(1))
+        self.assertIsNone(cache.get(2))
+
+    def test_hit_rate(self):
+        cache = LRUCache()
+        cache.put(1, 'a')
+        cache.get(1)
+        cache.get(1)
+        cache.get(2)
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(1, cache.misses)
+        self.assertAlmostEqual(2 / 3, cache.hit_rate)
+
+    def test_hit_rate_without_requests(self):
+        self.assertEqual(0, LRUCache().hit_rate)
+
+    def test_peek_does_not_count(self):
+        cache = LRUCache()
+        cache.put(1, 'a')
+        cache.peek(1)
+        cache.peek(2)
+        self.assertEqual(0, cache.hits + cache.misses)
+
+    def test_nbytes(self):
+        cache = LRUCache()
+        cache.put(1, np.zeros(10, dtype='u1'))
+        cache.put(2, (np.zeros(5, dtype='u1'), np.zeros(5, dtype='u1')))
+        self.assertEqual(20, cache.nbytes)
+        cache.put(1, np.zeros(1, dtype='u1'))
+        self.assertEqual(11, cache.nbytes)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(max_bytes=25)
+        cache.put(1, np.zeros(10, dtype='u1'))
+        cache.put(2, np.zeros(10, dtype='u1'))
+        cache.get(1)
+        cache.put(3, np.zeros(10, dtype='u1'))
+        self.assertIn(1, cache)
+        self.assertNotIn(2, cache)
+        self.assertIn(3, cache)
+        self.assertEqual(20, cache.nbytes)
+
+    def test_too_large_item_is_kept(self):
+        cache = LRUCache(max_bytes=5)
+        cache.put(1, np.zeros(10, dtype='u1'))
+        self.assertIn(1, cache)
+
+
+class TestEventPrefetcher(unittest.TestCase):
+
+    def loader(self, index):
+        return np.full(4, index)
+
+    def test_result(self):
+        prefetcher = EventPrefetcher(self.loader, 10)
+        self.assertListEqual([3] * 4, list(prefetcher.result(3)))
+
+    def test_result_out_of_range(self):
+        prefetcher = EventPrefetcher(self.loader, 10)
+        with self.assertRaises(IndexError):
+            prefetcher.result(10)
+        with self.assertRaises(IndexError):
+            prefetcher.result(-1)
+
+    def test_prefetch_loads_neighbours(self):
+        prefetcher = EventPrefetcher(self.loader, 10, depth=2)
+        prefetcher.result(5)
+        prefetcher.prefetch(5)
+        for index in (3, 4, 6, 7):
+            self.assertListEqual([index] * 4, list(prefetcher.result(index)))
+        self.assertNotIn(2, prefetcher.cache)
+        self.assertNotIn(8, prefetcher.cache)
+
+    def test_prefetch_stays_in_range(self):
+        prefetcher = EventPrefetcher(self.loader, 2, depth=3)
+        prefetcher.prefetch(0)
+        prefetcher.result(1)
+        self.assertEqual(1, len(prefetcher.cache))
+
+    def test_neighbours_of_a_selection(self):
+        prefetcher = EventPrefetcher(self.loader, 20, depth=2)
+        self.assertListEqual([6, 4, 7, 3], list(prefetcher.neighbours(5)))
+        prefetcher.selection = np.array([1, 4, 5, 9, 12])
+        self.assertListEqual([9, 4, 12, 1], list(prefetcher.neighbours(5)))
+        self.assertListEqual([9, 5, 12, 4], list(prefetcher.neighbours(7)))
+        self.assertListEqual([1, 4], list(prefetcher.neighbours(0)))
+
+    def test_request_and_peek(self):
+        release = threading.Event()
+
+        def loader(index):
+            release.wait()
+            return np.zeros(1)
+
+        prefetcher = EventPrefetcher(loader, 10)
+        self.assertFalse(prefetcher.request(1))
+        self.assertIsNone(prefetcher.peek(1))
+        self.assertTrue(prefetcher.is_pending(1))
+        release.set()
+        prefetcher.result(1)
+        self.assertIsNotNone(prefetcher.peek(1))
+        self.assertTrue(prefetcher.request(1))
+
+    def test_requested_event_survives_eviction(self):
+        # the cache holds a single event, the neighbours evict the request
+        prefetcher = EventPrefetcher(self.loader, 10, depth=2, max_bytes=40)
+        self.assertFalse(prefetcher.request(5))
+        prefetcher._submit(5).result()
+        prefetcher.prefetch(5)
+        for index in (3, 4, 6, 7):
+            prefetcher._submit(index).result()
+        self.assertNotIn(5, prefetcher.cache)
+        self.assertListEqual([5] * 4, list(prefetcher.peek(5)))
+
+    def test_peek_raises_loader_errors(self):
+        def loader(index):
+            raise ValueError("broken event")
+
+        prefetcher = EventPrefetcher(loader, 10)
+        prefetcher.request(1)
+        with self.assertRaises(ValueError):
+            prefetcher._submit(1).result()
+        with self.assertRaises(ValueError):
+            prefetcher.peek(1)
+        self.assertFalse(prefetcher.is_pending(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
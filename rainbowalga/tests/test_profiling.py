@@ -0,0 +1,146 @@
+from __future__ import division, absolute_import, print_function
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from rainbowalga.profiling import FrameProfiler, StartupProfiler
+
+
+def profile(profiler, durations):
+    for duration in durations:
+        profiler.start_frame()
+        profiler._record('hits', duration)
+        profiler.end_frame()
+
+
+class TestFrameProfiler(unittest.TestCase):
+
+    def test_stage_records_duration(self):
+        profiler = FrameProfiler()
+        profiler.start_frame()
+        with profiler.stage('detector'):
+            pass
+        with profiler.stage('gui'):
+            pass
+        profiler.end_frame()
+        self.assertEqual(['detector', 'gui'], profiler.stages)
+        self.assertEqual(1, len(profiler.samples('detector')))
+        self.assertEqual(1, profiler.n_frames)
+        self.assertEqual(1, len(profiler.samples('frame')))
+
+    def test_stage_records_on_exception(self):
+        profiler = FrameProfiler()
+        with self.assertRaises(ValueError):
+            with profiler.stage('hits'):
+                raise ValueError
+        self.assertEqual(1, len(profiler.samples('hits')))
+
+    def test_sync_calls_finish(self):
+        calls = []
+        profiler = FrameProfiler(finish=lambda: calls.append(1))
+        with profiler.stage('hits'):
+            pass
+        self.assertEqual([], calls)
+        profiler.sync = True
+        with profiler.stage('hits'):
+            pass
+        self.assertEqual([1], calls)
+
+    def test_rolling_window(self):
+        profiler = FrameProfiler(window=10)
+        profile(profiler, [1] * 5 + [0.001] * 10)
+        self.assertEqual(10, len(profiler.samples('hits')))
+        self.assertAlmostEqual(1, profiler.statistics('hits')['max'])
+
+    def test_percentiles(self):
+        profiler = FrameProfiler(window=1000)
+        profile(profiler, [i / 1000 for i in range(1, 101)])
+        stats = profiler.statistics('hits')
+        self.assertEqual(100, stats['n'])
+        self.assertAlmostEqual(50.5, stats['p50'])
+        self.assertAlmostEqual(95.05, stats['p95'])
+        self.assertAlmostEqual(99.01, stats['p99'])
+        self.assertAlmostEqual(100, stats['max'])
+
+    def test_statistics_of_unknown_stage(self):
+        self.assertEqual({'n': 0}, dict(FrameProfiler().statistics('swap')))
+
+    def test_reset(self):
+        profiler = FrameProfiler()
+        profile(profiler, [0.1])
+        profiler.reset()
+        self.assertEqual([], profiler.stages)
+        self.assertEqual(0, profiler.n_frames)
+
+    def test_overlay_text(self):
+        profiler = FrameProfiler()
+        profile(profiler, [0.002])
+        lines = profiler.overlay_text().split('\n')
+        self.assertEqual(3, len(lines))
+        self.assertTrue(lines[1].startswith('hits'))
+        self.assertIn('2.00', lines[1])
+
+
+class TestFrameProfilerDump(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_dump(self):
+        profiler = FrameProfiler()
+        profile(profiler, [0.001, 0.002, 0.003])
+        json_file, csv_file = profiler.dump(
+            os.path.join(self.tmp_dir, 'profile'))
+        with open(json_file) as fobj:
+            summary = json.load(fobj)
+        self.assertEqual(['hits', 'frame'], list(summary['stages']))
+        self.assertAlmostEqual(2, summary['stages']['hits']['p50'])
+        with open(csv_file) as fobj:
+            rows = list(csv.reader(fobj))
+        self.assertEqual(['stage', 'n', 'mean', 'p50', 'p95', 'p99', 'max'],
+                         rows[0])
+        self.assertEqual('hits', rows[1][0])
+        self.assertEqual('3', rows[1][1])
+
+
+class TestStartupProfiler(unittest.TestCase):
+
+    def test_stages(self):
+        profiler = StartupProfiler()
+        start = profiler.start
+        profiler.record('imports', start, start + 0.2)
+        thread = threading.Thread(
+            target=profiler.record,
+            args=('detector', start + 0.2, start + 0.3))
+        thread.start()
+        thread.join()
+        self.assertEqual(['imports', 'detector'],
+                         [stage[0] for stage in profiler.stages])
+        self.assertEqual(['main', 'background'],
+                         [stage[1] for stage in profiler.stages])
+        _, _, start_ms, duration_ms = profiler.stages[1]
+        self.assertAlmostEqual(200, start_ms)
+        self.assertAlmostEqual(100, duration_ms)
+
+    def test_stage(self):
+        profiler = StartupProfiler()
+        with profiler.stage('shaders'):
+            time.sleep(0.01)
+        self.assertGreaterEqual(profiler.stages[0][3], 10)
+
+    def test_first_frame(self):
+        profiler = StartupProfiler()
+        self.assertIsNone(profiler.time_to_first_frame)
+        self.assertTrue(profiler.end())
+        self.assertFalse(profiler.end())
+        self.assertGreaterEqual(profiler.time_to_first_frame, 0)
+        self.assertIn('first frame done', profiler.report())
@@ -0,0 +1,140 @@
+from __future__ import division, absolute_import, print_function
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from rainbowalga.recording import (rgb_to_yuv444, ImageSequenceWriter,
+                                   RawWriter, Y4MWriter, ArrayWriter,
+                                   FrameQueue, make_writer)
+
+
+def frame(value, width=4, height=2):
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+
+class TestRGBToYUV(unittest.TestCase):
+
+    def test_black_and_white(self):
+        yuv = rgb_to_yuv444(np.array([[[0, 0, 0], [255, 255, 255]]],
+                                     dtype=np.uint8))
+        self.assertEqual((3, 1, 2), yuv.shape)
+        self.assertEqual([16, 235], list(yuv[0, 0]))
+        self.assertEqual([128, 128], list(yuv[1, 0]))
+        self.assertEqual([128, 128], list(yuv[2, 0]))
+
+
+class TestWriters(unittest.TestCase):
+
+    def test_raw_writer(self):
+        stream = io.BytesIO()
+        writer = RawWriter(stream)
+        writer.write(frame(1))
+        writer.write(frame(2))
+        self.assertEqual(2 * 4 * 2 * 3, len(stream.getvalue()))
+
+    def test_y4m_writer(self):
+        stream = io.BytesIO()
+        writer = Y4MWriter(stream, fps=25)
+        writer.write(frame(1))
+        writer.write(frame(2))
+        header = b"YUV4MPEG2 W4 H2 F25:1 Ip A1:1 C444\n"
+        data = stream.getvalue()
+        self.assertTrue(data.startswith(header))
+        self.assertEqual(len(header) + 2 * (6 + 4 * 2 * 3), len(data))
+        self.assertEqual(2, data.count(b"FRAME\n"))
+
+    def test_y4m_writer_rejects_size_change(self):
+        writer = Y4MWriter(io.BytesIO())
+        writer.write(frame(1))
+        with self.assertRaises(ValueError):
+            writer.write(frame(1, width=8))
+
+    def test_array_writer_keeps_most_recent(self):
+        writer = ArrayWriter(max_frames=2)
+        for value in range(3):
+            writer.write(frame(value))
+        self.assertEqual(3, writer.n_frames)
+        self.assertEqual([1, 2], list(writer.as_array()[:, 0, 0, 0]))
+
+
+class TestImageSequenceWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_pattern_and_explicit_filename(self):
+        from PIL import Image
+        pattern = os.path.join(self.tmp_dir, "frame_{0:02d}.png")
+        writer = ImageSequenceWriter(pattern)
+        writer.write(frame(7))
+        filename = os.path.join(self.tmp_dir, "shot.png")
+        writer.write(frame(9), filename)
+        image = np.array(Image.open(pattern.format(1)))
+        self.assertEqual((2, 4, 3), image.shape)
+        self.assertEqual(7, image[0, 0, 0])
+        self.assertTrue(os.path.exists(filename))
+
+    def test_make_writer(self):
+        self.assertIsInstance(make_writer("Frame_{0:05d}.jpg"),
+                              ImageSequenceWriter)
+        writer = make_writer(os.path.join(self.tmp_dir, "movie.y4m"))
+        self.assertIsInstance(writer, Y4MWriter)
+        writer.stream.close()
+
+
+class SlowWriter(ArrayWriter):
+    def __init__(self):
+        super(SlowWriter, self).__init__()
+        self.go = threading.Event()
+
+    def write(self, frame, filename=None):
+        self.go.wait()
+        super(SlowWriter, self).write(frame, filename)
+
+
+class TestFrameQueue(unittest.TestCase):
+
+    def test_frames_are_flipped_and_written(self):
+        writer = ArrayWriter()
+        frames = FrameQueue(writer)
+        bottom_up = np.arange(2 * 1 * 3, dtype=np.uint8).reshape(2, 1, 3)
+        self.assertTrue(frames.submit(bottom_up))
+        frames.close()
+        self.assertEqual(1, frames.n_written)
+        self.assertTrue(np.array_equal(bottom_up[::-1], writer.frames[0]))
+        self.assertFalse(frames.is_alive)
+
+    def test_frames_are_dropped_when_full(self):
+        writer = SlowWriter()
+        frames = FrameQueue(writer, max_size=2)
+        results = [frames.submit(frame(i)) for i in range(6)]
+        self.assertFalse(all(results))
+        self.assertEqual(results.count(False), frames.n_dropped)
+        writer.go.set()
+        frames.close()
+        self.assertEqual(6, frames.n_written + frames.n_dropped)
+        self.assertEqual(frames.n_written, writer.n_frames)
+
+    def test_failing_writer_does_not_stop_the_thread(self):
+        class FailingWriter(ArrayWriter):
+            def write(self, frame, filename=None):
+                if frame[0, 0, 0] == 1:
+                    raise IOError("disk full")
+                super(FailingWriter, self).write(frame, filename)
+
+        writer = FailingWriter()
+        frames = FrameQueue(writer)
+        for value in range(3):
+            frames.submit(frame(value))
+        frames.close()
+        self.assertEqual(1, frames.n_failed)
+        self.assertEqual(2, frames.n_written)
@@ -0,0 +1,121 @@
+from __future__ import division, absolute_import, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from rainbowalga.scan import (flatten, event_features, dom_du_lookup,
+                              open_file, read_candidates, scan_files, Scanner,
+                              EventChunk)
+
+
+class FakeFile(object):
+    """Event i has i hits on DOMs 1..i with ToT 10 * j, every second hit
+    is triggered"""
+
+    def __init__(self, filename):
+        self.n_events = int(os.path.basename(filename).split('.')[0])
+
+    def __len__(self):
+        return self.n_events
+
+    def read(self, start, stop):
+        rows = range(start, stop)
+        counts = np.array([i for i in rows], dtype=np.int64)
+        dom_id = np.concatenate([np.arange(1, i + 1) for i in rows] + [[]])
+        tot = dom_id * 10
+        return EventChunk(start, counts, dom_id, tot, counts // 2,
+                          np.arange(start, stop) + 1000)
+
+
+def chunk(counts, dom_id, tot, n_triggered_hits=None):
+    counts = np.array(counts)
+    if n_triggered_hits is None:
+        n_triggered_hits = np.zeros(len(counts), dtype=int)
+    return EventChunk(10, counts, np.array(dom_id), np.array(tot),
+                      np.array(n_triggered_hits), np.arange(len(counts)))
+
+
+class TestFlatten(unittest.TestCase):
+
+    def test_flatten(self):
+        counts, values = flatten([np.array([1, 2]), np.array([]),
+                                  np.array([3])])
+        self.assertListEqual([2, 0, 1], list(counts))
+        self.assertListEqual([1, 2, 3], list(values))
+
+
+class TestEventFeatures(unittest.TestCase):
+
+    def test_features(self):
+        doms = np.array([(1, 1), (2, 1), (3, 2)],
+                        dtype=[('dom_id', '<i4'), ('du', 'u2')])
+        features = event_features(
+            chunk([3, 0, 4], [1, 1, 2, 1, 2, 3, 9], [40, 50, 60, 20, 50, 50,
+                                                     50], [3, 0, 1]),
+            min_tot=30, dom_du=dom_du_lookup(doms))
+        self.assertListEqual([10, 11, 12], list(features['index']))
+        self.assertListEqual([3, 0, 3], list(features['n_hits']))
+        self.assertListEqual([2, 0, 3], list(features['n_doms']))
+        self.assertListEqual([1, 0, 2], list(features['n_dus']))
+        self.assertListEqual([1, 0, 0.25],
+                             list(features['triggered_fraction']))
+
+    def test_without_hits(self):
+        features = event_features(chunk([0, 0], [], []), min_tot=30)
+        self.assertListEqual([0, 0], list(features['n_hits']))
+        self.assertListEqual([0, 0], list(features['n_doms']))
+
+
+class TestScan(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.output = os.path.join(self.tmpdir, 'candidates.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_scanner(self):
+        scanner = Scanner('n_hits>=3', min_tot=15, opener=FakeFile)
+        features = scanner.scan('10.root', 0, 10)
+        self.assertListEqual([4, 5, 6, 7, 8, 9], list(features['index']))
+        self.assertListEqual([1004, 1005, 1006, 1007, 1008, 1009],
+                             list(features['trigger_counter']))
+
+    def test_invalid_cut(self):
+        with self.assertRaises(ValueError):
+            Scanner('foo>3', opener=FakeFile)
+
+    def test_n_dus_cut_needs_a_detector(self):
+        with self.assertRaises(ValueError):
+            Scanner('n_doms>3,n_dus>=2', opener=FakeFile)
+        with self.assertRaises(ValueError):
+            scan_files(['10.root'], 'n_dus>=2', self.output, jobs=1,
+                       opener=FakeFile)
+
+    def test_offline_files_are_refused(self):
+        import uproot
+        filename = os.path.join(self.tmpdir, 'offline.root')
+        with uproot.recreate(filename) as fobj:
+            fobj['E'] = {'id': np.arange(3)}
+        with self.assertRaises(ValueError):
+            open_file(filename)
+
+    def scan(self, jobs):
+        n = scan_files(['10.root', '7.root'], 'n_doms>=5', self.output,
+                       jobs=jobs, chunk_size=3, opener=FakeFile)
+        self.assertEqual(5 + 2, n)
+        candidates = read_candidates(self.output)
+        self.assertListEqual(['10.root', '7.root'], list(candidates))
+        self.assertListEqual([5, 6, 7, 8, 9], candidates['10.root'])
+        self.assertListEqual([5, 6], candidates['7.root'])
+
+    def test_scan_in_process(self):
+        self.scan(jobs=1)
+
+    def test_scan_with_processes(self):
+        self.scan(jobs=2)
@@ -0,0 +1,183 @@
+from __future__ import division, absolute_import, print_function
+
+import time
+import unittest
+
+import numpy as np
+
+from rainbowalga.stream import (decode_event, encode_event, parse_policy,
+                                EveryNth, TriggerFilter, EventQueue,
+                                EventStream, StandInDispatcher,
+                                SNAPSHOT_HIT_DTYPE)
+
+
+def make_hits(n, seed=0):
+    rnd = np.random.RandomState(seed)
+    hits = np.zeros(n, dtype=SNAPSHOT_HIT_DTYPE)
+    hits['dom_id'] = rnd.randint(800000000, 810000000, n)
+    hits['channel_id'] = rnd.randint(0, 31, n)
+    hits['time'] = rnd.randint(0, 100000, n)
+    hits['tot'] = rnd.randint(1, 255, n)
+    return hits
+
+
+def wait_for(condition, timeout=5):
+    end = time.time() + timeout
+    while not condition():
+        if time.time() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestEventCodec(unittest.TestCase):
+
+    def test_round_trip(self):
+        hits = make_hits(10)
+        data = encode_event(hits, hits[:3], trigger_counter=23,
+                            trigger_mask=4, run=42, frame_index=5)
+        event = decode_event(data)
+        self.assertEqual(23, event.trigger_counter)
+        self.assertEqual(4, event.trigger_mask)
+        self.assertEqual(42, event.header.run)
+        self.assertEqual(5, event.header.time_slice)
+        self.assertEqual(3, event.n_triggered_hits)
+        self.assertEqual(10, event.n_snapshot_hits)
+        for field in ('dom_id', 'channel_id', 'time', 'tot'):
+            self.assertListEqual(list(hits[field]),
+                                 list(event.snapshot_hits[field]))
+
+    def test_wrong_data_type(self):
+        data = bytearray(encode_event(make_hits(1)))
+        data[4:8] = b'\x00\x00\x00\x00'
+        with self.assertRaises(ValueError):
+            decode_event(bytes(data))
+
+
+class Event(object):
+    def __init__(self, trigger_mask=0):
+        self.trigger_mask = trigger_mask
+
+
+class TestPolicies(unittest.TestCase):
+
+    def test_every_nth(self):
+        select = EveryNth(3)
+        self.assertListEqual([True, False, False, True, False],
+                             [select(Event()) for _ in range(5)])
+
+    def test_trigger_filter(self):
+        select = TriggerFilter(0b110)
+        self.assertTrue(select(Event(0b010)))
+        self.assertFalse(select(Event(0b001)))
+
+    def test_parse_policy(self):
+        self.assertEqual((None, 1), parse_policy('latest'))
+        select, size = parse_policy('nth:10')
+        self.assertEqual(10, select.n)
+        self.assertIsNone(size)
+        select, _ = parse_policy('trigger:0x10')
+        self.assertEqual(16, select.mask)
+        for policy in ('nth', 'foo', 'latest:2', 'nth:0'):
+            with self.assertRaises(ValueError):
+                parse_policy(policy)
+
+
+class TestEventQueue(unittest.TestCase):
+
+    def test_drops_oldest(self):
+        queue = EventQueue(2)
+        self.assertTrue(queue.put(1))
+        self.assertTrue(queue.put(2))
+        self.assertFalse(queue.put(3))
+        self.assertEqual(1, queue.n_dropped)
+        self.assertEqual(2, queue.get())
+        self.assertEqual(3, queue.get())
+        self.assertIsNone(queue.get())
+
+
+class TestEventStream(unittest.TestCase):
+
+    def stream(self, payloads, **kwargs):
+        dispatcher = StandInDispatcher(payloads).start()
+        self.addCleanup(dispatcher.stop)
+        stream = EventStream(dispatcher.host, dispatcher.port,
+                             timeout=0.05, **kwargs).start()
+        self.addCleanup(stream.stop)
+        return stream
+
+    def test_receives_and_prepares(self):
+        payloads = [encode_event(make_hits(5, i), trigger_counter=i)
+                    for i in range(5)]
+        stream = self.stream(payloads, prepare=lambda e: e.n_snapshot_hits,
+                             policy='nth:1')
+        self.assertTrue(wait_for(lambda: stream.n_received == 5))
+        items = [stream.get() for _ in range(5)]
+        self.assertListEqual([0, 1, 2, 3, 4],
+                             [e.trigger_counter for e, _ in items])
+        self.assertListEqual([5] * 5, [n for _, n in items])
+        self.assertIsNone(stream.get())
+        self.assertEqual(5, stream.n_delivered)
+
+    def test_latest_keeps_only_the_last_event(self):
+        payloads = [encode_event(make_hits(1), trigger_counter=i)
+                    for i in range(20)]
+        stream = self.stream(payloads, policy='latest')
+        self.assertTrue(wait_for(lambda: stream.n_received == 20))
+        event, _ = stream.get()
+        self.assertEqual(19, event.trigger_counter)
+        self.assertIsNone(stream.get())
+        self.assertEqual(19, stream.queue.n_dropped)
+
+    def test_only_delivered_events_are_prepared(self):
+        prepared = []
+
+        def prepare(event):
+            prepared.append(event.trigger_counter)
+            return event.trigger_counter
+
+        payloads = [encode_event(make_hits(1), trigger_counter=i)
+                    for i in range(20)]
+        stream = self.stream(payloads, prepare=prepare, policy='latest')
+        self.assertTrue(wait_for(lambda: stream.n_received == 20))
+        self.assertListEqual([], prepared)
+        self.assertEqual(19, stream.get()[1])
+        self.assertListEqual([19], prepared)
+
+    def test_events_which_cannot_be_prepared_are_skipped(self):
+        def prepare(event):
+            if event.trigger_counter == 0:
+                raise ValueError("unknown DOM")
+            return event.trigger_counter
+
+        payloads = [encode_event(make_hits(1), trigger_counter=i)
+                    for i in range(2)]
+        stream = self.stream(payloads, prepare=prepare, policy='nth:1')
+        self.assertTrue(wait_for(lambda: stream.n_received == 2))
+        self.assertEqual(1, stream.get()[1])
+        self.assertEqual(1, stream.n_failed)
+        self.assertEqual(1, stream.n_delivered)
+
+    def test_selection(self):
+        payloads = [encode_event(make_hits(1), trigger_counter=i,
+                                 trigger_mask=1 << (i % 2))
+                    for i in range(10)]
+        stream = self.stream(payloads, policy='trigger:2', max_size=100)
+        self.assertTrue(wait_for(lambda: stream.n_received == 10))
+        self.assertEqual(5, stream.n_selected)
+        self.assertEqual(1, stream.get()[0].trigger_counter)
+
+    def test_corrupt_events_are_skipped(self):
+        payloads = [b'garbage', encode_event(make_hits(1), trigger_counter=1)]
+        stream = self.stream(payloads)
+        self.assertTrue(wait_for(lambda: stream.n_received == 2))
+        self.assertEqual(1, stream.n_failed)
+        self.assertEqual(1, stream.get()[0].trigger_counter)
+
+    def test_stop_without_dispatcher(self):
+        stream = EventStream('127.0.0.1', 1, timeout=0.05,
+                             reconnect_interval=0.05).start()
+        time.sleep(0.1)
+        stream.stop()
+        self.assertFalse(stream.is_alive)
+        self.assertFalse(stream.is_connected)
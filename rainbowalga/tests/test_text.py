@@ -0,0 +1,111 @@
+from __future__ import division, absolute_import, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from rainbowalga.text import (find_font, GlyphAtlas, VERTEX_SIZE,
+                              create_text_renderer, BitmapTextRenderer,
+                              TextRenderer)
+
+try:
+    import freetype  # noqa
+except ImportError:
+    HAS_FREETYPE = False
+else:
+    HAS_FREETYPE = True
+
+FONT = find_font()
+
+
+class TestFindFont(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self._env = os.environ.pop('RAINBOWALGA_FONT', None)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        os.environ.pop('RAINBOWALGA_FONT', None)
+        if self._env is not None:
+            os.environ['RAINBOWALGA_FONT'] = self._env
+
+    def test_font_in_subdirectory(self):
+        sub_dir = os.path.join(self.tmp_dir, 'truetype', 'mono')
+        os.makedirs(sub_dir)
+        font_file = os.path.join(sub_dir, 'Mono.ttf')
+        open(font_file, 'w').close()
+        self.assertEqual(font_file, find_font(('Mono.ttf', ),
+                                              (self.tmp_dir, )))
+
+    def test_no_font(self):
+        self.assertIsNone(find_font(('Mono.ttf', ), (self.tmp_dir, )))
+
+    def test_environment_variable(self):
+        font_file = os.path.join(self.tmp_dir, 'Custom.ttf')
+        open(font_file, 'w').close()
+        os.environ['RAINBOWALGA_FONT'] = font_file
+        self.assertEqual(font_file, find_font(('Mono.ttf', ),
+                                              (self.tmp_dir, )))
+
+    def test_fallback_without_font(self):
+        renderer = create_text_renderer(
+            os.path.join(self.tmp_dir, 'nonexistent.ttf'))
+        self.assertIsInstance(renderer, BitmapTextRenderer)
+
+
+@unittest.skipIf(not HAS_FREETYPE or FONT is None,
+                 "freetype-py or a monospaced font is not available")
+class TestGlyphAtlas(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.atlas = GlyphAtlas(FONT, 13)
+
+    def test_atlas_image(self):
+        height, width = self.atlas.image.shape
+        self.assertEqual(0, height & (height - 1))  # power of two
+        self.assertTrue(self.atlas.image.any())
+
+    def test_layout_one_quad_per_visible_glyph(self):
+        vertices = self.atlas.layout("a b")
+        self.assertEqual((2 * 4, VERTEX_SIZE), vertices.shape)
+
+    def test_monospaced_advance(self):
+        a = self.atlas.layout("ab")
+        b = self.atlas.layout("bb")
+        self.assertAlmostEqual(a[4, 0], b[4, 0])
+
+    def test_new_line_moves_down(self):
+        single = self.atlas.layout("x")
+        double = self.atlas.layout("x\nx", line_height=20)
+        self.assertTrue(np.allclose(single[:, 0], double[4:, 0]))
+        self.assertTrue(np.allclose(single[:, 1] - 20, double[4:, 1]))
+
+    def test_texture_coordinates_in_range(self):
+        vertices = self.atlas.layout("Hello, World!")
+        self.assertTrue(np.all(vertices[:, 2:] >= 0))
+        self.assertTrue(np.all(vertices[:, 2:] <= 1))
+
+    def test_unknown_characters_use_fallback(self):
+        self.assertEqual(4, len(self.atlas.layout(u"☃")))
+
+    def test_empty_text(self):
+        self.assertEqual((0, VERTEX_SIZE), self.atlas.layout("").shape)
+
+
+@unittest.skipIf(not HAS_FREETYPE or FONT is None,
+                 "freetype-py or a monospaced font is not available")
+class TestTextRenderer(unittest.TestCase):
+
+    def test_scale_rasterises_a_larger_atlas(self):
+        renderer = TextRenderer(FONT, size=13)
+        renderer.scale = 1.5
+        self.assertEqual(20, renderer.atlas.size)
+        self.assertGreater(renderer.atlas.layout("x")[:, 0].max(),
+                           GlyphAtlas(FONT, 13).layout("x")[:, 0].max())
+        renderer.scale = 1
+        self.assertEqual(13, renderer.atlas.size)
@@ -0,0 +1,142 @@
+from __future__ import division, absolute_import, print_function
+
+import time
+import unittest
+
+import numpy as np
+
+from rainbowalga.calibration import HITS_DTYPE
+from rainbowalga.timeslice import (decode_frames, HitRing, TimesliceLoader,
+                                   TIMESLICE_DURATION)
+
+FRAME_DTYPE = np.dtype([('pmt', 'u1'), ('tdc', '<u4'), ('tot', 'u1')])
+
+
+def make_hits(times):
+    hits = np.zeros(len(times), dtype=HITS_DTYPE).view(np.recarray)
+    hits.time = times
+    return hits
+
+
+def calibrate(dom_id, channel_id, time, tot):
+    hits = make_hits(time)
+    hits.dom_id = dom_id
+    hits.channel_id = channel_id
+    hits.tot = tot
+    return hits[np.argsort(hits.time, kind='stable')]
+
+
+class FakeTimeslices(object):
+    """Timeslice i has 10 hits on DOM i, 10 ms apart"""
+
+    def __init__(self, n_timeslices):
+        self.n_timeslices = n_timeslices
+        self.read_indices = []
+
+    def __len__(self):
+        return self.n_timeslices
+
+    def read(self, index):
+        self.read_indices.append(index)
+        frame = np.zeros(10, dtype=FRAME_DTYPE)
+        frame['tdc'] = np.arange(10) * 1e7
+        frame['tot'] = 20
+        return decode_frames({index: frame}, index)
+
+
+class TestDecodeFrames(unittest.TestCase):
+
+    def test_decode(self):
+        frames = {
+            1: np.array([(3, 100, 20), (4, 50, 30)], dtype=FRAME_DTYPE),
+            2: np.array([(5, 10, 40)], dtype=FRAME_DTYPE),
+        }
+        dom_id, channel_id, times, tot = decode_frames(frames, 2)
+        self.assertListEqual([1, 1, 2], list(dom_id))
+        self.assertListEqual([3, 4, 5], list(channel_id))
+        self.assertListEqual([2e8 + 100, 2e8 + 50, 2e8 + 10], list(times))
+        self.assertListEqual([20, 30, 40], list(tot))
+
+    def test_empty(self):
+        self.assertTrue(all(len(a) == 0 for a in decode_frames({}, 0)))
+
+
+class TestHitRing(unittest.TestCase):
+
+    def test_window(self):
+        ring = HitRing(10)
+        ring.append(make_hits([1, 2, 3]))
+        ring.append(make_hits([4, 5]))
+        self.assertEqual(5, len(ring))
+        self.assertListEqual([2, 3, 4], list(ring.window(2, 5).time))
+        self.assertEqual((1, 5), ring.time_range)
+
+    def test_overwrites_the_oldest_hits(self):
+        ring = HitRing(4)
+        ring.append(make_hits([1, 2, 3]))
+        self.assertEqual(2, ring.append(make_hits([4, 5, 6])))
+        self.assertEqual(4, len(ring))
+        self.assertListEqual([3, 4, 5, 6], list(ring.window(0, 10).time))
+        self.assertListEqual([5], list(ring.window(4.5, 5.5).time))
+        self.assertEqual(5, ring.append(make_hits([7, 8, 9, 10, 11])))
+        self.assertListEqual([8, 9, 10, 11], list(ring.window(0, 20).time))
+        self.assertEqual(7, ring.n_dropped)
+
+    def test_clear(self):
+        ring = HitRing(4)
+        ring.append(make_hits([1, 2]))
+        ring.clear()
+        self.assertEqual(0, len(ring))
+        self.assertIsNone(ring.time_range)
+        self.assertEqual(0, len(ring.window(0, 10)))
+
+
+class TestTimesliceLoader(unittest.TestCase):
+
+    def wait_for(self, loader, n_decoded):
+        for _ in range(200):
+            if loader.n_decoded >= n_decoded:
+                return
+            time.sleep(0.01)
+        self.fail("Timeslices not decoded")
+
+    def test_follows_the_playhead(self):
+        source = FakeTimeslices(100)
+        loader = TimesliceLoader(source, calibrate, capacity=50).start()
+        self.addCleanup(loader.stop)
+        self.wait_for(loader, 2)
+        time.sleep(0.05)
+        self.assertEqual(2, loader.n_decoded)  # only one slice ahead
+        hits = loader.window(0, 0.5 * TIMESLICE_DURATION)
+        self.assertListEqual([0] * 5, list(hits.dom_id))
+
+        loader.set_time(2.5 * TIMESLICE_DURATION)
+        self.wait_for(loader, 4)
+        hits = loader.window(1.5 * TIMESLICE_DURATION,
+                             2.5 * TIMESLICE_DURATION)
+        self.assertListEqual([1] * 5 + [2] * 5, list(hits.dom_id))
+        self.assertListEqual([0, 1, 2, 3], source.read_indices)
+
+    def test_seek_keeps_the_memory_constant(self):
+        source = FakeTimeslices(10000)
+        loader = TimesliceLoader(source, calibrate, capacity=25)
+        nbytes = loader.ring.nbytes
+        loader.set_time(5000.5 * TIMESLICE_DURATION, TIMESLICE_DURATION)
+        loader.start()
+        self.addCleanup(loader.stop)
+        self.wait_for(loader, 3)
+        for index in (5001, 5002, 5003):
+            loader.set_time(index * TIMESLICE_DURATION)
+            self.wait_for(loader, index - 4997)
+        self.assertListEqual(list(range(4999, 5005)), source.read_indices)
+        hits = loader.window(0, 1e20)
+        self.assertEqual(25, len(hits))
+        self.assertEqual(nbytes, loader.ring.nbytes)
+        self.assertGreater(loader.ring.n_dropped, 0)
+        loader.set_time(10 * TIMESLICE_DURATION)
+        self.wait_for(loader, loader.n_decoded + 1)
+        self.assertIn(10, source.read_indices)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,344 @@
+# coding=utf-8
+# Filename: text.py
+"""
+Retained-mode text rendering.
+
+The printable ASCII glyphs are rasterised once with freetype into an alpha
+texture (the glyph atlas). Each string is laid out into a vertex buffer of
+textured quads, which is cached as long as the string does not change, so
+drawing a (multi-line) text is a single ``glDrawArrays`` call.
+
+The glyphs are anti-aliased and tinted with the current colour, so they
+look clean on the white print mode background, and a scaled atlas is
+rasterised at the target size instead of being stretched. Without
+freetype or a usable font, the GLUT bitmap font is used.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+from collections import OrderedDict
+import os
+
+import numpy as np
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+FONT_SIZE = 13
+LINE_HEIGHT = 17
+PRINT_SCALE = 1.5
+ATLAS_WIDTH = 512
+CHARACTERS = ''.join(chr(i) for i in range(32, 127))
+
+FONT_NAMES = ('DejaVuSansMono.ttf', 'LiberationMono-Regular.ttf',
+              'Menlo.ttc', 'consola.ttf', 'Courier New.ttf')
+FONT_DIRS = ('/usr/share/fonts', '/usr/local/share/fonts',
+             os.path.expanduser('~/.fonts'),
+             os.path.expanduser('~/.local/share/fonts'),
+             '/Library/Fonts', '/System/Library/Fonts',
+             'C:\\Windows\\Fonts')
+
+# x, y, u, v
+VERTEX_SIZE = 4
+STRIDE = VERTEX_SIZE * 4
+
+
+def find_font(font_names=FONT_NAMES, font_dirs=FONT_DIRS):
+    """Return the path of a monospaced font or None.
+
+    The environment variable ``RAINBOWALGA_FONT`` takes precedence.
+    """
+    font = os.environ.get('RAINBOWALGA_FONT')
+    if font:
+        if os.path.exists(font):
+            return font
+        log.warning("Font '{0}' (RAINBOWALGA_FONT) not found".format(font))
+    for font_dir in font_dirs:
+        if not os.path.isdir(font_dir):
+            continue
+        for root, _, files in os.walk(font_dir):
+            for name in font_names:
+                if name in files:
+                    return os.path.join(root, name)
+
+
+class Glyph(object):
+    """Metrics (in pixels) and atlas coordinates of a glyph."""
+    __slots__ = ('advance', 'left', 'top', 'width', 'height', 'u0', 'v0',
+                 'u1', 'v1')
+
+    def __init__(self, advance, left, top, width, height, u0, v0, u1, v1):
+        self.advance = advance
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.u0 = u0
+        self.v0 = v0
+        self.u1 = u1
+        self.v1 = v1
+
+
+class GlyphAtlas(object):
+    """The glyphs of a font rasterised into a single alpha image.
+
+    :param str font_file: Path to a TrueType/OpenType font
+    :param int size: Font size in pixels
+
+    """
+
+    def __init__(self, font_file, size=FONT_SIZE, characters=CHARACTERS):
+        import freetype
+
+        self.font_file = font_file
+        self.size = size
+        self._texture = None
+
+        face = freetype.Face(font_file)
+        face.set_pixel_sizes(0, size)
+        bitmaps = {}
+        for character in characters:
+            face.load_char(character, freetype.FT_LOAD_RENDER)
+            slot = face.glyph
+            bitmap = slot.bitmap
+            rows = np.array(bitmap.buffer, dtype=np.uint8)
+            if bitmap.rows and bitmap.width:
+                rows = rows.reshape(bitmap.rows, bitmap.pitch)
+                rows = rows[:, :bitmap.width]
+            else:
+                rows = np.zeros((0, 0), dtype=np.uint8)
+            bitmaps[character] = (rows, slot.advance.x / 64, slot.bitmap_left,
+                                  slot.bitmap_top)
+
+        # Shelf packing, one pixel padding to avoid bleeding
+        positions = {}
+        x = y = shelf_height = 0
+        for character, (rows, _, _, _) in bitmaps.items():
+            height, width = rows.shape
+            if x + width + 1 > ATLAS_WIDTH:
+                x = 0
+                y += shelf_height + 1
+                shelf_height = 0
+            positions[character] = (x, y)
+            x += width + 1
+            shelf_height = max(shelf_height, height)
+        atlas_height = 1
+        while atlas_height < y + shelf_height + 1:
+            atlas_height *= 2
+
+        self.image = np.zeros((atlas_height, ATLAS_WIDTH), dtype=np.uint8)
+        self.glyphs = {}
+        for character, (rows, advance, left, top) in bitmaps.items():
+            height, width = rows.shape
+            x, y = positions[character]
+            self.image[y:y + height, x:x + width] = rows
+            self.glyphs[character] = Glyph(
+                advance, left, top, width, height, x / ATLAS_WIDTH,
+                y / atlas_height, (x + width) / ATLAS_WIDTH,
+                (y + height) / atlas_height)
+        self.fallback = self.glyphs.get('?')
+
+    def layout(self, text, line_height=LINE_HEIGHT):
+        """Quads of the text as (x, y, u, v) vertices, four per glyph.
+
+        The origin is the baseline of the first line, y points upwards and
+        each new line is ``line_height`` pixels lower.
+        """
+        quads = []
+        pen_x = pen_y = 0
+        for character in text:
+            if character == '\n':
+                pen_x = 0
+                pen_y -= line_height
+                continue
+            glyph = self.glyphs.get(character, self.fallback)
+            if glyph is None:
+                continue
+            if glyph.width and glyph.height:
+                x0 = pen_x + glyph.left
+                x1 = x0 + glyph.width
+                y1 = pen_y + glyph.top
+                y0 = y1 - glyph.height
+                quads.append(((x0, y0, glyph.u0, glyph.v1),
+                              (x1, y0, glyph.u1, glyph.v1),
+                              (x1, y1, glyph.u1, glyph.v0),
+                              (x0, y1, glyph.u0, glyph.v0)))
+            pen_x += glyph.advance
+        return np.array(quads, dtype=np.float32).reshape(-1, VERTEX_SIZE)
+
+    @property
+    def texture(self):
+        """The atlas as an alpha texture (needs an OpenGL context)."""
+        if self._texture is None:
+            from OpenGL.GL import (
+                glBindTexture, glGenTextures, glPixelStorei, glTexImage2D,
+                glTexParameteri, GL_ALPHA, GL_CLAMP_TO_EDGE, GL_LINEAR,
+                GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_TEXTURE_MIN_FILTER,
+                GL_TEXTURE_WRAP_S, GL_TEXTURE_WRAP_T, GL_UNPACK_ALIGNMENT,
+                GL_UNSIGNED_BYTE)
+            self._texture = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self._texture)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S,
+                            GL_CLAMP_TO_EDGE)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T,
+                            GL_CLAMP_TO_EDGE)
+            glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+            height, width = self.image.shape
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_ALPHA, width, height, 0,
+                         GL_ALPHA, GL_UNSIGNED_BYTE, self.image)
+            glBindTexture(GL_TEXTURE_2D, 0)
+        return self._texture
+
+    def delete(self):
+        if self._texture is not None:
+            from OpenGL.GL import glDeleteTextures
+            glDeleteTextures([self._texture])
+            self._texture = None
+
+
+class TextRenderer(object):
+    """Draws 2D texts from a glyph atlas with cached vertex buffers.
+
+    :param str font_file: Path to a TrueType/OpenType font
+    :param int max_cached: Number of strings to keep vertex buffers for
+
+    """
+    needs_window = False
+
+    def __init__(self, font_file, size=FONT_SIZE, max_cached=256):
+        self.font_file = font_file
+        self.font_size = size
+        self.max_cached = max_cached
+        self._scale = 1
+        self._atlases = {}
+        self._cache = OrderedDict()
+        self.atlas = self._atlas(size)
+
+    def _atlas(self, size):
+        if size not in self._atlases:
+            self._atlases[size] = GlyphAtlas(self.font_file, size)
+        return self._atlases[size]
+
+    @property
+    def scale(self):
+        return self._scale
+
+    @scale.setter
+    def scale(self, scale):
+        """Rasterise the glyphs at the scaled size (not stretched)."""
+        if scale != self._scale:
+            self._scale = scale
+            self.atlas = self._atlas(int(round(self.font_size * scale)))
+            self.clear()
+
+    def clear(self):
+        for buffer, _ in self._cache.values():
+            buffer.delete()
+        self._cache.clear()
+
+    def _buffer(self, text, line_height):
+        from OpenGL.arrays import vbo
+        key = (text, line_height)
+        try:
+            entry = self._cache.pop(key)
+        except KeyError:
+            vertices = self.atlas.layout(text, line_height * self._scale)
+            entry = (vbo.VBO(vertices), len(vertices))
+            while len(self._cache) >= self.max_cached:
+                _, (evicted, _) = self._cache.popitem(last=False)
+                evicted.delete()
+        self._cache[key] = entry
+        return entry
+
+    def draw(self, text, x, y, line_height=LINE_HEIGHT, color=None):
+        """Draw a (multi-line) text with the first baseline at (x, y).
+
+        The coordinates are window pixels with the origin at the bottom
+        left, the text is tinted with the current colour.
+        """
+        from OpenGL.GL import (
+            glBindTexture, glBlendFunc, glColor3f, glDisable,
+            glDisableClientState, glDrawArrays, glEnable, glEnableClientState,
+            glGetIntegerv, glLoadIdentity, glMatrixMode, glOrtho, glPopMatrix,
+            glPushMatrix, glTexCoordPointer, glTexEnvi, glTranslatef,
+            glUseProgram, glVertexPointer, GL_BLEND, GL_DEPTH_TEST, GL_FLOAT,
+            GL_LIGHTING, GL_MODELVIEW, GL_MODULATE, GL_ONE_MINUS_SRC_ALPHA,
+            GL_PROJECTION, GL_QUADS, GL_SRC_ALPHA, GL_TEXTURE_2D,
+            GL_TEXTURE_COORD_ARRAY, GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE,
+            GL_VERTEX_ARRAY, GL_VIEWPORT)
+        if not text:
+            return
+        buffer, n_vertices = self._buffer(text, line_height)
+        if n_vertices == 0:
+            return
+        _, _, width, height = glGetIntegerv(GL_VIEWPORT)
+
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glOrtho(0.0, width, 0.0, height, -1.0, 1.0)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+        glTranslatef(int(x), int(y), 0)
+        if color:
+            glColor3f(*color)
+        glUseProgram(0)
+        glDisable(GL_LIGHTING)
+        glDisable(GL_DEPTH_TEST)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.atlas.texture)
+        glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
+        buffer.bind()
+        try:
+            glEnableClientState(GL_VERTEX_ARRAY)
+            glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+            glVertexPointer(2, GL_FLOAT, STRIDE, buffer)
+            glTexCoordPointer(2, GL_FLOAT, STRIDE, buffer + 8)
+            glDrawArrays(GL_QUADS, 0, n_vertices)
+        finally:
+            buffer.unbind()
+            glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+            glDisableClientState(GL_VERTEX_ARRAY)
+            glBindTexture(GL_TEXTURE_2D, 0)
+            glDisable(GL_TEXTURE_2D)
+            glPopMatrix()
+            glMatrixMode(GL_PROJECTION)
+            glPopMatrix()
+            glMatrixMode(GL_MODELVIEW)
+
+
+class BitmapTextRenderer(object):
+    """Fallback drawing each character with the GLUT bitmap font."""
+    needs_window = True
+    scale = 1
+
+    def draw(self, text, x, y, line_height=LINE_HEIGHT, color=None):
+        from rainbowalga.tools import draw_text_2d
+        draw_text_2d(text, x, y, line_height=line_height, color=color)
+
+    def clear(self):
+        pass
+
+
+def create_text_renderer(font_file=None, size=FONT_SIZE):
+    """The glyph atlas renderer, or the GLUT fallback if not available."""
+    if font_file is None:
+        font_file = find_font()
+    if font_file is None:
+        log.warning("No font found (set RAINBOWALGA_FONT), falling back "
+                    "to the GLUT bitmap font.")
+        return BitmapTextRenderer()
+    try:
+        return TextRenderer(font_file, size)
+    except ImportError:
+        log.warning("freetype-py is not installed, falling back to the "
+                    "GLUT bitmap font.")
+    except Exception as e:
+        log.warning("Could not load font '{0}' ({1}), falling back to the "
+                    "GLUT bitmap font.".format(font_file, e))
+    return BitmapTextRenderer()
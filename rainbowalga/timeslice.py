@@ -0,0 +1,258 @@
+# coding=utf-8
+# Filename: timeslice.py
+"""
+Sliding window through the raw timeslices of an online ROOT file.
+
+A background thread decodes the timeslices of one stream (L0, L1, L2 or SN)
+one after the other, calibrates their hits and appends them to a ring
+buffer of fixed size. It only decodes up to ``lookahead`` timeslices ahead
+of the playhead, which the render loop moves with the clock, and jumping
+outside the buffered range starts over at the timeslice of the new time.
+The render loop shows the hits of a time window ending at the playhead.
+The memory stays constant however long the data is played or scrubbed
+through; if the buffer is too small for the window, the oldest hits are
+dropped.
+
+The timeslices of a stream are assumed to be consecutive, the hit times are
+nanoseconds since the start of the first timeslice of the file.
+
+"""
+from __future__ import division, absolute_import, print_function
+
+import threading
+
+import numpy as np
+
+from rainbowalga.calibration import HITS_DTYPE
+
+import logging
+log = logging.getLogger('rainbowalga')  # pylint: disable=C0103
+
+TIMESLICE_DURATION = 1e8  # ns
+STREAMS = ('L0', 'L1', 'L2', 'SN')
+
+
+def decode_frames(frames, index):
+    """The DOM IDs, channel IDs, times and ToTs of the hits of a timeslice.
+
+    :param dict frames: The hits (with pmt, tdc and tot fields) per DOM ID
+    :param int index: The index of the timeslice in its stream
+
+    """
+    dom_ids = list(frames)
+    hits = [frames[dom_id] for dom_id in dom_ids]
+    if not hits:
+        return (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint8),
+                np.zeros(0), np.zeros(0, dtype=np.uint8))
+    dom_id = np.repeat(np.array(dom_ids, dtype=np.int32),
+                       [len(frame) for frame in hits])
+    hits = np.concatenate(hits)
+    time = index * TIMESLICE_DURATION + hits['tdc'].astype(np.float64)
+    return dom_id, hits['pmt'], time, hits['tot']
+
+
+class TimesliceFile(object):
+    """The timeslices of one stream of an online ROOT file."""
+
+    def __init__(self, filename, stream='L1'):
+        import km3io
+        stream = stream.upper()
+        if stream not in STREAMS:
+            raise ValueError("Unknown timeslice stream '{0}', choose from "
+                             "{1}".format(stream, ', '.join(STREAMS)))
+        timeslices = km3io.OnlineReader(filename).timeslices
+        self.timeslices = getattr(timeslices, stream, None)
+        if self.timeslices is None:
+            raise ValueError("No {0} timeslices in '{1}'".format(
+                stream, filename))
+        self.stream = stream
+
+    def __len__(self):
+        return len(self.timeslices)
+
+    def read(self, index):
+        return decode_frames(self.timeslices[index].frames, index)
+
+
+class HitRing(object):
+    """A ring buffer of time ordered hits with a fixed capacity.
+
+    Appending to a full buffer overwrites the oldest hits.
+    """
+
+    def __init__(self, capacity, dtype=HITS_DTYPE):
+        self.capacity = int(capacity)
+        self._buffer = np.zeros(self.capacity, dtype=dtype)
+        self._start = 0
+        self._size = 0
+        self.n_dropped = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        return self._buffer.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._start = 0
+            self._size = 0
+
+    def append(self, hits):
+        """Append hits which are later than all buffered ones, returns the
+        number of overwritten hits."""
+        n_new = len(hits)
+        hits = hits[max(n_new - self.capacity, 0):]
+        n_hits = len(hits)
+        with self._lock:
+            n_overwritten = max(self._size + n_new - self.capacity, 0)
+            end = (self._start + self._size) % self.capacity
+            first = min(n_hits, self.capacity - end)
+            self._buffer[end:end + first] = hits[:first]
+            self._buffer[:n_hits - first] = hits[first:]
+            n_replaced = max(self._size + n_hits - self.capacity, 0)
+            self._start = (self._start + n_replaced) % self.capacity
+            self._size = min(self._size + n_hits, self.capacity)
+        self.n_dropped += n_overwritten
+        return n_overwritten
+
+    def _segments(self):
+        end = self._start + self._size
+        if end <= self.capacity:
+            return (self._buffer[self._start:end], )
+        return (self._buffer[self._start:],
+                self._buffer[:end - self.capacity])
+
+    @property
+    def time_range(self):
+        """The times of the oldest and the newest hit, None if empty."""
+        with self._lock:
+            if self._size == 0:
+                return None
+            segments = self._segments()
+            return segments[0]['time'][0], segments[-1]['time'][-1]
+
+    def window(self, start, stop):
+        """A copy of the hits with ``start <= time < stop``."""
+        with self._lock:
+            parts = []
+            for segment in self._segments():
+                times = segment['time']
+                first, last = np.searchsorted(times, (start, stop))
+                parts.append(segment[first:last])
+            return np.concatenate(parts).view(np.recarray)
+
+    def __str__(self):
+        return "{0} of {1} hits ({2:.0f} MB), {3} dropped".format(
+            self._size, self.capacity, self.nbytes / 1024**2, self.n_dropped)
+
+
+class TimesliceLoader(object):
+    """Decodes and calibrates timeslices into a ``HitRing`` in the
+    background, following the playhead set by ``set_time()``.
+
+    :param source: Provides ``len()`` and ``read(index)`` (see
+                   ``TimesliceFile``)
+    :param calibrate: Called with the DOM IDs, channel IDs, times and ToTs,
+                      returns the time sorted calibrated hits
+    :param int capacity: Size of the ring buffer in hits
+    :param int lookahead: Number of timeslices decoded ahead of the playhead
+
+    """
+
+    def __init__(self, source, calibrate, capacity=1000000, lookahead=1):
+        self.source = source
+        self.calibrate = calibrate
+        self.ring = HitRing(capacity)
+        self.lookahead = lookahead
+        self.n_timeslices = len(source)
+        self.n_decoded = 0
+        self.n_failed = 0
+        self._next = 0
+        self._complete_from = 0
+        self._playhead = 0
+        self._generation = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run,
+                                        name='rainbowalga-timeslices')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self._stop.set()
+        with self._condition:
+            self._condition.notify()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    @property
+    def duration(self):
+        """The total time of the timeslices in ns."""
+        return self.n_timeslices * TIMESLICE_DURATION
+
+    @property
+    def buffered_until(self):
+        """The time up to which the timeslices are decoded."""
+        return self._next * TIMESLICE_DURATION
+
+    def set_time(self, time, window=0):
+        """Move the playhead, jumping outside of the buffered range starts
+        over at the timeslice of the window start."""
+        with self._condition:
+            self._playhead = time
+            ahead = self.buffered_until + self.lookahead * TIMESLICE_DURATION
+            if time < self._complete_from or time >= ahead:
+                self._seek(time - window)
+            self._condition.notify()
+
+    def _seek(self, time):
+        index = int(np.clip(time // TIMESLICE_DURATION, 0,
+                            max(self.n_timeslices - 1, 0)))
+        log.debug("Seeking to timeslice {0}".format(index))
+        self.ring.clear()
+        self._next = index
+        self._complete_from = index * TIMESLICE_DURATION
+        self._generation += 1
+
+    def window(self, start, stop):
+        """The calibrated hits with ``start <= time < stop``."""
+        return self.ring.window(start, stop)
+
+    def _is_ahead(self):
+        return self._next * TIMESLICE_DURATION > \
+            self._playhead + self.lookahead * TIMESLICE_DURATION
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._condition:
+                while not self._stop.is_set() and \
+                        (self._next >= self.n_timeslices or self._is_ahead()):
+                    self._condition.wait(0.1)
+                index, generation = self._next, self._generation
+            if self._stop.is_set():
+                return
+            try:
+                hits = self.calibrate(*self.source.read(index))
+            except Exception as e:
+                self.n_failed += 1
+                log.error("Could not decode timeslice {0}: {1}".format(
+                    index, e))
+                hits = None
+            with self._condition:
+                if generation != self._generation:
+                    continue  # the playhead jumped meanwhile
+                if hits is not None and self.ring.append(hits):
+                    self._complete_from = self.ring.time_range[0]
+                self._next = index + 1
+                self.n_decoded += 1
+
+    def __str__(self):
+        return "{0} of {1} decoded, buffer: {2}".format(
+            self.n_decoded, self.n_timeslices, self.ring)
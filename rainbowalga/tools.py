@@ -15,7 +15,7 @@ from OpenGL.GL import (glMatrixMode, GL_MODELVIEW, glBegin, glEnd, glEnable,
                        glColor3f, glRasterPos, glRasterPos2i, GL_LINE_SMOOTH,
                        GL_FLAT, GL_LINES, glTranslated, glRotated)
 
-from km3pipe.dataclasses import Vec3
+from rainbowalga.core import Vec3
 
 
 class Clock(object):
@@ -18,7 +18,6 @@ setup(name='rainbowalga',
           'Pillow>=3.1.0',
           'PyOpenGL',
           'freetype-py',
-          'matplotlib',
       ],
       entry_points={
           'console_scripts': [